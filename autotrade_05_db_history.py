@@ -6,7 +6,9 @@ from datetime import datetime
 from dotenv import load_dotenv
 import python_bithumb
 from openai import OpenAI
-import time
+from order_tracker import wait_for_fill
+import db_connections
+from db_connections import get_connection, snapshot
 
 # --- 색상 코드 정의 ---
 class Colors:
@@ -38,55 +40,46 @@ BITHUMB_ACCESS_KEY = os.getenv("BITHUMB_ACCESS_KEY") # ai_trading에서도 사
 BITHUMB_SECRET_KEY = os.getenv("BITHUMB_SECRET_KEY") # ai_trading에서도 사용하기 위해 전역으로 로드
 
 # SQLite 데이터베이스 초기화 함수
+# 스레드별로 재사용하는 WAL 연결 반환 (처음 열 때 스키마 마이그레이션 적용: 체결 컬럼, epoch 밀리초, 인덱스)
 def init_db():
-    conn = sqlite3.connect('bitcoin_trading.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS trades
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  timestamp TEXT,
-                  decision TEXT,
-                  percentage INTEGER,
-                  reason TEXT,
-                  btc_balance REAL,
-                  krw_balance REAL,
-                  btc_price REAL)''')
-    conn.commit()
-    return conn
+    return get_connection()
 
 # 거래 정보를 DB에 기록하는 함수
-def log_trade(conn, decision, percentage, reason, btc_balance, krw_balance, btc_price):
+def log_trade(conn, decision, percentage, reason, btc_balance, krw_balance, btc_price, fill=None):
     c = conn.cursor()
-    timestamp = datetime.now().isoformat()
+    now = datetime.now()
+    timestamp = now.isoformat()
+    fill = fill or {} # order_tracker.wait_for_fill 결과
     c.execute("""INSERT INTO trades 
-                 (timestamp, decision, percentage, reason, btc_balance, krw_balance, btc_price) 
-                 VALUES (?, ?, ?, ?, ?, ?, ?)""",
-              (timestamp, decision, percentage, reason, btc_balance, krw_balance, btc_price))
+                 (timestamp, timestamp_ms, decision, percentage, reason, btc_balance, krw_balance, btc_price,
+                  order_uuid, executed_qty, avg_price, fee, latency) 
+                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+              (timestamp, int(now.timestamp() * 1000), decision, percentage, reason, btc_balance, krw_balance,
+               btc_price, fill.get("uuid"), fill.get("executed_qty"), fill.get("avg_price"), fill.get("fee"),
+               fill.get("elapsed")))
     conn.commit()
 
 # --- DB 연결 가져오기 함수 추가 ---
 def get_db_connection():
-    conn = sqlite3.connect('bitcoin_trading.db')
-    # 만약 Row factory를 사용하고 싶다면 여기서 설정 가능 (결과를 dict로 바로 받기 등)
-    # conn.row_factory = sqlite3.Row 
-    return conn
+    return get_connection() # 공유 연결이므로 닫지 말 것
 
 # --- 최근 거래 내역 가져오기 함수 추가 ---
 def get_recent_trades(limit=5):
-    conn = get_db_connection()
-    # 결과를 dictionary 형태로 받기 위해 row_factory 설정
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    
-    c.execute("""
-    SELECT timestamp, decision, percentage, reason, btc_balance, krw_balance, btc_price
-    FROM trades
-    ORDER BY timestamp DESC
-    LIMIT ?
-    """, (limit,))
-    
-    trades = [dict(row) for row in c.fetchall()] # 각 row를 dict로 변환
+    # 읽기 전용 스냅샷 (트레이더/대시보드의 쓰기를 막지 않음)
+    with snapshot() as conn:
+        c = conn.cursor()
+        # 결과를 dictionary 형태로 받기 위해 row_factory 설정 (공유 연결이므로 커서에만)
+        c.row_factory = sqlite3.Row
+        
+        c.execute("""
+        SELECT timestamp, decision, percentage, reason, btc_balance, krw_balance, btc_price
+        FROM trades
+        ORDER BY timestamp_ms DESC
+        LIMIT ?
+        """, (limit,))
+        
+        trades = [dict(row) for row in c.fetchall()] # 각 row를 dict로 변환
         
-    conn.close()
     return trades
 
 # 뉴스 데이터 가져오는 함수 (이전과 동일)
@@ -246,7 +239,6 @@ def execute_trade():
     if not BITHUMB_ACCESS_KEY or not BITHUMB_SECRET_KEY:
         print(f"{Colors.BRIGHT_RED}### Bithumb API keys not found. Cannot execute trades. ###{Colors.RESET}")
         log_trade(conn, ai_result.get('decision', 'ERROR_NO_KEYS'), 0, ai_result.get('reason', "API keys missing, no trade execution possible"), 0, 0, 0)
-        conn.close()
         return
 
     bithumb_executor = python_bithumb.Bithumb(BITHUMB_ACCESS_KEY, BITHUMB_SECRET_KEY) # 거래 실행용 API 객체
@@ -261,7 +253,6 @@ def execute_trade():
     except Exception as e:
         print(f"{Colors.BRIGHT_RED}### Execute: Failed to get Bithumb balance/price: {str(e)} ###{Colors.RESET}")
         log_trade(conn, ai_result.get('decision', 'ERROR_BITHUMB_EXEC_API'), 0, ai_result.get('reason', f"Bithumb API error at execution: {str(e)}"), 0, 0, 0)
-        conn.close()
         return
 
     # AI 결정 및 이유
@@ -284,6 +275,7 @@ def execute_trade():
     print(f"{Colors.CYAN}### Reason: {reason} ###{Colors.RESET}")
     
     order_executed_successfully = False # 실제 주문 성공 여부
+    order_feedback = None # 주문 응답 (uuid 포함)
     final_decision_for_log = decision.lower() # 로그용 기본 결정 (실패 시 변경)
     
     if decision == "BUY" and percentage > 0:
@@ -321,12 +313,14 @@ def execute_trade():
         # final_decision_for_log는 'hold' 또는 이미 설정된 'buy_skipped'/'sell_skipped' 유지
         order_executed_successfully = True # 결정은 따랐으므로 true (실제 주문 성공과는 다름)
 
-    # 잔고 업데이트 대기
-    if order_executed_successfully and (decision == "BUY" or decision == "SELL") and percentage > 0:
-        print(f"{Colors.BRIGHT_BLUE}Waiting for order to reflect on balance...{Colors.RESET}")
-        time.sleep(5) 
-    else:
-        time.sleep(1)
+    # 고정 대기 대신 주문 상태를 조회해 체결/취소/타임아웃까지 확인
+    fill = None
+    if order_executed_successfully and order_feedback and order_feedback.get("uuid"):
+        print(f"{Colors.BRIGHT_BLUE}Waiting for order fill...{Colors.RESET}")
+        fill = wait_for_fill(bithumb_executor, order_feedback["uuid"])
+        fill_color = Colors.YELLOW if fill["timed_out"] else Colors.BRIGHT_BLUE
+        print(f"{fill_color}### Order {'timed out' if fill['timed_out'] else fill['state']} in {fill['elapsed']:.2f}s: "
+              f"qty {fill['executed_qty']}, avg price {fill['avg_price']}, fee {fill['fee']} ###{Colors.RESET}")
     
     # 거래 후 최신 잔고/시세 조회
     updated_krw, updated_btc, updated_price = exec_my_krw, exec_my_btc, exec_current_price # 기본값
@@ -348,11 +342,11 @@ def execute_trade():
         reason,
         updated_btc,
         updated_krw, 
-        updated_price
+        updated_price,
+        fill=fill
     )
     print(f"{Colors.BRIGHT_GREEN}Trade information logged to database.{Colors.RESET}")
     
-    conn.close()
     print(f"{Colors.BRIGHT_BLUE}--- AI Trading Cycle Ended ---{Colors.RESET}\n")
 
 # 실행
@@ -361,4 +355,5 @@ if __name__ == "__main__":
     # while True:
     execute_trade()
     # print(f"{Colors.BOLD}{Colors.BRIGHT_YELLOW}Sleeping for 1 hour...{Colors.RESET}")
-    # time.sleep(3600) # 예: 1시간마다 실행
\ No newline at end of file
+    # time.sleep(3600) # 예: 1시간마다 실행
+    db_connections.close_all() # DB 연결 정리
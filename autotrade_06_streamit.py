@@ -1,72 +1,188 @@
 import os
 import json
-import requests
-import sqlite3
 from datetime import datetime
 from dotenv import load_dotenv
-import python_bithumb
-from openai import OpenAI
+import sys
 import time
+import asyncio
+import threading
 import schedule
+from market_fetch import format_timings
+from markets import MARKETS, currency, fetch_cycle, fetch_balances, fetch_prices, portfolio_value
+from resample import derive_timeframes, base_candles_needed
+from payload_encoder import encode_payload, count_tokens
+from indicators import IndicatorEngine
+from decision_cache import DecisionCache, canonical_hash
+from clients import get_session, get_openai_client, get_bithumb, request_stats, close_all
+from stream_decision import stream_decision
+from batch_decision import decide_markets, format_report as format_batch_report
+from news_store import NewsStore
+import tracing
+from tracing import trace, span, in_context, span_listeners, prune_spans
+import metrics
+from llm_replay import RecordingStore, recording_client
+from event_loop import EventDrivenTrader
+from order_tracker import wait_for_fill
+from risk import RiskEngine
+from orderbook import (OrderbookRecorder, liquidity_check, MAX_SLIPPAGE_BPS, SLIPPAGE_RETRIES,
+                       SLIPPAGE_RETRY_DELAY, MIN_ORDER_KRW)
+from execution import (EXECUTION_STRATEGY, EXECUTION_SLICES, EXECUTION_DURATION, execute_order,
+                       slippage_bps, volume_weights)
+import db_connections
+from db_connections import get_connection, snapshot
+import event_log
+from event_log import log_event
 
 # .env 파일에서 API 키 로드
 load_dotenv()
 SERPAPI_API_KEY = os.getenv("SERPAPI_API_KEY")
+NEWS_QUERY = os.getenv("NEWS_QUERY", "bitcoin news")
+NEWS_FETCH_COUNT = int(os.getenv("NEWS_FETCH_COUNT", "10"))
+
+# 데이터 수집 타임아웃 (초): 소스별 타임아웃과 전체 마감 시간
+FETCH_SOURCE_TIMEOUT = float(os.getenv("FETCH_SOURCE_TIMEOUT", "10"))
+FETCH_DEADLINE = float(os.getenv("FETCH_DEADLINE", "15"))
+
+# 차트 윈도우 길이 (1시간봉, 4시간봉, 일봉 개수)
+SHORT_TERM_COUNT, MID_TERM_COUNT, LONG_TERM_COUNT = 24, 30, 30
+
+# LLM 페이로드 인코딩: 레이아웃(columnar/csv/summary), 토큰 예산(0이면 제한 없음), 요약 첨부 여부
+PAYLOAD_LAYOUT = os.getenv("PAYLOAD_LAYOUT", "columnar")
+PAYLOAD_TOKEN_BUDGET = int(os.getenv("PAYLOAD_TOKEN_BUDGET", "6000"))
+PAYLOAD_INCLUDE_SUMMARY = os.getenv("PAYLOAD_INCLUDE_SUMMARY", "0") == "1"
+
+# 요약에 들어가는 기술 지표 (타임프레임별 상태를 유지하면서 새로 마감된 봉만 반영)
+indicator_engine = IndicatorEngine()
+
+# AI 판단 캐시: 같은 입력(캔들, 뉴스, 잔고)이면 gpt-4o 를 다시 호출하지 않음
+LLM_MODEL = "gpt-4o"
+decision_cache = DecisionCache(
+    os.getenv("DECISION_CACHE_PATH", "decision_cache.json"),
+    ttl=float(os.getenv("DECISION_CACHE_TTL", "600")),
+    max_entries=int(os.getenv("DECISION_CACHE_MAX_ENTRIES", "256"))
+)
+
+# 스트리밍 모드: 판단/비율이 도착하는 즉시 주문을 시작하고, 마감 시간(초) 안에 판단이 없으면 hold
+STREAM_DECISIONS = os.getenv("STREAM_DECISIONS", "1") == "1"
+LLM_DECISION_DEADLINE = float(os.getenv("LLM_DECISION_DEADLINE", "30"))
+
+# 사이클 단계별 구간(span) 기록 (run_scheduler / run_event_driven 에서 켬, 거래 기록 DB 의 spans 테이블)
+# 보관 기간은 TRACE_RETENTION_DAYS (사이클마다 지난 구간 삭제)
+TRACING = os.getenv("TRACING", "1") == "1"
+
+# LLM 요청/응답 녹화: off / record (실제 호출을 저장) / replay (녹화된 응답이 있으면 재생)
+# 녹화본은 llm_replay.py 로 trades 기록 전체를 다시 돌려볼 때 사용
+# 프롬프트 전체 (잔고, 거래 기록 포함) 가 정리 없이 계속 쌓이므로 기본은 off, 필요할 때만 record 로 켬
+LLM_RECORD_MODE = os.getenv("LLM_RECORD_MODE", "off")
+llm_recordings = RecordingStore(os.getenv("LLM_RECORDINGS_PATH", "llm_recordings.db")) if LLM_RECORD_MODE != "off" else None
+
+# 여러 마켓을 거래할 때 마켓별 요청 대신 한 요청에 묶어서 판단 (묶음 크기/동시성은 batch_decision.py)
+LLM_BATCH_DECISIONS = os.getenv("LLM_BATCH_DECISIONS", "1") == "1"
+
+# 주문 체결 확인 최대 대기 시간 (초)
+ORDER_FILL_TIMEOUT = float(os.getenv("ORDER_FILL_TIMEOUT", "30"))
+
+# 주문 전 위험 한도 (보유 비중, 일일 손실, 시간당 주문 수, 최고 평가액 대비 하락, 변동성 차단)
+# 기본은 모두 꺼짐 (RISK_* 환경 변수로 항목별로 켬)
+risk_engine = RiskEngine()
+
+# 거래 마켓 호가를 주기적으로 수집하는 링 버퍼 (주문 전 예상 슬리피지 계산용)
+orderbook_recorder = OrderbookRecorder(MARKETS)
+
+# 메트릭: 구간(span) 소요 시간은 단계별 히스토그램으로 집계
+span_listeners.append(lambda name, seconds, status: metrics.observe("trade_stage_latency_seconds", seconds,
+                                                                    stage=name))
+
+# AI 판단 시스템 프롬프트
+SYSTEM_PROMPT = """
+    You are an expert in cryptocurrency investing on the Bithumb KRW markets.
+
+    You invest according to the following principles:
+    Rule No.1: Never lose money.
+    Rule No.2: Never forget Rule No.1.
+
+    Analyze the provided data for the market named in 'market' (e.g. KRW-BTC, KRW-ETH):
+    1. **Chart Data:** Multi-timeframe OHLCV data ('short_term': 1h, 'mid_term': 4h, 'long_term': daily).
+       Candles are column-oriented: 'cols' names the fields (t: candle open time in KST,
+       o/h/l/c: open/high/low/close in KRW, v: volume) and 'rows' holds one candle per row,
+       oldest first. In CSV layout the first line is the header. In summary layout each
+       timeframe holds only precomputed statistics, and '<timeframe>_summary' fields, when
+       present, hold the same statistics next to the candles. Summaries include precomputed
+       'indicators': SMA/EMA, RSI(14), MACD(12,26,9) line/signal/histogram, Bollinger bands
+       (20, 2) with %B, ATR(14) and its % of price, and the most recent swing highs/lows,
+       which mark nearby resistance/support levels.
+    2. **News Data:** Recent crypto news articles with 'title' and 'date'. Articles marked
+       'new': true appeared since your previous decision; usually only those are sent, so an
+       empty list means no new headlines rather than no news.
+    3. **Current Balance:** Current KRW balance, the balance of the market's coin (keyed by its
+       lowercase symbol, e.g. 'btc'), the coin's current price ('<symbol>_price') and the total
+       portfolio value across all traded markets.
+    4. **Recent Trades:** History of recent trading decisions and their outcomes in this market
+       ('btc_balance'/'btc_price' hold the coin balance and price of that market).
+
+    When analyzing recent trades:
+    - Evaluate if previous decisions were profitable
+    - Check if market conditions have changed since the last trade
+    - Consider how the market reacted to your previous decisions
+    - Learn from successful and unsuccessful trades
+    - Maintain consistency in your strategy unless there's a clear reason to change
+
+    **Task:** Based on technical analysis, news sentiment, and trading history, decide whether to **buy**, **sell**, or **hold** the coin of this market.
+    For buy or sell decisions, include a percentage (1-100) indicating what portion of available funds to use.
+
+    **Output Format:** Respond ONLY in JSON format like:
+    {"decision": "buy", "percentage": 20, "reason": "some technical reason"}
+    {"decision": "sell", "percentage": 50, "reason": "some technical reason"}
+    {"decision": "hold", "percentage": 0, "reason": "some technical reason"}
+    """
 
 # SQLite 데이터베이스 초기화 함수
+# 스레드별로 재사용하는 WAL 연결 반환 (처음 열 때 스키마 마이그레이션 적용: 체결 컬럼, epoch 밀리초, 인덱스)
 def init_db():
-    conn = sqlite3.connect('bitcoin_trading.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS trades
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  timestamp TEXT,
-                  decision TEXT,
-                  percentage INTEGER,
-                  reason TEXT,
-                  btc_balance REAL,
-                  krw_balance REAL,
-                  btc_price REAL)''')
-    conn.commit()
-    return conn
+    return get_connection()
 
 # 거래 정보를 DB에 기록하는 함수
-def log_trade(conn, decision, percentage, reason, btc_balance, krw_balance, btc_price):
-    c = conn.cursor()
-    timestamp = datetime.now().isoformat()
-    c.execute("""INSERT INTO trades 
-                 (timestamp, decision, percentage, reason, btc_balance, krw_balance, btc_price) 
-                 VALUES (?, ?, ?, ?, ?, ?, ?)""",
-              (timestamp, decision, percentage, reason, btc_balance, krw_balance, btc_price))
-    conn.commit()
+# 백그라운드 writer 대기열에 넣기만 하고 바로 반환 (디스크 쓰기는 writer 스레드에서 묶어서 처리)
+# btc_balance / btc_price: 해당 마켓 코인의 잔고 / 현재가
+# fill: order_tracker.wait_for_fill 결과 (주문이 없었으면 None)
+def log_trade(market, decision, percentage, reason, btc_balance, krw_balance, btc_price, fill=None):
+    now = datetime.now()
+    fill = fill or {}
+    event_log.get_writer().log_trade({
+        "timestamp": now.isoformat(), "timestamp_ms": int(now.timestamp() * 1000), "market": market,
+        "decision": decision, "percentage": percentage, "reason": reason,
+        "btc_balance": btc_balance, "krw_balance": krw_balance, "btc_price": btc_price,
+        "order_uuid": fill.get("uuid"), "executed_qty": fill.get("executed_qty"),
+        "avg_price": fill.get("avg_price"), "fee": fill.get("fee"), "latency": fill.get("elapsed"),
+        "execution": fill.get("strategy"), "slippage_bps": fill.get("slippage_bps"),
+    })
 
 # DB 연결 가져오기
 def get_db_connection():
-    return sqlite3.connect('bitcoin_trading.db')
+    return get_connection()
 
-# 최근 거래 내역 가져오기
-def get_recent_trades(limit=5):
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    c.execute("""
-    SELECT timestamp, decision, percentage, reason, btc_balance, krw_balance, btc_price
-    FROM trades
-    ORDER BY timestamp DESC
-    LIMIT ?
-    """, (limit,))
+# 최근 거래 내역 가져오기 (읽기 전용 스냅샷, 트레이더/대시보드의 쓰기를 막지 않음)
+def get_recent_trades(limit=5, market="KRW-BTC"):
+    with snapshot() as conn:
+        rows = conn.execute("""
+        SELECT timestamp, decision, percentage, reason, btc_balance, krw_balance, btc_price
+        FROM trades
+        WHERE market = ?
+        ORDER BY timestamp_ms DESC
+        LIMIT ?
+        """, (market, limit)).fetchall()
     
     columns = ['timestamp', 'decision', 'percentage', 'reason', 'btc_balance', 'krw_balance', 'btc_price']
     trades = []
     
-    for row in c.fetchall():
+    for row in rows:
         trade = {columns[i]: row[i] for i in range(len(columns))}
         trades.append(trade)
         
-    conn.close()
     return trades
 
 # 뉴스 데이터 가져오는 함수
-def get_bitcoin_news(api_key, query="bitcoin", location="us", language="en", num_results=5):
+def get_bitcoin_news(api_key, query="bitcoin", location="us", language="en", num_results=5, timeout=10):
     params = {
         "engine": "google_news", "q": query, "gl": location,
         "hl": language, "api_key": api_key
@@ -74,7 +190,7 @@ def get_bitcoin_news(api_key, query="bitcoin", location="us", language="en", num
     api_url = "https://serpapi.com/search.json"
     news_data = []
 
-    response = requests.get(api_url, params=params)
+    response = get_session("serpapi").get(api_url, params=params, timeout=timeout)
     response.raise_for_status()
     results = response.json()
 
@@ -82,190 +198,567 @@ def get_bitcoin_news(api_key, query="bitcoin", location="us", language="en", num
         for news_item in results["news_results"][:num_results]:
             news_data.append({
                 "title": news_item.get("title"),
-                "date": news_item.get("date")
+                "date": news_item.get("date"),
+                "link": news_item.get("link"),
+                "source": (news_item.get("source") or {}).get("name")
             })
     return news_data
 
-# AI 트레이딩 함수
-def ai_trading():
-    # 차트 데이터 수집
-    short_term_df = python_bithumb.get_ohlcv("KRW-BTC", interval="minute60", count=24)
-    mid_term_df = python_bithumb.get_ohlcv("KRW-BTC", interval="minute240", count=30)
-    long_term_df = python_bithumb.get_ohlcv("KRW-BTC", interval="day", count=30)
-
-    # 뉴스 데이터 수집
-    news_articles = []
-    if SERPAPI_API_KEY:
-        news_articles = get_bitcoin_news(SERPAPI_API_KEY, "bitcoin news", "us", "en", 5)
-    
-    # 빗썸 API 연결
-    access = os.getenv("BITHUMB_ACCESS_KEY")
-    secret = os.getenv("BITHUMB_SECRET_KEY")
-    bithumb = python_bithumb.Bithumb(access, secret)
+# 로컬 뉴스 저장소: 백그라운드에서 거래 시각 직전마다 (NEWS_REFRESH_SLOTS / NEWS_REFRESH_INTERVAL) SerpAPI 를 조회해 중복 없이 저장하고,
+# 판단 시에는 저장소에서 바로 읽음 (SerpAPI 가 느리거나 실패해도 사이클을 기다리게 하지 않음)
+news_store = NewsStore(lambda: get_bitcoin_news(SERPAPI_API_KEY, NEWS_QUERY, "us", "en", NEWS_FETCH_COUNT,
+                                                timeout=FETCH_SOURCE_TIMEOUT)) if SERPAPI_API_KEY else None
+
+# /metrics 조회 시점에 다른 모듈의 누적 통계 (캐시 적중, DB 기록 큐, 뉴스 갱신 실패) 를 옮겨 적음 (누적값은 inc_to 로 카운터 증가분만)
+def collect_metrics():
+    cache_stats = decision_cache.stats()
+    metrics.inc_to("trade_cache_hits_total", cache_stats["hits"], cache="decision")
+    metrics.inc_to("trade_cache_misses_total", cache_stats["misses"], cache="decision")
+    metrics.set_gauge("trade_cache_hit_ratio", cache_stats["hit_ratio"], cache="decision")
+    metrics.inc_to("trade_event_queue_dropped_total", event_log.get_writer().stats()["dropped"])
+    if news_store is not None:
+        metrics.inc_to("trade_api_errors_total", news_store.stats["errors"], source="news")
+    metrics.set_gauge("trade_drawdown_ratio", risk_engine.drawdown())
+    metrics.set_gauge("trade_daily_loss_ratio", risk_engine.daily_loss())
+    for market in MARKETS:
+        metrics.set_gauge("trade_kill_switch", int(market in risk_engine.killed), market=market)
+
+metrics.register_collector(collect_metrics)
+
+# 한 사이클에 필요한 데이터를 모든 마켓에 대해 한 번에 수집
+# 잔고/현재가는 마켓 수와 관계없이 한 번씩 조회하고, 1시간봉 캔들만 마켓별로 동시에 조회
+# (4시간봉과 일봉은 1시간봉으로 직접 만들기 때문에 마켓당 차트 요청은 한 번뿐)
+# 뉴스는 로컬 저장소에서 지난 판단 이후 새 기사만 읽음
+def collect_cycle(bithumb, markets):
+    base_count = base_candles_needed(SHORT_TERM_COUNT, MID_TERM_COUNT, LONG_TERM_COUNT)
+    cycle = fetch_cycle(bithumb, markets, base_count, timeout=FETCH_SOURCE_TIMEOUT, deadline=FETCH_DEADLINE)
+    print(format_timings(cycle))
+    if news_store is not None:
+        news_store.start()  # 스케줄러 밖에서 바로 호출된 경우에도 갱신 시작
+        news_store.wait_ready(FETCH_SOURCE_TIMEOUT)  # 시작 직후면 첫 갱신까지만 기다림
+        cycle["news"] = news_store.for_decision()
+        print(f"뉴스: 새 기사 {sum(item['new'] for item in cycle['news'])}건 "
+              f"(마지막 갱신 {datetime.fromtimestamp(news_store.last_refresh).strftime('%H:%M:%S') if news_store.last_refresh else '없음'})")
+    log_event("fetch", markets=markets, wall_time=cycle["wall_time"], timings=cycle["timings"],
+              errors=cycle["errors"])
+    for name, error in cycle["errors"].items():
+        print(f"데이터 수집 실패 ({name}): {error}")
+        metrics.inc("trade_api_errors_total", source=name.split(":")[0])
+
+    # 잔고 없이는 어떤 마켓도 판단할 수 없음
+    if cycle["balances"] is None:
+        raise RuntimeError("잔고 조회 실패")
 
-    # 현재 잔고 확인
-    my_krw = bithumb.get_balance("KRW")
-    my_btc = bithumb.get_balance("BTC")
-    current_price = python_bithumb.get_current_price("KRW-BTC")
+    # 위험 확인용 상태 갱신 (주문 전 확인은 메모리 값만 비교하도록 여기서 미리)
+    with span("risk.update"):
+        if not risk_engine.loaded:
+            with snapshot() as conn:
+                risk_engine.load(conn)  # 오늘 첫 평가액 (재시작해도 일일 손실 기준 유지)
+        risk_engine.update_equity(portfolio_value(cycle["balances"], cycle["prices"]))
+        for market in markets:
+            risk_engine.update_volatility(market, cycle["candles"].get(market))
+    for market, reason in risk_engine.killed.items():
+        print(f"[{market}] {reason} - 이 마켓은 이번 사이클에 매수하지 않음")
+    return cycle
+
+# 한 마켓의 LLM 사용자 메시지 (차트, 잔고, 최근 거래를 압축 인코딩한 JSON)
+# include_news=False: 묶음 요청에서 뉴스를 마켓마다 반복하지 않고 공통 데이터로 한 번만 보낼 때
+def market_prompt(market, cycle, include_news=True):
+    # 현재가 없이는 판단할 수 없음
+    if market not in cycle["prices"]:
+        raise RuntimeError(f"시세 조회 실패: {market}")
+
+    candles_1h = cycle["candles"].get(market)
+    short_term_df, mid_term_df, long_term_df = derive_timeframes(
+        candles_1h, SHORT_TERM_COUNT, MID_TERM_COUNT, LONG_TERM_COUNT)
+    news_articles = cycle["news"]
+    coin = currency(market).lower()
+    my_krw = cycle["balances"].get("KRW", 0.0)
+    my_coin = cycle["balances"].get(currency(market), 0.0)
+    current_price = cycle["prices"][market]
     
-    # 최근 거래 내역 가져오기
-    recent_trades = get_recent_trades(limit=5)
+    # 최근 거래 내역 가져오기 (이 마켓만)
+    with span("db.recent_trades", market=market):
+        recent_trades = get_recent_trades(limit=5, market=market)
 
     # 데이터 페이로드 준비
-    data_payload = {
-        "short_term": json.loads(short_term_df.to_json()) if short_term_df is not None else None,
-        "mid_term": json.loads(mid_term_df.to_json()) if mid_term_df is not None else None,
-        "long_term": json.loads(long_term_df.to_json()) if long_term_df is not None else None,
-        "news": news_articles,
+    # 차트는 컬럼명을 한 번만 쓰고 가격 크기에 맞게 반올림해서 인코딩
+    chart_frames = {"short_term": short_term_df, "mid_term": mid_term_df, "long_term": long_term_df}
+    indicators = None
+    if PAYLOAD_LAYOUT == "summary" or PAYLOAD_INCLUDE_SUMMARY:
+        # 1시간봉 지표는 윈도우(24개)보다 긴 전체 1시간봉으로 계산 (지표 상태는 마켓별로 유지)
+        indicator_frames = dict(chart_frames, short_term=candles_1h)
+        with span("indicators", market=market):
+            indicators = {name: indicator_engine.summary(f"{market}/{name}", df)
+                          for name, df in indicator_frames.items()}
+    data_payload = {"market": market}
+    if include_news:
+        data_payload["news"] = news_articles
+    data_payload.update({
         "current_balance": {
             "krw": my_krw,
-            "btc": my_btc,
-            "btc_price": current_price,
-            "total_value": my_krw + (my_btc * current_price)
+            coin: my_coin,
+            f"{coin}_price": current_price,
+            "total_value": portfolio_value(cycle["balances"], cycle["prices"])
         },
         "recent_trades": recent_trades
-    }
+    })
+    with span("encode", market=market, layout=PAYLOAD_LAYOUT) as attrs:
+        user_content, encode_report = encode_payload(data_payload, chart_frames, layout=PAYLOAD_LAYOUT,
+                                                     token_budget=PAYLOAD_TOKEN_BUDGET or None,
+                                                     include_summary=PAYLOAD_INCLUDE_SUMMARY,
+                                                     indicators=indicators)
+        attrs["tokens"] = encode_report["tokens_after"]
+    print(f"[{market}] 페이로드 토큰: {encode_report['tokens_before']} -> {encode_report['tokens_after']} "
+          f"(layout={PAYLOAD_LAYOUT}, trimmed={encode_report['trimmed']})")
+    return user_content
+
+# LLM 판단 한 번의 토큰 사용량을 메트릭에 기록 (usage 가 없는 스트리밍/녹화 재생 응답은 토큰 수를 직접 셈)
+def record_llm_usage(source, messages, text, usage=None, decisions=1):
+    metrics.inc("trade_llm_decisions_total", decisions, source=source)
+    if source == "cache":
+        return
+    prompt_tokens = usage.prompt_tokens if usage else sum(count_tokens(m["content"]) for m in messages)
+    completion_tokens = usage.completion_tokens if usage else count_tokens(text)
+    metrics.inc("trade_llm_tokens_total", prompt_tokens, kind="prompt")
+    metrics.inc("trade_llm_tokens_total", completion_tokens, kind="completion")
+
+# AI 트레이딩 함수
+# cycle: collect_cycle 결과 (없으면 이 마켓만 새로 수집)
+# on_decision(decision, percentage): 스트리밍 중 판단이 확인되는 즉시 호출됨 (캐시 적중/비스트리밍 시에는 호출 안 됨)
+def ai_trading(market="KRW-BTC", cycle=None, on_decision=None):
+    if cycle is None:
+        access = os.getenv("BITHUMB_ACCESS_KEY")
+        secret = os.getenv("BITHUMB_SECRET_KEY")
+        cycle = collect_cycle(get_bithumb(access, secret), [market])
+    user_content = market_prompt(market, cycle)
 
-    # OpenAI GPT에게 판단 요청
-    client = OpenAI()
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {
-                "role": "system",
-                "content": """
-                You are an expert in Bitcoin investing.
-
-                You invest according to the following principles:
-                Rule No.1: Never lose money.
-                Rule No.2: Never forget Rule No.1.
-
-                Analyze the provided data:
-                1. **Chart Data:** Multi-timeframe OHLCV data ('short_term': 1h, 'mid_term': 4h, 'long_term': daily).
-                2. **News Data:** Recent Bitcoin news articles with 'title' and 'date'.
-                3. **Current Balance:** Current KRW and BTC balances and current BTC price.
-                4. **Recent Trades:** History of recent trading decisions and their outcomes.
-
-                When analyzing recent trades:
-                - Evaluate if previous decisions were profitable
-                - Check if market conditions have changed since the last trade
-                - Consider how the market reacted to your previous decisions
-                - Learn from successful and unsuccessful trades
-                - Maintain consistency in your strategy unless there's a clear reason to change
-
-                **Task:** Based on technical analysis, news sentiment, and trading history, decide whether to **buy**, **sell**, or **hold** Bitcoin.
-                For buy or sell decisions, include a percentage (1-100) indicating what portion of available funds to use.
-
-                **Output Format:** Respond ONLY in JSON format like:
-                {"decision": "buy", "percentage": 20, "reason": "some technical reason"}
-                {"decision": "sell", "percentage": 50, "reason": "some technical reason"}
-                {"decision": "hold", "percentage": 0, "reason": "some technical reason"}
-                """
-            },
-            {
-                "role": "user",
-                "content": json.dumps(data_payload)
-            }
-        ],
-        response_format={"type": "json_object"}
-    )
-
-    # AI 응답 처리
-    result = json.loads(response.choices[0].message.content)
+    # OpenAI GPT에게 판단 요청 (입력이 같으면 캐시된 판단을 재사용)
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_content}
+    ]
+    cache_key = canonical_hash({"model": LLM_MODEL, "messages": messages})
+    llm_started = time.perf_counter()
+    result = decision_cache.get(cache_key)
+    if result is None and STREAM_DECISIONS:
+        client = recording_client(get_openai_client(), llm_recordings, LLM_RECORD_MODE)
+        with span("llm", market=market, source="stream") as attrs:
+            result, timing = stream_decision(client, LLM_MODEL, messages, LLM_DECISION_DEADLINE,
+                                             on_decision=on_decision)
+            attrs["time_to_decision"] = timing["time_to_decision"]
+        record_llm_usage("stream", messages, json.dumps(result, ensure_ascii=False))
+        if timing["time_to_decision"] is None:
+            result = dict(result, fallback=True)  # 모델 판단이 아닌 대체 hold (뉴스 기준 시점을 옮기지 않음)
+        if timing["time_to_decision"] is not None:
+            print(f"AI 판단 도착: {timing['time_to_decision']:.2f}s, 전체 응답: {timing['total']:.2f}s")
+            if timing["complete"]:
+                decision_cache.put(cache_key, result)  # 중간에 끊긴 응답 (reason 일부만) 은 캐시하지 않음
+        else:
+            print(f"AI 판단 마감 시간 초과 ({LLM_DECISION_DEADLINE:g}s) - HOLD 로 처리")
+            metrics.inc("trade_api_errors_total", source="llm")
+        log_event("llm", market=market, source="stream", model=LLM_MODEL, decision=result.get("decision"),
+                  time_to_decision=timing["time_to_decision"], total=timing["total"], complete=timing["complete"])
+    elif result is None:
+        client = recording_client(get_openai_client(), llm_recordings, LLM_RECORD_MODE)
+        with span("llm", market=market, source="request"):
+            response = client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=messages,
+                response_format={"type": "json_object"}
+            )
+
+        # AI 응답 처리
+        result = json.loads(response.choices[0].message.content)
+        record_llm_usage("request", messages, response.choices[0].message.content,
+                         usage=getattr(response, "usage", None))
+        decision_cache.put(cache_key, result)
+        log_event("llm", market=market, source="request", model=LLM_MODEL, decision=result.get("decision"),
+                  total=time.perf_counter() - llm_started)
+    else:
+        print("캐시된 AI 판단 사용 (입력 데이터 변화 없음)")
+        record_llm_usage("cache", messages, None)
+        log_event("llm", market=market, source="cache", model=LLM_MODEL, decision=result.get("decision"),
+                  total=time.perf_counter() - llm_started)
+    print(f"판단 캐시: {decision_cache.stats()}")
     return result
 
+# 여러 마켓을 묶음 요청으로 판단 (뉴스는 공통 데이터로 한 번만 보냄)
+# 반환값: {마켓: {"decision", "percentage", "reason"}} (페이로드를 만들지 못한 마켓은 제외)
+def ai_trading_batch(markets, cycle):
+    market_contents = {}
+    for market in markets:
+        try:
+            market_contents[market] = market_prompt(market, cycle, include_news=False)
+        except Exception as e:
+            print(f"[{market}] 판단 실패: {e}")
+    if not market_contents:
+        return {}
+
+    client = recording_client(get_openai_client(), llm_recordings, LLM_RECORD_MODE)
+    with span("llm.batch", markets=list(market_contents)):
+        results, report = decide_markets(client, LLM_MODEL, SYSTEM_PROMPT, {"news": cycle["news"]},
+                                         market_contents, cache=decision_cache)
+    print(format_batch_report(report))
+    for batch in report["batches"]:
+        metrics.inc("trade_llm_decisions_total", len(batch["markets"]), source="cache" if batch["cached"] else "batch")
+        metrics.inc("trade_llm_tokens_total", batch["prompt_tokens"], kind="prompt")
+        metrics.inc("trade_llm_tokens_total", batch["completion_tokens"], kind="completion")
+        if batch.get("error"):
+            metrics.inc("trade_api_errors_total", source="llm")
+            for market in batch["markets"]:
+                if market in results:
+                    results[market] = dict(results[market], fallback=True)  # 실패한 묶음의 대체 hold
+        log_event("llm", markets=batch["markets"], source="cache" if batch["cached"] else "batch",
+                  model=LLM_MODEL, total=batch["latency"], prompt_tokens=batch["prompt_tokens"],
+                  completion_tokens=batch["completion_tokens"], cost=batch["cost"], error=batch.get("error"))
+    print(f"판단 캐시: {decision_cache.stats()}")
+    return results
+
+# 주문 하나를 EXECUTION_STRATEGY 로 실행할 때 거래소에 넣는 주문 수 (twap/vwap 은 분할마다 하나)
+# limit 은 최우선 호가가 바뀌면 다시 걸기 때문에 실행 뒤 실제 수로 보정
+def planned_orders():
+    return EXECUTION_SLICES if EXECUTION_STRATEGY in ("twap", "vwap") else 1
+
+# 주문 이벤트 기록 (이벤트 로그 + 마켓/방향/상태별 주문 수 메트릭, 실패는 API 오류로도 집계)
+# 접수/예약된 주문은 위험 확인의 시간당 주문 수에도 반영 (예약은 분할 수만큼)
+def order_event(market, side, state, **data):
+    metrics.inc("trade_orders_total", market=market, side=side, state=state)
+    if state == "submitted":
+        risk_engine.record_order()
+    elif state == "scheduled":
+        risk_engine.record_order(count=planned_orders())
+    if state == "failed":
+        metrics.inc("trade_api_errors_total", source="order")
+    log_event("order", market=market, side=side, state=state, **data)
+
+# 주문 전 위험 확인 (risk.py, 메모리 값만 비교): 한도를 넘으면 거절하거나 보유 한도에 맞게 줄임
+#   amount: 매수는 KRW, 매도는 코인 수량 / position: 지금 보유한 코인 평가액 (KRW)
+# 반환값: (주문 크기, 거절 여부)
+def risk_limit(market, side, amount, price, position):
+    if amount * (price if side == "sell" else 1) <= MIN_ORDER_KRW:
+        return amount, False
+    allowed, adjusted, reason = risk_engine.check(market, side, amount, position=position,
+                                                  orders=planned_orders())
+    if reason:
+        action = "reduce" if allowed else "reject"
+        print(f"### [{market}] Risk {action}: {reason} ###")
+        metrics.inc("trade_risk_blocks_total", market=market, rule=reason.split(":")[0], action=action)
+        log_event("risk", market=market, side=side, action=action, reason=reason, requested=amount,
+                  amount=adjusted, **risk_engine.state())
+    return (adjusted if allowed else amount), not allowed  # 거절이면 요청 크기를 그대로 (이벤트 기록용)
+
+# 주문 전 유동성 확인: 최근 호가로 예상 체결가를 계산해 판단 시점 현재가 대비 슬리피지가
+# MAX_SLIPPAGE_BPS 를 넘으면 한도 안에 드는 크기로 줄이고, 최소 주문 금액도 넘으면 주문을 미룸
+# 반환값: (주문 크기, 미룸 여부) - 호가 조회에 실패하면 원래 크기 그대로
+# 시장가 한 번으로 체결할 때만 확인 (twap/vwap/limit 은 나눠서 / 최우선 호가에 걸어서 체결하므로
+# 전체 크기를 한 번에 호가를 쓸어 담는 기준으로 줄이면 나눠 실행하는 의미가 없어짐)
+def liquidity_limit(market, side, amount, price):
+    if EXECUTION_STRATEGY != "market":
+        return amount, False
+    if MAX_SLIPPAGE_BPS <= 0 or amount * (price if side == "sell" else 1) <= MIN_ORDER_KRW:
+        return amount, False
+    try:
+        with span("orderbook.check", market=market, side=side) as attrs:
+            check = liquidity_check(side, amount, orderbook_recorder.book(market), price)
+            attrs.update(action=check["action"], expected_bps=check["expected_bps"])
+    except Exception as e:
+        print(f"[{market}] 호가 확인 실패 (주문 크기 그대로 진행): {e}")
+        metrics.inc("trade_api_errors_total", source="orderbook")
+        return amount, False
+    metrics.inc("trade_liquidity_checks_total", market=market, action=check["action"])
+    log_event("liquidity", market=market, side=side, requested=amount, **check)
+    if check["action"] == "reduce":
+        print(f"### [{market}] 예상 슬리피지 {check['expected_bps']:.1f}bps > {MAX_SLIPPAGE_BPS:g}bps: "
+              f"주문 크기 {amount:,.8g} -> {check['amount']:,.8g} ###")
+    if check["action"] == "delay":
+        return amount, True
+    return check["amount"], False
+
+# 여러 마켓 주문이 같은 KRW 잔고를 나눠 쓰므로 주문 금액 계산과 접수는 한 번에 하나씩
+order_lock = threading.Lock()
+
+# 주문 실행 함수 (판단과 비율만 있으면 reason 을 기다리지 않고 바로 실행)
+# balances / prices: 사이클에서 한 번 조회한 잔고/현재가 (없으면 새로 조회)
+#   매수 금액만큼 balances["KRW"] 를 줄여서 다음 마켓 주문이 이미 쓴 KRW 를 다시 쓰지 않도록 함
+# EXECUTION_STRATEGY 가 market 이 아니면 execution.py 엔진으로 나눠/지정가로 실행 (candles: vwap 비중용 1시간봉)
+# 위험 한도(risk.py)를 넘으면 주문하지 않거나 줄이고, 호가가 얇아 주문을 미루면 SLIPPAGE_RETRY_DELAY 뒤에 다시 시도 (attempt: 지금까지 미룬 횟수)
+# 반환값: (주문/판단 수행 여부, 체결 정보 또는 None)
+def place_order(bithumb, market, decision, percentage, balances=None, prices=None, candles=None, attempt=0):
+    coin = currency(market)
+    order_executed = False
+    order_response = None
+    planned = None
+    delayed = False
+    rejected = False
+
+    with order_lock:
+        # 잔고 확인
+        if balances is None:
+            balances = fetch_balances(bithumb)
+        my_krw = balances.get("KRW", 0.0)
+        my_coin = balances.get(coin, 0.0)
+        current_price = (prices or {}).get(market) or fetch_prices([market])[market]
+
+        # 결정 출력
+        print(f"### [{market}] AI Decision: {decision.upper()} ###")
+        
+        # 투자 비율 (0-100%)
+        print(f"### Investment Percentage: {percentage}% ###")
+        
+        if decision == "buy":
+            amount = my_krw * (percentage / 100) * 0.997  # 수수료 고려
+            amount, rejected = risk_limit(market, "buy", amount, current_price, my_coin * current_price)
+            if not rejected:
+                amount, delayed = liquidity_limit(market, "buy", amount, current_price)
+            
+            if rejected:
+                order_event(market, side="buy", state="rejected", amount=amount)
+            elif delayed:
+                print(f"### Buy Delayed: expected slippage above {MAX_SLIPPAGE_BPS:g}bps ###")
+                order_event(market, side="buy", state="delayed", amount=amount, attempt=attempt)
+            elif amount > 5000 and EXECUTION_STRATEGY != "market":
+                # 실행은 잠금 밖에서 (잔고는 지금 차감해서 다른 마켓 주문이 다시 쓰지 않도록 함)
+                print(f"### Buy Order: {amount:,.0f} KRW ({EXECUTION_STRATEGY}) ###")
+                planned = ("buy", amount)
+                order_executed = True
+                balances["KRW"] = my_krw - amount
+                order_event(market, side="buy", state="scheduled", amount=amount, strategy=EXECUTION_STRATEGY)
+            elif amount > 5000:  # 최소 주문액 확인
+                print(f"### Buy Order: {amount:,.0f} KRW ###")
+                try:
+                    with span("order.place", market=market, side="buy"):
+                        order_response = bithumb.buy_market_order(market, amount)
+                    order_executed = True
+                    balances["KRW"] = my_krw - amount
+                    order_event(market, side="buy", state="submitted", amount=amount,
+                                uuid=(order_response or {}).get("uuid"))
+                except Exception as e:
+                    print(f"### Buy Failed: {str(e)} ###")
+                    order_event(market, side="buy", state="failed", amount=amount, error=str(e))
+            else:
+                print(f"### Buy Failed: Amount ({amount:,.0f} KRW) below minimum ###")
+                order_event(market, side="buy", state="skipped", amount=amount)
+
+        elif decision == "sell":
+            coin_amount = my_coin * (percentage / 100) * 0.997  # 수수료 고려
+            coin_amount, rejected = risk_limit(market, "sell", coin_amount, current_price, my_coin * current_price)
+            if not rejected:
+                coin_amount, delayed = liquidity_limit(market, "sell", coin_amount, current_price)
+            value = coin_amount * current_price
+            
+            if rejected:
+                order_event(market, side="sell", state="rejected", amount=coin_amount)
+            elif delayed:
+                print(f"### Sell Delayed: expected slippage above {MAX_SLIPPAGE_BPS:g}bps ###")
+                order_event(market, side="sell", state="delayed", amount=coin_amount, attempt=attempt)
+            elif value > 5000 and EXECUTION_STRATEGY != "market":
+                print(f"### Sell Order: {coin_amount} {coin} ({EXECUTION_STRATEGY}) ###")
+                planned = ("sell", coin_amount)
+                order_executed = True
+                balances[coin] = my_coin - coin_amount
+                order_event(market, side="sell", state="scheduled", amount=coin_amount, strategy=EXECUTION_STRATEGY)
+            elif value > 5000:  # 최소 주문액 확인
+                print(f"### Sell Order: {coin_amount} {coin} ###")
+                try:
+                    with span("order.place", market=market, side="sell"):
+                        order_response = bithumb.sell_market_order(market, coin_amount)
+                    order_executed = True
+                    balances[coin] = my_coin - coin_amount
+                    order_event(market, side="sell", state="submitted", amount=coin_amount,
+                                uuid=(order_response or {}).get("uuid"))
+                except Exception as e:
+                    print(f"### Sell Failed: {str(e)} ###")
+                    order_event(market, side="sell", state="failed", amount=coin_amount, error=str(e))
+            else:
+                print(f"### Sell Failed: Value ({value:,.0f} KRW) below minimum ###")
+                order_event(market, side="sell", state="skipped", amount=coin_amount)
+
+        elif decision == "hold":
+            print("### Hold Position ###")
+            order_executed = True  # 'hold'도 성공한 결정으로 간주
+
+    # 호가가 회복될 때까지 기다렸다가 다시 확인 (잠금 밖에서 기다리므로 다른 마켓 주문은 계속 진행)
+    if delayed:
+        if attempt < SLIPPAGE_RETRIES:
+            time.sleep(SLIPPAGE_RETRY_DELAY)
+            return place_order(bithumb, market, decision, percentage, balances=balances, prices=prices,
+                               candles=candles, attempt=attempt + 1)
+        print(f"### [{market}] Order skipped: orderbook too thin after {attempt} retries ###")
+        return False, None
+
+    # 나눠/지정가로 실행하는 주문 (체결까지 이 주문 스레드에서 기다림, 다른 마켓 주문은 기다리지 않음)
+    fill = None
+    if planned:
+        side, amount = planned
+        weights = (volume_weights(candles, EXECUTION_SLICES, EXECUTION_DURATION)
+                   if EXECUTION_STRATEGY == "vwap" else None)
+        try:
+            fill = execute_order(bithumb, market, side, amount, current_price, weights=weights)
+            if fill["children"] > planned_orders():
+                risk_engine.record_order(count=fill["children"] - planned_orders())  # 지정가 재주문
+            order_event(market, side=side, state=fill["state"], amount=amount, uuid=fill["uuid"],
+                        strategy=fill["strategy"], children=fill["children"], slippage_bps=fill["slippage_bps"])
+        except Exception as e:
+            print(f"### [{market}] Execution Failed: {str(e)} ###")
+            order_event(market, side=side, state="failed", amount=amount, error=str(e))
+
+    # 고정 대기 대신 주문 상태를 조회해 실제 체결을 확인 (다른 마켓 주문은 기다리지 않음)
+    elif order_response and order_response.get("uuid"):
+        order_uuid = order_response["uuid"]
+        with span("order.fill_wait", market=market) as attrs:
+            fill = wait_for_fill(bithumb, order_uuid, timeout=ORDER_FILL_TIMEOUT,
+                                 on_state=lambda state, elapsed: log_event("order_state", market=market,
+                                                                           uuid=order_uuid, state=state,
+                                                                           elapsed=elapsed))
+            attrs["state"] = "timed out" if fill["timed_out"] else fill["state"]
+        fill.update(strategy="market", slippage_bps=slippage_bps(decision, fill["avg_price"], current_price))
+
+    # 판단 시점 현재가 대비 실제 체결가 (슬리피지) 기록
+    if fill:
+        status = "timed out" if fill["timed_out"] else fill["state"]
+        slippage = "n/a" if fill["slippage_bps"] is None else f"{fill['slippage_bps']:.1f}bps"
+        print(f"### [{market}] Order {status} in {fill['elapsed']:.2f}s: qty {fill['executed_qty']}, "
+              f"avg price {fill['avg_price']}, fee {fill['fee']}, slippage {slippage} ({fill['strategy']}) ###")
+        if fill["slippage_bps"] is not None:
+            metrics.observe("trade_slippage_bps", fill["slippage_bps"], buckets=metrics.SLIPPAGE_BUCKETS,
+                            market=market, strategy=fill["strategy"])
+
+    return order_executed, fill
+
 # 트레이딩 실행 함수
-def execute_trade():
-    # 데이터베이스 초기화
-    conn = init_db()
-    
+# 설정된 모든 마켓(MARKETS)에 대해 데이터는 한 번에 수집하고, 마켓별로 판단/주문
+# 사이클 전체가 하나의 trace 로 spans 테이블에 기록됨 (tracing.py 로 Chrome trace / OpenMetrics 내보내기)
+# 사이클 결과는 메트릭으로도 남김 (성공/실패 횟수, 마지막 성공 시각, 소요 시간)
+def execute_trade(markets=None):
+    markets = markets or MARKETS
+    started = time.perf_counter()
+    try:
+        with trace("cycle", markets=markets):
+            trade_cycle(markets)
+    except Exception:
+        metrics.inc("trade_cycles_total", status="error")
+        raise
+    finally:
+        metrics.set_gauge("trade_last_cycle_duration_seconds", time.perf_counter() - started)
+        if tracing.TRACING_ENABLED:
+            try:
+                prune_spans(get_connection())
+            except Exception as e:
+                print(f"spans 정리 실패: {e}")
+    metrics.inc("trade_cycles_total", status="ok")
+    metrics.set_gauge("trade_last_success_timestamp_seconds", time.time())
+
+def trade_cycle(markets):
     # 로그에 실행 시간 기록
     current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{current_time}] 트레이딩 작업 실행 중...")
-    
-    # AI 결정 얻기
-    result = ai_trading()
-    print(result)
+    print(f"[{current_time}] 트레이딩 작업 실행 중... ({', '.join(markets)})")
     
     # 빗썸 API 연결
     access = os.getenv("BITHUMB_ACCESS_KEY")
     secret = os.getenv("BITHUMB_SECRET_KEY")
-    bithumb = python_bithumb.Bithumb(access, secret)
+    bithumb = get_bithumb(access, secret)
 
-    # 잔고 확인
-    my_krw = bithumb.get_balance("KRW")
-    my_btc = bithumb.get_balance("BTC")
-    current_price = python_bithumb.get_current_price("KRW-BTC")
+    # 잔고, 현재가, 뉴스, 마켓별 캔들을 한 번에 수집 (모든 마켓이 공유)
+    cycle = collect_cycle(bithumb, markets)
+    balances = dict(cycle["balances"])
 
-    # 결정 출력
-    print(f"### AI Decision: {result['decision'].upper()} ###")
-    print(f"### Reason: {result['reason']} ###")
-    
-    # 투자 비율 (0-100%)
-    percentage = result.get("percentage", 0)
-    print(f"### Investment Percentage: {percentage}% ###")
-    
-    order_executed = False
-    
-    if result["decision"] == "buy":
-        amount = my_krw * (percentage / 100) * 0.997  # 수수료 고려
-        
-        if amount > 5000:  # 최소 주문액 확인
-            print(f"### Buy Order: {amount:,.0f} KRW ###")
-            try:
-                bithumb.buy_market_order("KRW-BTC", amount)
-                order_executed = True
-            except Exception as e:
-                print(f"### Buy Failed: {str(e)} ###")
-        else:
-            print(f"### Buy Failed: Amount ({amount:,.0f} KRW) below minimum ###")
+    # 판단이 확인되면 별도 스레드에서 바로 주문 시작 (reason 은 그동안 계속 스트리밍)
+    orders = {}
+    def start_order(market, decision, percentage):
+        order = orders[market] = {"decision": decision, "percentage": percentage}
+        def run():
+            order["executed"], order["fill"] = place_order(bithumb, market, decision, percentage,
+                                                           balances=balances, prices=cycle["prices"],
+                                                           candles=cycle["candles"].get(market))
+        order["thread"] = threading.Thread(target=in_context(run), name=f"order-{market}")
+        order["thread"].start()
 
-    elif result["decision"] == "sell":
-        btc_amount = my_btc * (percentage / 100) * 0.997  # 수수료 고려
-        value = btc_amount * current_price
-        
-        if value > 5000:  # 최소 주문액 확인
-            print(f"### Sell Order: {btc_amount} BTC ###")
-            try:
-                bithumb.sell_market_order("KRW-BTC", btc_amount)
-                order_executed = True
-            except Exception as e:
-                print(f"### Sell Failed: {str(e)} ###")
-        else:
-            print(f"### Sell Failed: Value ({value:,.0f} KRW) below minimum ###")
+    # 여러 마켓이면 한 번에 묶어서 판단한 뒤 바로 주문
+    results = {}
+    batched = LLM_BATCH_DECISIONS and len(markets) > 1
+    if batched:
+        results = ai_trading_batch(markets, cycle)
+        for market, result in results.items():
+            print(f"[{market}] {result}")
+            start_order(market, result["decision"], result.get("percentage", 0))
 
-    elif result["decision"] == "hold":
-        print("### Hold Position ###")
-        order_executed = True  # 'hold'도 성공한 결정으로 간주
-    
-    # 잔고 업데이트를 위해 잠시 대기
-    time.sleep(1)
-    
-    # 거래 후 최신 잔고 조회
-    updated_krw = bithumb.get_balance("KRW")
-    updated_btc = bithumb.get_balance("BTC")
-    updated_price = python_bithumb.get_current_price("KRW-BTC")
-    
-    # 거래 정보 로깅
-    log_trade(
-        conn,
-        result["decision"],
-        percentage if order_executed else 0,
-        result["reason"],
-        updated_btc,
-        updated_krw, 
-        updated_price
-    )
+    # 마켓별 AI 결정 얻기 (한 마켓이 실패해도 나머지는 계속)
+    for market in ([] if batched else markets):
+        try:
+            result = ai_trading(market, cycle,
+                                on_decision=lambda decision, percentage, m=market: start_order(m, decision, percentage))
+        except Exception as e:
+            print(f"[{market}] 판단 실패: {e}")
+            # 판단이 도착해 주문이 이미 시작됐으면 그 주문도 거래 기록에 남김
+            if market in orders:
+                results[market] = {"decision": orders[market]["decision"],
+                                   "percentage": orders[market]["percentage"],
+                                   "reason": f"AI response handling failed after the decision: {e}"}
+            continue
+        print(f"[{market}] {result}")
+        print(f"### [{market}] Reason: {result['reason']} ###")
+        results[market] = result
+
+        # 스트리밍이 아니었거나 캐시된 판단이면 지금 주문
+        if market not in orders:
+            start_order(market, result["decision"], result.get("percentage", 0))
+
+    # 모델이 실제로 판단한 마켓이 있으면 이번에 보낸 뉴스를 본 것으로 처리 (실패/대체 hold 면 다음 판단에 다시 보냄)
+    if news_store is not None and any(not result.get("fallback") for result in results.values()):
+        news_store.commit_cursor()
+
+    for order in orders.values():
+        order["thread"].join()
     
-    # 데이터베이스 연결 종료
-    conn.close()
+    # 거래 후 최신 잔고/현재가를 한 번씩 조회 (체결 확인 후이므로 별도 대기 없음)
+    # 조회에 실패해도 이미 낸 주문은 기록해야 하므로 사이클 시작 시 값으로 대신함
+    try:
+        with span("fetch.post_trade"):
+            updated_balances = fetch_balances(bithumb)
+            updated_prices = fetch_prices(markets)
+    except Exception as e:
+        print(f"거래 후 잔고/현재가 조회 실패 (사이클 시작 시 값으로 기록): {e}")
+        metrics.inc("trade_api_errors_total", source="post_trade")
+        updated_balances, updated_prices = balances, cycle["prices"]
+    updated_krw = updated_balances.get("KRW", 0.0)
+
+    total_value = portfolio_value(updated_balances, updated_prices)
+    log_event("balance", balances=updated_balances, prices=updated_prices, total_value=total_value)
+    for name, balance in updated_balances.items():
+        metrics.set_gauge("trade_balance", balance, currency=name)
+    for market, price in updated_prices.items():
+        metrics.set_gauge("trade_price_krw", price, market=market)
+    metrics.set_gauge("trade_portfolio_value_krw", total_value)
+    risk_engine.update_equity(total_value)
+
+    # 거래 정보 로깅 (백그라운드 writer 가 묶어서 기록)
+    for market, result in results.items():
+        order = orders.get(market, {})
+        log_trade(
+            market,
+            result["decision"],
+            result.get("percentage", 0) if order.get("executed") else 0,
+            result["reason"],
+            updated_balances.get(currency(market), 0.0),
+            updated_krw, 
+            updated_prices.get(market),
+            fill=order.get("fill")
+        )
     
+    print(f"HTTP 요청 통계: {request_stats()}")
+    print(f"DB 기록 통계: {event_log.get_writer().stats()}")
     print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 트레이딩 작업 완료")
 
 # 스케줄링 실행을 위한 메인 함수
 def run_scheduler():
     # 데이터베이스 초기화
     init_db()
+    tracing.enable(TRACING)
+    metrics.start_server()  # /metrics, /healthz (METRICS_PORT, 0 이면 끔)
+    orderbook_recorder.start()  # 호가 스냅샷 수집 (ORDERBOOK_CAPTURE_INTERVAL, 0 이면 주문 직전에만 조회)
+    if news_store is not None:
+        news_store.start()
     
     print("비트코인 자동 트레이딩 시스템 시작...")
     print("스케줄링된 실행 시간: 매일 09:00, 15:00, 21:00")
@@ -276,10 +769,46 @@ def run_scheduler():
     schedule.every().day.at("21:00").do(execute_trade)
     
     # 스케줄 루프 실행
-    while True:
-        schedule.run_pending()
-        time.sleep(60)  # 1분마다 스케줄 확인
+    try:
+        while True:
+            schedule.run_pending()
+            time.sleep(60)  # 1분마다 스케줄 확인
+    finally:
+        metrics.stop_server()
+        orderbook_recorder.stop()
+        if news_store is not None:
+            news_store.close()
+        close_all()  # 공유 HTTP 연결 정리
+        event_log.close()  # 대기 중인 거래/이벤트 기록
+        db_connections.close_all()
+
+# 실시간 시세 기반 실행: 정해진 시각 + 급등락/변동성 급증/캔들 마감 시 즉시 실행
+def run_event_driven():
+    init_db()
+    tracing.enable(TRACING)
+    metrics.start_server()  # /metrics, /healthz (METRICS_PORT, 0 이면 끔)
+    orderbook_recorder.start()  # 호가 스냅샷 수집 (ORDERBOOK_CAPTURE_INTERVAL, 0 이면 주문 직전에만 조회)
+    if news_store is not None:
+        news_store.start()
+
+    print("비트코인 자동 트레이딩 시스템 시작 (실시간 이벤트 모드)...")
+    trader = EventDrivenTrader(execute_trade, markets=MARKETS)
+    print(f"트리거 설정: {trader.triggers}")
+
+    try:
+        asyncio.run(trader.run())
+    finally:
+        metrics.stop_server()
+        orderbook_recorder.stop()
+        if news_store is not None:
+            news_store.close()
+        close_all()  # 공유 HTTP 연결 정리
+        event_log.close()  # 대기 중인 거래/이벤트 기록
+        db_connections.close_all()
 
-# 실행
+# 실행 (--events: 실시간 이벤트 모드)
 if __name__ == "__main__":
-    run_scheduler()
\ No newline at end of file
+    if "--events" in sys.argv:
+        run_event_driven()
+    else:
+        run_scheduler()
\ No newline at end of file
@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+import candle_store
+from db_connections import TRADE_DB_PATH, snapshot
+
+# execute_trade() 와 같은 주문 규칙
+SIZE_FACTOR = 0.997      # 주문 금액/수량에 곱하는 수수료 여유분
+MIN_ORDER_KRW = 5000     # 최소 주문 금액
+FEE_RATE = 0.0025        # 거래소 수수료율 (체결 금액 기준)
+
+BUY, HOLD, SELL = 1, 0, -1
+DECISION_CODES = {"buy": BUY, "hold": HOLD, "sell": SELL}
+
+
+# 캔들 저장소에 쌓인 전체 캔들을 읽는 함수 (백테스트용)
+def load_bars(market="KRW-BTC", interval="minute60", path=candle_store.CANDLE_DB_PATH):
+    conn = candle_store.init_candle_db(path)
+    try:
+        count = conn.execute("SELECT COUNT(*) FROM candles WHERE market = ? AND interval = ?",
+                             (market, interval)).fetchone()[0]
+        return candle_store.load_window(conn, market, interval, count)
+    finally:
+        conn.close()
+
+
+# --- 판단 소스: bars(DataFrame) 를 받아 (actions, percentages) 배열을 반환 ---
+
+# 이동평균 교차 규칙: 단기선이 장기선을 상향 돌파하면 매수, 하향 돌파하면 매도
+#   trend: 지정하면 종가가 이 기간 이동평균 위에 있을 때만 매수
+def sma_cross_actions(close, fast=24, slow=72, percentage=20, trend=None):
+    close = np.asarray(close, dtype=float)
+    fast_ma = _rolling_mean(close, fast)
+    slow_ma = _rolling_mean(close, slow)
+    above = fast_ma > slow_ma
+    valid = ~np.isnan(slow_ma)
+    crossed = np.zeros(len(close), dtype=bool)
+    crossed[1:] = (above[1:] != above[:-1]) & valid[1:] & valid[:-1]
+    actions = np.where(crossed, np.where(above, BUY, SELL), HOLD)
+    if trend:
+        trend_ma = _rolling_mean(close, trend)
+        actions[(actions == BUY) & ~(close > trend_ma)] = HOLD
+    return actions, np.full(len(close), percentage, dtype=float)
+
+
+def sma_cross_signal(fast=24, slow=72, percentage=20, trend=None):
+    def source(bars):
+        return sma_cross_actions(bars["close"].to_numpy(dtype=float), fast, slow, percentage, trend)
+    return source
+
+
+# trades 테이블에 기록된 market 의 실제 AI 판단을 해당 시각의 봉에 배치 (판단 시점 이전에 열린 마지막 봉)
+# market 컬럼이 없는 (마이그레이션 전) DB 는 모든 기록이 KRW-BTC 판단이므로 전체를 사용
+def recorded_decisions(db_path=TRADE_DB_PATH, market="KRW-BTC"):
+    with snapshot(db_path) as conn:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(trades)")}
+        if "market" in columns:
+            trades = pd.read_sql_query("SELECT timestamp, decision, percentage FROM trades WHERE market = ? "
+                                       "ORDER BY timestamp", conn, params=(market,))
+        else:
+            trades = pd.read_sql_query("SELECT timestamp, decision, percentage FROM trades ORDER BY timestamp", conn)
+
+    def source(bars):
+        n = len(bars)
+        actions = np.zeros(n, dtype=int)
+        percentages = np.zeros(n, dtype=float)
+        times = pd.to_datetime(trades["timestamp"]).to_numpy(dtype="datetime64[ns]")
+        positions = np.searchsorted(bars.index.to_numpy(dtype="datetime64[ns]"), times, side="right") - 1
+        codes = trades["decision"].str.lower().map(DECISION_CODES).fillna(HOLD).to_numpy(dtype=int)
+        inside = (positions >= 0) & (positions < n)
+        actions[positions[inside]] = codes[inside]
+        percentages[positions[inside]] = trades["percentage"].fillna(0).to_numpy(dtype=float)[inside]
+        return actions, percentages
+    return source
+
+
+def _rolling_mean(values, window):
+    out = np.full(len(values), np.nan)
+    if window <= len(values):
+        cumsum = np.cumsum(np.insert(values, 0, 0.0))
+        out[window - 1:] = (cumsum[window:] - cumsum[:-window]) / window
+    return out
+
+
+# --- 시뮬레이션 ---
+
+# 판단 배열을 execute_trade() 의 주문 규칙으로 재생하는 함수
+#   actions: BUY/SELL/HOLD 배열, percentages: 0-100 (범위 밖 값은 잘라냄)
+#   slot_hours: 지정하면 해당 시(hour)에 열린 봉의 판단만 실행 (스케줄 시각 재현)
+# 잔고는 판단이 있는 봉에서만 바뀌므로 판단 지점만 순회하고, 봉 단위 잔고/평가액 곡선은 벡터 연산으로 펼침
+def simulate(close, actions, percentages, initial_krw=1_000_000.0, initial_btc=0.0,
+             max_percentage=100, min_order=MIN_ORDER_KRW, size_factor=SIZE_FACTOR, fee_rate=FEE_RATE,
+             hours=None, slot_hours=None):
+    close = np.asarray(close, dtype=float)
+    actions = np.asarray(actions)
+    percentages = np.clip(np.nan_to_num(np.asarray(percentages, dtype=float)), 0, max_percentage) / 100
+    active = (actions != HOLD) & (percentages > 0)
+    if slot_hours is not None and hours is not None:
+        active &= np.isin(hours, slot_hours)
+    events = np.flatnonzero(active)
+
+    krw_after = np.empty(len(events))
+    btc_after = np.empty(len(events))
+    executed = np.zeros(len(events), dtype=bool)
+    krw, btc = float(initial_krw), float(initial_btc)
+    for k, i in enumerate(events):
+        price = close[i]
+        if actions[i] == BUY:
+            amount = krw * percentages[i] * size_factor
+            if amount > min_order:
+                krw -= amount * (1 + fee_rate)
+                btc += amount / price
+                executed[k] = True
+        else:
+            qty = btc * percentages[i] * size_factor
+            if qty * price > min_order:
+                btc -= qty
+                krw += qty * price * (1 - fee_rate)
+                executed[k] = True
+        krw_after[k], btc_after[k] = krw, btc
+
+    # 각 봉에서 가장 최근 판단 이후의 잔고 (판단 전 구간은 초기 잔고)
+    last_event = np.searchsorted(events, np.arange(len(close)), side="right") - 1
+    has_event = last_event >= 0
+    krw_curve = np.where(has_event, krw_after[last_event.clip(0)] if len(events) else 0, initial_krw)
+    btc_curve = np.where(has_event, btc_after[last_event.clip(0)] if len(events) else 0, initial_btc)
+    equity = krw_curve + btc_curve * close
+    return {
+        "krw": krw_curve,
+        "btc": btc_curve,
+        "equity": equity,
+        "trade_index": events[executed],
+        "trade_action": actions[events[executed]],
+    }
+
+
+# 수익률, 최대 낙폭, 샤프 지수 (bars_per_year 로 연율화)
+def performance(equity, bars_per_year):
+    equity = np.asarray(equity, dtype=float)
+    if len(equity) < 2 or equity[0] <= 0:
+        return {"total_return": 0.0, "max_drawdown": 0.0, "sharpe": 0.0}
+    returns = np.diff(equity) / equity[:-1]
+    peak = np.maximum.accumulate(equity)
+    std = returns.std()
+    return {
+        "total_return": float(equity[-1] / equity[0] - 1),
+        "max_drawdown": float((equity / peak - 1).min()),
+        "sharpe": float(returns.mean() / std * np.sqrt(bars_per_year)) if std > 0 else 0.0,
+    }
+
+
+# 봉 간격으로 연간 봉 개수 추정
+def bars_per_year(index):
+    if len(index) < 2:
+        return 1.0
+    step = np.median(np.diff(index.to_numpy(dtype="datetime64[s]")).astype(float))
+    return 365 * 24 * 3600 / step
+
+
+# 캔들 DataFrame 과 판단 소스로 백테스트를 실행하는 함수
+def run_backtest(bars, source, **params):
+    actions, percentages = source(bars)
+    result = simulate(bars["close"].to_numpy(dtype=float), actions, percentages,
+                      hours=bars.index.hour.to_numpy(), **params)
+    result["stats"] = performance(result["equity"], bars_per_year(bars.index))
+    result["stats"]["trades"] = int(len(result["trade_index"]))
+    return result
+
+
+# 5년치 1시간봉 (합성 데이터) 재생 속도 측정
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(7)
+    n = 5 * 365 * 24
+    close = 50_000_000 * np.exp(np.cumsum(rng.normal(0.00002, 0.006, n)))
+    index = pd.date_range("2020-01-01", periods=n, freq="h")
+    bars = pd.DataFrame({"open": close, "high": close, "low": close, "close": close, "volume": 1.0}, index=index)
+
+    for label, params in [("every bar", {}), ("09/15/21 slots", {"slot_hours": (9, 15, 21)})]:
+        started = time.perf_counter()
+        result = run_backtest(bars, sma_cross_signal(24, 72, 20), **params)
+        elapsed = time.perf_counter() - started
+        stats = result["stats"]
+        print(f"{label}: {n} bars in {elapsed * 1000:.0f}ms | return {stats['total_return']:+.1%}, "
+              f"max drawdown {stats['max_drawdown']:.1%}, sharpe {stats['sharpe']:.2f}, trades {stats['trades']}")
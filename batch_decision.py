@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import asyncio
+from decision_cache import canonical_hash
+from payload_encoder import count_tokens
+from tracing import span
+
+# 한 요청에 묶을 최대 마켓 수와 사용자 메시지 토큰 예산 (넘으면 여러 요청으로 나눠 동시에 보냄)
+BATCH_MAX_MARKETS = int(os.getenv("LLM_BATCH_MAX_MARKETS", "5"))
+BATCH_TOKEN_BUDGET = int(os.getenv("LLM_BATCH_TOKEN_BUDGET", "24000"))
+# 나눠진 요청의 최대 동시 실행 수 (clients.OPENAI_SETTINGS 의 연결 수와 맞춤)
+BATCH_CONCURRENCY = int(os.getenv("LLM_BATCH_CONCURRENCY", "4"))
+
+# 모델별 가격 (USD / 100만 토큰: 입력, 출력) - LLM_PRICE_INPUT / LLM_PRICE_OUTPUT 로 덮어쓰기
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+# 시스템 프롬프트 뒤에 붙이는 묶음 요청 설명
+BATCH_INSTRUCTIONS = """
+    **Batched request:** The user message holds several markets at once:
+    'shared' has the data common to all markets (news) and 'markets' maps each market
+    (e.g. KRW-BTC) to its own chart data, balance and recent trades in the format described
+    above. Evaluate every market independently and return exactly one entry per market in
+    'decisions', each with 'market', 'decision', 'percentage' and 'reason'.
+    """
+
+
+# 마켓별 판단 목록을 강제하는 structured output 스키마
+def decision_schema(markets):
+    decision = {
+        "type": "object",
+        "properties": {
+            "market": {"type": "string", "enum": list(markets)},
+            "decision": {"type": "string", "enum": ["buy", "sell", "hold"]},
+            "percentage": {"type": "integer"},
+            "reason": {"type": "string"},
+        },
+        "required": ["market", "decision", "percentage", "reason"],
+        "additionalProperties": False,
+    }
+    return {"type": "json_schema", "json_schema": {
+        "name": "market_decisions",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"decisions": {"type": "array", "items": decision}},
+            "required": ["decisions"],
+            "additionalProperties": False,
+        },
+    }}
+
+
+# 공통 데이터 + 마켓별 페이로드를 하나의 사용자 메시지로 묶음
+#   market_contents: {마켓: encode_payload 가 만든 JSON 문자열} (다시 파싱하지 않고 그대로 이어 붙임)
+def batch_content(shared, market_contents):
+    markets = ",".join(f"{json.dumps(market)}:{content}" for market, content in market_contents.items())
+    return f'{{"shared":{json.dumps(shared, ensure_ascii=False, separators=(",", ":"))},"markets":{{{markets}}}}}'
+
+
+# 마켓 수 / 토큰 예산에 맞게 순서대로 묶음을 나누는 함수 (예산보다 큰 마켓은 혼자 한 묶음)
+def split_batches(market_contents, max_markets=BATCH_MAX_MARKETS, token_budget=BATCH_TOKEN_BUDGET):
+    batches, current, tokens = [], [], 0
+    for market, content in market_contents.items():
+        size = count_tokens(content)
+        if current and (len(current) >= max_markets or (token_budget and tokens + size > token_budget)):
+            batches.append(current)
+            current, tokens = [], 0
+        current.append(market)
+        tokens += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+# 응답에서 마켓별 판단 추출 (빠진 마켓은 hold, 비율은 0-100 으로 제한)
+def parse_decisions(text, markets):
+    try:
+        entries = json.loads(text).get("decisions", [])
+    except (ValueError, AttributeError):
+        entries = []
+    decisions = {}
+    for entry in entries:
+        market = entry.get("market") if isinstance(entry, dict) else None
+        if market in markets and market not in decisions:
+            decision = str(entry.get("decision", "hold")).lower()
+            decisions[market] = {
+                "decision": decision if decision in ("buy", "sell", "hold") else "hold",
+                "percentage": min(100, max(0, int(entry.get("percentage") or 0))),
+                "reason": entry.get("reason", ""),
+            }
+    for market in markets:
+        decisions.setdefault(market, {"decision": "hold", "percentage": 0,
+                                      "reason": "No decision for this market in the batched AI response"})
+    return decisions
+
+
+# 토큰 사용량의 예상 비용 (USD)
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    input_price, output_price = MODEL_PRICES.get(model, MODEL_PRICES["gpt-4o"])
+    input_price = float(os.getenv("LLM_PRICE_INPUT", input_price))
+    output_price = float(os.getenv("LLM_PRICE_OUTPUT", output_price))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+# 묶음 하나를 요청 (동기 클라이언트를 스레드에서 실행해 여러 묶음을 동시에 기다림)
+async def _request_batch(client, model, messages, markets, semaphore):
+    async with semaphore:
+        started = time.perf_counter()
+        with span("llm.request", markets=markets):
+            response = await asyncio.to_thread(client.chat.completions.create, model=model, messages=messages,
+                                               response_format=decision_schema(markets))
+        latency = time.perf_counter() - started
+    text = response.choices[0].message.content
+    # 녹화 재생 응답에는 usage 가 없으므로 토큰 수를 직접 셈
+    usage = getattr(response, "usage", None)
+    prompt_tokens = usage.prompt_tokens if usage else sum(count_tokens(m["content"]) for m in messages)
+    completion_tokens = usage.completion_tokens if usage else count_tokens(text)
+    return {"markets": markets, "text": text, "latency": latency, "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens, "cached": False}
+
+
+async def _request_all(client, model, requests, concurrency):
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    return await asyncio.gather(*(_request_batch(client, model, messages, markets, semaphore)
+                                  for markets, messages in requests), return_exceptions=True)
+
+
+# 여러 마켓의 판단을 묶음 요청으로 받는 함수
+#   shared: 모든 마켓에 공통인 데이터 (뉴스 등), market_contents: {마켓: 페이로드 JSON 문자열}
+#   cache: decision_cache.DecisionCache (묶음 단위로 재사용, 없으면 매번 요청)
+# 반환값: ({마켓: {"decision", "percentage", "reason"}}, 처리량/비용 리포트)
+def decide_markets(client, model, system_prompt, shared, market_contents, cache=None,
+                   max_markets=BATCH_MAX_MARKETS, token_budget=BATCH_TOKEN_BUDGET, concurrency=BATCH_CONCURRENCY):
+    started = time.perf_counter()
+    system = system_prompt + BATCH_INSTRUCTIONS
+    decisions, batches, requests = {}, [], []
+    for markets in split_batches(market_contents, max_markets, token_budget):
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": batch_content(shared, {m: market_contents[m] for m in markets})},
+        ]
+        key = canonical_hash({"model": model, "messages": messages})
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            decisions.update(parse_decisions(json.dumps(cached), markets))
+            batches.append({"markets": markets, "latency": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+                            "cached": True})
+        else:
+            requests.append((markets, messages, key))
+
+    if requests:
+        results = asyncio.run(_request_all(client, model, [(m, msgs) for m, msgs, _ in requests], concurrency))
+        for (markets, _, key), result in zip(requests, results):
+            # 실패한 묶음의 마켓은 hold (다른 묶음 결과는 그대로 사용)
+            if isinstance(result, Exception):
+                print(f"묶음 판단 요청 실패 ({', '.join(markets)}): {result}")
+                decisions.update(parse_decisions("", markets))
+                batches.append({"markets": markets, "latency": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+                                "cached": False, "error": str(result)})
+                continue
+            decisions.update(parse_decisions(result.pop("text"), markets))
+            if cache is not None:
+                cache.put(key, {"decisions": [dict(decisions[m], market=m) for m in markets]})
+            batches.append(result)
+
+    wall_time = time.perf_counter() - started
+    return decisions, throughput_report(model, batches, wall_time)
+
+
+# 판단 1건당 처리량/토큰/비용
+def throughput_report(model, batches, wall_time):
+    count = sum(len(batch["markets"]) for batch in batches)
+    prompt_tokens = sum(batch["prompt_tokens"] for batch in batches)
+    completion_tokens = sum(batch["completion_tokens"] for batch in batches)
+    cost = estimate_cost(model, prompt_tokens, completion_tokens)
+    for batch in batches:
+        batch["cost"] = estimate_cost(model, batch["prompt_tokens"], batch["completion_tokens"])
+    return {
+        "decisions": count,
+        "requests": sum(1 for batch in batches if not batch["cached"]),
+        "wall_time": wall_time,
+        "decisions_per_sec": count / wall_time if wall_time > 0 else None,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "tokens_per_decision": (prompt_tokens + completion_tokens) / count if count else 0,
+        "cost": cost,
+        "cost_per_decision": cost / count if count else 0.0,
+        "batches": batches,
+    }
+
+
+def format_report(report):
+    return (f"판단 {report['decisions']}건 / 요청 {report['requests']}회 in {report['wall_time']:.2f}s "
+            f"({report['decisions_per_sec'] or 0:.2f} decisions/s) | "
+            f"토큰 {report['tokens_per_decision']:.0f}/판단, 비용 ${report['cost_per_decision']:.5f}/판단 "
+            f"(총 ${report['cost']:.5f})")
+
+
+# 가짜 모델로 마켓별 개별 요청 / 한 번에 묶음 / 나눈 묶음 동시 요청 비교 (네트워크 없음)
+#   응답 시간은 입력 토큰 처리 + 출력 토큰 생성 시간에 고정 오버헤드를 더해 흉내냄
+if __name__ == "__main__":
+    import numpy as np
+    import pandas as pd
+    from types import SimpleNamespace
+    from payload_encoder import encode_payload
+
+    class StandInBatchModel:
+        def __init__(self, overhead=0.4, per_prompt_token=0.00002, per_output_token=0.004):
+            self.overhead = overhead
+            self.per_prompt_token = per_prompt_token
+            self.per_output_token = per_output_token
+            self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+        def _create(self, model, messages, response_format=None, **kwargs):
+            content = json.loads(messages[-1]["content"])
+            if "markets" in content:
+                text = json.dumps({"decisions": [
+                    {"market": m, "decision": "hold", "percentage": 0,
+                     "reason": "stand-in: range-bound price action, no clear trend"} for m in content["markets"]]})
+            else:
+                text = json.dumps({"decision": "hold", "percentage": 0,
+                                   "reason": "stand-in: range-bound price action, no clear trend"})
+            prompt_tokens = sum(count_tokens(m["content"]) for m in messages)
+            completion_tokens = count_tokens(text)
+            time.sleep(self.overhead + prompt_tokens * self.per_prompt_token
+                       + completion_tokens * self.per_output_token)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+                                   usage=SimpleNamespace(prompt_tokens=prompt_tokens,
+                                                         completion_tokens=completion_tokens))
+
+    rng = np.random.default_rng(19)
+    system_prompt = "You are an expert in cryptocurrency investing. " * 40
+    news = [{"title": f"Crypto market headline {i}", "date": "1 hour ago"} for i in range(5)]
+    market_contents = {}
+    for i, market in enumerate(["KRW-BTC", "KRW-ETH", "KRW-XRP", "KRW-SOL", "KRW-DOGE", "KRW-ADA", "KRW-LINK",
+                                "KRW-DOT"]):
+        index = pd.date_range("2026-01-01", periods=24, freq="h")
+        close = 10 ** (2 + i % 6) * np.exp(np.cumsum(rng.normal(0, 0.005, len(index))))
+        df = pd.DataFrame({"open": close, "high": close * 1.002, "low": close * 0.998, "close": close,
+                           "volume": rng.random(len(index)) * 100}, index=index)
+        payload = {"market": market, "current_balance": {"krw": 1e6, market.split("-")[1].lower(): 0.5},
+                   "recent_trades": []}
+        market_contents[market], _ = encode_payload(payload, {"short_term": df}, layout="columnar")
+
+    model = StandInBatchModel()
+    started = time.perf_counter()
+    singles = []
+    for market, content in market_contents.items():
+        with_news = content[:-1] + f',"news":{json.dumps(news)}}}'
+        request_started = time.perf_counter()
+        response = model.chat.completions.create(model="gpt-4o", messages=[
+            {"role": "system", "content": system_prompt}, {"role": "user", "content": with_news}])
+        singles.append({"markets": [market], "latency": time.perf_counter() - request_started, "cached": False,
+                        "prompt_tokens": response.usage.prompt_tokens,
+                        "completion_tokens": response.usage.completion_tokens})
+    print("one request per market: " + format_report(throughput_report("gpt-4o", singles,
+                                                                       time.perf_counter() - started)))
+
+    shared = {"news": news}
+    for label, max_markets, concurrency in (("single batch", len(market_contents), 1),
+                                             ("batches of 3, sequential", 3, 1),
+                                             ("batches of 3, concurrent", 3, BATCH_CONCURRENCY)):
+        decisions, report = decide_markets(model, "gpt-4o", system_prompt, shared, market_contents,
+                                           max_markets=max_markets, concurrency=concurrency)
+        assert set(decisions) == set(market_contents)
+        print(f"{label}: " + format_report(report))
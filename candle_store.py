@@ -0,0 +1,173 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+import python_bithumb
+
+# 캔들 캐시 DB (bitcoin_trading.db 와 같은 위치)
+CANDLE_DB_PATH = os.getenv("CANDLE_DB_PATH", "candles.db")
+
+# 콜드 스타트 이후 한 번에 받아올 최대 캔들 수 (오래 꺼져 있었을 때의 공백 메우기)
+MAX_TAIL_FETCH = 1000
+
+KST = timezone(timedelta(hours=9))
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+COLUMNS = ["open", "high", "low", "close", "volume", "value"]
+
+# 빗썸 interval 이름별 캔들 길이
+INTERVALS = {
+    "minute1": timedelta(minutes=1),
+    "minute3": timedelta(minutes=3),
+    "minute5": timedelta(minutes=5),
+    "minute10": timedelta(minutes=10),
+    "minute15": timedelta(minutes=15),
+    "minute30": timedelta(minutes=30),
+    "minute60": timedelta(hours=1),
+    "minute240": timedelta(hours=4),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+}
+
+
+# 캔들 DB 연결 및 테이블 생성 함수
+def init_candle_db(path=CANDLE_DB_PATH):
+    conn = sqlite3.connect(path, timeout=10)
+    conn.execute('''CREATE TABLE IF NOT EXISTS candles
+                    (market TEXT NOT NULL,
+                     interval TEXT NOT NULL,
+                     open_time TEXT NOT NULL,
+                     open REAL,
+                     high REAL,
+                     low REAL,
+                     close REAL,
+                     volume REAL,
+                     value REAL,
+                     PRIMARY KEY (market, interval, open_time)) WITHOUT ROWID''')
+    conn.commit()
+    return conn
+
+
+# 현재 한국 시간 (빗썸 캔들 시간은 KST 기준)
+def now_kst():
+    return datetime.now(KST).replace(tzinfo=None)
+
+
+# 캔들 시작 시간을 KST 문자열로 변환
+def _format_open_time(ts):
+    ts = pd.Timestamp(ts)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("Asia/Seoul").tz_localize(None)
+    return ts.strftime(TIME_FORMAT)
+
+
+# 받아온 OHLCV DataFrame 을 캔들 테이블에 저장 (같은 캔들은 덮어씀)
+def save_candles(conn, market, interval, df):
+    if df is None or df.empty:
+        return 0
+    rows = []
+    for ts, row in df.iterrows():
+        values = [row.get(col) for col in COLUMNS]
+        rows.append((market, interval, _format_open_time(ts),
+                     *[None if pd.isna(v) else float(v) for v in values]))
+    conn.executemany("""INSERT OR REPLACE INTO candles
+                        (market, interval, open_time, open, high, low, close, volume, value)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""", rows)
+    conn.commit()
+    return len(rows)
+
+
+# 가장 최근에 저장된 캔들 시작 시간
+def last_open_time(conn, market, interval):
+    row = conn.execute("SELECT MAX(open_time) FROM candles WHERE market = ? AND interval = ?",
+                       (market, interval)).fetchone()
+    return datetime.strptime(row[0], TIME_FORMAT) if row and row[0] else None
+
+
+# since 이후 시작한 저장 캔들 수
+def stored_count(conn, market, interval, since):
+    row = conn.execute("SELECT COUNT(*) FROM candles WHERE market = ? AND interval = ? AND open_time >= ?",
+                       (market, interval, since.strftime(TIME_FORMAT))).fetchone()
+    return row[0]
+
+
+# 이번 동기화에서 받아와야 할 캔들 수 계산
+#   - 콜드 스타트: 요청한 윈도우 전체
+#   - 이후: 마지막 저장 캔들(아직 진행 중이었을 수 있음)부터 현재까지의 꼬리만
+#     (꼬리가 MAX_TAIL_FETCH 보다 길면 중간이 비지 않도록 윈도우 전체)
+#   - 꼬리 앞쪽의 저장 캔들이 윈도우를 다 채우지 못하면 (윈도우를 늘렸거나 중간이 빈 경우) 윈도우 전체
+#   stored: since 이후 저장 캔들 수를 돌려주는 함수
+def missing_count(last_time, interval, window, now=None, stored=None):
+    if last_time is None:
+        return window
+    now = now or now_kst()
+    elapsed = max(0, int((now - last_time) / INTERVALS[interval]))
+    tail = elapsed + 1
+    if tail >= window:
+        return tail if tail <= MAX_TAIL_FETCH else window
+    # 꼬리가 채우지 않는 나머지 (window - tail) 개와 마지막 저장 캔들이 모두 있어야 함
+    since = last_time - INTERVALS[interval] * (window - tail)
+    if stored is not None and stored(since) < window - tail + 1:
+        return window
+    return tail
+
+
+# 빠진 캔들만 거래소에서 받아와 저장하는 함수
+def sync_candles(conn, market, interval, window, full=False):
+    if full:
+        count = window
+    else:
+        count = missing_count(last_open_time(conn, market, interval), interval, window,
+                              stored=lambda since: stored_count(conn, market, interval, since))
+    df = python_bithumb.get_ohlcv(market, interval=interval, count=count)
+    return save_candles(conn, market, interval, df)
+
+
+# 캔들 시작 시간이 interval 간격으로 빠짐없이 이어지는지 확인
+def is_contiguous(df, interval):
+    if df is None or len(df) < 2:
+        return True
+    return bool((df.index.to_series().diff().iloc[1:] == INTERVALS[interval]).all())
+
+
+# 로컬 저장소에서 최근 count 개 캔들을 DataFrame 으로 읽는 함수
+def load_window(conn, market, interval, count):
+    rows = conn.execute("""SELECT open_time, open, high, low, close, volume, value
+                           FROM candles
+                           WHERE market = ? AND interval = ?
+                           ORDER BY open_time DESC
+                           LIMIT ?""", (market, interval, count)).fetchall()
+    if not rows:
+        return None
+    df = pd.DataFrame(rows[::-1], columns=["open_time"] + COLUMNS)
+    df.index = pd.to_datetime(df.pop("open_time"))
+    if df["value"].isna().all():
+        df = df.drop(columns="value")
+    return df
+
+
+_local = threading.local()
+
+
+# 현재 스레드에서 재사용할 캔들 DB 연결 (마켓별 조회가 여러 스레드에서 동시에 실행됨)
+def _thread_connection(path):
+    connections = _local.__dict__.setdefault("connections", {})
+    conn = connections.get(path)
+    if conn is None:
+        conn = connections[path] = init_candle_db(path)
+    return conn
+
+
+# python_bithumb.get_ohlcv 대신 쓰는 함수: 빠진 캔들만 동기화한 뒤 로컬 저장소에서 윈도우를 반환
+# 읽은 윈도우가 짧거나 중간이 비어 있으면 윈도우 전체를 다시 받아옴
+# (그래도 비어 있으면 거래소에 해당 캔들이 없는 것이므로 그대로 반환)
+def get_ohlcv(market, interval="day", count=200, path=CANDLE_DB_PATH):
+    conn = _thread_connection(path)
+    sync_candles(conn, market, interval, count)
+    df = load_window(conn, market, interval, count)
+    if df is None or len(df) < count or not is_contiguous(df, interval):
+        sync_candles(conn, market, interval, count, full=True)
+        df = load_window(conn, market, interval, count)
+        if df is not None and not is_contiguous(df, interval):
+            print(f"[{market}] {interval} 캔들 중간이 비어 있음 (거래소 응답 기준)")
+    return df
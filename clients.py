@@ -0,0 +1,178 @@
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import python_bithumb
+from python_bithumb import public_api, private_api
+from openai import OpenAI, DefaultHttpxClient
+import httpx
+
+# 서비스별 연결 풀 / 재시도 설정
+#   pool_maxsize: 호스트당 최대 연결 수 (넘으면 빈 연결이 생길 때까지 대기)
+#   retries, backoff: 연결 오류와 429/5xx 응답에 대한 재시도 횟수와 지수 백오프 계수
+#   timeout: 요청에 타임아웃을 지정하지 않았을 때의 기본값 (초)
+SESSION_SETTINGS = {
+    "serpapi": {"pool_maxsize": 2, "retries": 2, "backoff": 0.5, "timeout": 10},
+    "bithumb": {"pool_maxsize": 10, "retries": 2, "backoff": 0.3, "timeout": 5},
+}
+OPENAI_SETTINGS = {"max_connections": 4, "keepalive_expiry": 300, "retries": 2, "timeout": 60}
+
+# 주문(POST/DELETE)은 중복 체결 위험이 있으므로 재시도하지 않음
+RETRY_METHODS = frozenset(["GET", "HEAD"])
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+# keep-alive 연결을 재사용하고 요청별 소요 시간을 기록하는 세션
+class PooledSession(requests.Session):
+    def __init__(self, name, pool_maxsize=4, retries=2, backoff=0.5, timeout=10):
+        super().__init__()
+        self.name = name
+        self.default_timeout = timeout
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=RETRY_STATUSES,
+                      allowed_methods=RETRY_METHODS, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=retry, pool_block=True)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        self.timings = []  # 최근 요청 소요 시간 (초)
+        self._timings_lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.default_timeout
+        started = time.perf_counter()
+        try:
+            return super().request(method, url, **kwargs)
+        finally:
+            with self._timings_lock:
+                self.timings.append(time.perf_counter() - started)
+                del self.timings[:-1000]
+
+
+_lock = threading.Lock()
+_sessions = {}
+_openai_client = None
+_bithumb = None
+
+
+# 서비스 이름별 공유 HTTP 세션
+def get_session(name):
+    with _lock:
+        if name not in _sessions:
+            _sessions[name] = PooledSession(name, **SESSION_SETTINGS.get(name, {}))
+        return _sessions[name]
+
+
+# 프로세스 전체에서 재사용하는 OpenAI 클라이언트
+def get_openai_client():
+    global _openai_client
+    with _lock:
+        if _openai_client is None:
+            http_client = DefaultHttpxClient(limits=httpx.Limits(
+                max_connections=OPENAI_SETTINGS["max_connections"],
+                max_keepalive_connections=OPENAI_SETTINGS["max_connections"],
+                keepalive_expiry=OPENAI_SETTINGS["keepalive_expiry"]))
+            _openai_client = OpenAI(http_client=http_client, max_retries=OPENAI_SETTINGS["retries"],
+                                    timeout=OPENAI_SETTINGS["timeout"])
+        return _openai_client
+
+
+# python_bithumb 의 모듈 단위 requests 호출을 공유 세션으로 연결
+# (python_bithumb 은 requests.get/request/delete 만 사용하므로 세션으로 그대로 대체 가능)
+def install_bithumb_session():
+    session = get_session("bithumb")
+    public_api.requests = session
+    private_api.requests = session
+    return session
+
+
+# 프로세스 전체에서 재사용하는 빗썸 Private API 클라이언트
+def get_bithumb(access_key, secret_key):
+    global _bithumb
+    install_bithumb_session()
+    with _lock:
+        if _bithumb is None or (_bithumb.access_key, _bithumb.secret_key) != (access_key, secret_key):
+            _bithumb = python_bithumb.Bithumb(access_key, secret_key)
+        return _bithumb
+
+
+# 서비스별 요청 수와 평균/최대 소요 시간
+def request_stats():
+    stats = {}
+    with _lock:
+        sessions = list(_sessions.items())
+    for name, session in sessions:
+        with session._timings_lock:
+            timings = list(session.timings)
+        if timings:
+            stats[name] = {"requests": len(timings),
+                           "avg_ms": round(sum(timings) / len(timings) * 1000, 1),
+                           "max_ms": round(max(timings) * 1000, 1)}
+    return stats
+
+
+# 종료 시 열린 연결 정리
+def close_all():
+    global _openai_client, _bithumb
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+        if _openai_client is not None:
+            _openai_client.close()
+        _openai_client = None
+        _bithumb = None
+
+
+# 로컬 HTTPS 서버를 상대로 매번 새 연결을 맺을 때와 세션을 재사용할 때의 요청 시간을 비교
+if __name__ == "__main__":
+    import os
+    import ssl
+    import tempfile
+    import subprocess
+    import statistics
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive 지원
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            body = b'{"ok": true}'
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    workdir = tempfile.mkdtemp()
+    cert, key = os.path.join(workdir, "cert.pem"), os.path.join(workdir, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-keyout", key, "-out", cert, "-subj", "/CN=localhost",
+                    "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1"],
+                   check=True, capture_output=True)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"https://localhost:{server.server_address[1]}/"
+
+    def measure(get, n=50):
+        timings = []
+        for _ in range(n):
+            started = time.perf_counter()
+            get(url, verify=cert).raise_for_status()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    fresh = measure(requests.get)
+    session = PooledSession("standin")
+    pooled = measure(session.get)
+    for label, timings in [("new connection per request", fresh), ("pooled keep-alive session", pooled)]:
+        print(f"{label}: mean {statistics.mean(timings):.2f}ms, p50 {statistics.median(timings):.2f}ms")
+    server.shutdown()
@@ -0,0 +1,153 @@
+import os
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from db_migrations import migrate
+
+# 거래 기록 DB
+TRADE_DB_PATH = os.getenv("TRADE_DB_PATH", "bitcoin_trading.db")
+
+# 연결마다 적용하는 설정
+#   journal_mode=WAL: 읽기(대시보드)와 쓰기(트레이더)가 서로 막지 않음 (DB 파일에 유지되는 설정)
+#   synchronous=NORMAL: WAL 에서는 체크포인트 때만 fsync (전원 장애 시 마지막 커밋 일부만 잃을 수 있음)
+#   mmap_size: 읽기를 메모리 맵으로 처리 (바이트)
+#   busy_timeout: 쓰기 잠금을 기다리는 최대 시간 (밀리초)
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+}
+
+
+# 약한 참조로 추적할 수 있는 연결 (스레드가 끝나면 연결도 함께 정리됨)
+class _Connection(sqlite3.Connection):
+    pass
+
+
+_lock = threading.Lock()
+_local = threading.local()
+_prepared = set()                       # 스키마 마이그레이션을 마친 DB 경로
+_connections = weakref.WeakSet()        # close_all() 로 닫을 열린 연결
+_generation = 0                         # close_all() 이후 스레드별 연결을 다시 열기 위한 세대 번호
+
+
+def _open(path, read_only):
+    if read_only:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, factory=_Connection, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(path, factory=_Connection, check_same_thread=False)
+    for name, value in PRAGMAS.items():
+        if read_only and name == "journal_mode":
+            continue
+        conn.execute(f"PRAGMA {name} = {value}")
+    with _lock:
+        _connections.add(conn)
+    return conn
+
+
+# 현재 스레드에서 재사용할 연결 (없거나 close_all() 이후면 새로 열기)
+def _thread_connection(path, read_only):
+    cache = _local.__dict__.setdefault("connections", {})
+    key = (path, read_only)
+    entry = cache.get(key)
+    if entry is None or entry[0] != _generation:
+        entry = cache[key] = (_generation, _open(path, read_only))
+    return entry[1]
+
+
+# 쓰기용 연결 (스레드마다 하나를 재사용, 프로세스에서 처음 열 때 WAL 전환과 마이그레이션 실행)
+def get_connection(path=TRADE_DB_PATH):
+    conn = _thread_connection(path, read_only=False)
+    with _lock:
+        if path not in _prepared:
+            migrate(conn)
+            _prepared.add(path)
+    return conn
+
+
+# 읽기 전용 스냅샷: 블록 안의 모든 조회가 같은 시점의 데이터를 봄
+# WAL 에서는 쓰기 중에도 기다리지 않고, 트레이더의 쓰기도 막지 않음
+@contextmanager
+def snapshot(path=TRADE_DB_PATH):
+    conn = _thread_connection(path, read_only=True)
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+
+
+# 열려 있는 모든 연결 종료 (종료 시 호출, 이후 호출하면 스레드별로 새로 열림)
+def close_all():
+    global _generation
+    with _lock:
+        _generation += 1
+        connections = list(_connections)
+        _connections.clear()
+        _prepared.clear()
+    for conn in connections:
+        conn.close()
+
+
+# 트레이더가 계속 기록하는 동안 대시보드처럼 읽을 때 읽기 지연 비교 (기존 rollback journal vs WAL)
+if __name__ == "__main__":
+    import time
+    import tempfile
+    import statistics
+    from datetime import datetime
+
+    def run(label, wal):
+        path = os.path.join(tempfile.mkdtemp(), "bench_trading.db")
+        setup = sqlite3.connect(path)
+        migrate(setup, log=None)
+        setup.execute("PRAGMA journal_mode = DELETE")
+        setup.close()
+        stop = threading.Event()
+        read_times, write_times, errors = [], [], []
+
+        def writer():
+            conn = get_connection(path) if wal else sqlite3.connect(path)
+            for i in range(300):
+                started = time.perf_counter()
+                with conn:
+                    for _ in range(20):
+                        conn.execute("INSERT INTO trades (timestamp, decision, percentage, reason) "
+                                     "VALUES (?, 'hold', 0, ?)", (datetime.now().isoformat(), "x" * 2000))
+                write_times.append(time.perf_counter() - started)
+            stop.set()
+
+        def reader():
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    if wal:
+                        with snapshot(path) as conn:
+                            conn.execute("SELECT COUNT(*), MAX(id) FROM trades").fetchone()
+                            conn.execute("SELECT * FROM trades ORDER BY timestamp_ms DESC LIMIT 50").fetchall()
+                    else:
+                        conn = sqlite3.connect(path, timeout=5)
+                        conn.execute("SELECT COUNT(*), MAX(id) FROM trades").fetchone()
+                        conn.execute("SELECT * FROM trades ORDER BY timestamp_ms DESC LIMIT 50").fetchall()
+                        conn.close()
+                except sqlite3.OperationalError as e:
+                    errors.append(str(e))
+                read_times.append(time.perf_counter() - started)
+
+        threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(4)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        close_all()
+        reads = sorted(read_times)
+        print(f"{label}: {len(reads)} reads during {len(write_times)} commits in {elapsed:.2f}s | "
+              f"read p50 {statistics.median(reads) * 1000:.2f}ms, p99 {reads[int(len(reads) * 0.99)] * 1000:.2f}ms, "
+              f"max {reads[-1] * 1000:.1f}ms | commit p50 {statistics.median(write_times) * 1000:.2f}ms | "
+              f"lock errors {len(errors)}")
+
+    run("rollback journal, new connection per read", wal=False)
+    run("WAL + per-thread connections + snapshots", wal=True)
@@ -0,0 +1,192 @@
+import sqlite3
+import time
+from order_tracker import add_fill_columns
+
+# bitcoin_trading.db 스키마 버전 관리 (PRAGMA user_version 에 마지막으로 적용한 버전을 기록)
+# 새 변경은 MIGRATIONS 끝에 (버전, 설명, 함수) 로 추가하고, 이미 배포된 항목은 고치지 않음
+
+# 로컬 시각 ISO 문자열 -> UTC epoch 밀리초 (SQLite 의 'utc' 수정자가 로컬 -> UTC 변환)
+_ISO_TO_MS = "CAST(ROUND((julianday({column}, 'utc') - 2440587.5) * 86400000) AS INTEGER)"
+
+
+# 1: 초기 trades 테이블
+def _create_trades(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS trades
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     timestamp TEXT,
+                     decision TEXT,
+                     percentage INTEGER,
+                     reason TEXT,
+                     btc_balance REAL,
+                     krw_balance REAL,
+                     btc_price REAL)''')
+
+
+# 2: 체결 정보 컬럼 (주문 UUID, 체결 수량, 평균 체결가, 수수료, 체결까지 걸린 시간)
+# 이전 버전의 init_db 가 일부 컬럼을 이미 추가했을 수 있으므로 없는 컬럼만 추가
+def _add_fill_columns(conn):
+    add_fill_columns(conn)
+
+
+# 3: epoch 밀리초 타임스탬프 (기존 행은 로컬 시각 ISO 문자열에서 변환)
+# timestamp_ms 를 채우지 않는 이전 버전 스크립트가 기록해도 트리거가 채워 줌
+def _add_timestamp_ms(conn):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(trades)")}
+    if "timestamp_ms" not in existing:
+        conn.execute("ALTER TABLE trades ADD COLUMN timestamp_ms INTEGER")
+    conn.execute(f"UPDATE trades SET timestamp_ms = {_ISO_TO_MS.format(column='timestamp')} "
+                 "WHERE timestamp_ms IS NULL AND timestamp IS NOT NULL")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trades_fill_timestamp_ms
+                     AFTER INSERT ON trades
+                     WHEN NEW.timestamp_ms IS NULL AND NEW.timestamp IS NOT NULL
+                     BEGIN
+                         UPDATE trades SET timestamp_ms = {_ISO_TO_MS.format(column='NEW.timestamp')}
+                         WHERE id = NEW.id;
+                     END""")
+
+
+# 4: 최근 거래 / 판단별 조회용 인덱스 (기존 timestamp 문자열 정렬을 쓰는 코드용 인덱스 포함)
+def _add_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trades_timestamp_ms ON trades (timestamp_ms)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trades_decision ON trades (decision, timestamp_ms)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trades_timestamp ON trades (timestamp)")
+
+
+# 5: 사이클 이벤트 기록 (데이터 수집 시간, LLM 지연, 주문 상태 변화, 잔고 스냅샷 등, data 는 JSON)
+def _create_events(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS events
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     timestamp_ms INTEGER NOT NULL,
+                     kind TEXT NOT NULL,
+                     data TEXT)""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_kind ON events (kind, timestamp_ms)")
+
+
+# 6: 마켓별 거래 기록 (기존 행은 모두 KRW-BTC)
+# btc_balance / btc_price 는 해당 행 마켓의 코인 잔고 / 현재가 (기존 기록, 대시보드와 호환되도록 이름 유지)
+def _add_market(conn):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(trades)")}
+    if "market" not in existing:
+        conn.execute("ALTER TABLE trades ADD COLUMN market TEXT NOT NULL DEFAULT 'KRW-BTC'")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trades_market ON trades (market, timestamp_ms)")
+
+
+# 7: 사이클 단계별 구간 (tracing.py, start_us 는 epoch 마이크로초)
+def _create_spans(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS spans
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     trace_id TEXT,
+                     span_id TEXT NOT NULL,
+                     parent_id TEXT,
+                     name TEXT NOT NULL,
+                     start_us INTEGER NOT NULL,
+                     duration_us INTEGER NOT NULL,
+                     thread TEXT,
+                     status TEXT,
+                     attrs TEXT)""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_spans_start ON spans (start_us)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_spans_trace ON spans (trace_id)")
+
+
+# 8: 주문 실행 방식과 판단 시점 현재가 대비 슬리피지 (bps, 양수면 불리하게 체결)
+def _add_execution_columns(conn):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(trades)")}
+    if "execution" not in existing:
+        conn.execute("ALTER TABLE trades ADD COLUMN execution TEXT")
+    if "slippage_bps" not in existing:
+        conn.execute("ALTER TABLE trades ADD COLUMN slippage_bps REAL")
+
+
+MIGRATIONS = [
+    (1, "create trades table", _create_trades),
+    (2, "add fill columns", _add_fill_columns),
+    (3, "add epoch-ms timestamps", _add_timestamp_ms),
+    (4, "add timestamp/decision indexes", _add_indexes),
+    (5, "create events table", _create_events),
+    (6, "add market column", _add_market),
+    (7, "create spans table", _create_spans),
+    (8, "add execution columns", _add_execution_columns),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+# 아직 적용하지 않은 마이그레이션을 순서대로 적용 (각 단계가 끝날 때마다 버전 기록)
+# 반환값: 적용한 (버전, 설명) 목록
+def migrate(conn, log=print):
+    applied = []
+    current = schema_version(conn)
+    for version, description, apply in MIGRATIONS:
+        if version <= current:
+            continue
+        started = time.perf_counter()
+        try:
+            apply(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        applied.append((version, description))
+        if log:
+            log(f"DB migration {version} ({description}) applied in {time.perf_counter() - started:.2f}s")
+    return applied
+
+
+# 100만 건 합성 거래로 마이그레이션 전/후 조회 시간 비교 (원본 DB 는 건드리지 않음)
+if __name__ == "__main__":
+    import os
+    import random
+    import tempfile
+    from datetime import datetime, timedelta
+
+    rows = int(os.getenv("BENCH_ROWS", "1000000"))
+    path = os.path.join(tempfile.mkdtemp(), "bench_trading.db")
+    conn = sqlite3.connect(path)
+    _create_trades(conn)
+    start = datetime(2020, 1, 1)
+    rng = random.Random(15)
+    decisions = ("buy", "sell", "hold", "hold")
+
+    def synthetic(n):
+        for i in range(n):
+            yield ((start + timedelta(minutes=3 * i, microseconds=rng.randrange(1_000_000))).isoformat(),
+                   rng.choice(decisions), rng.randrange(0, 50), "synthetic", rng.random(), rng.random() * 1e6,
+                   1e8 + rng.random() * 1e7)
+
+    conn.executemany("INSERT INTO trades (timestamp, decision, percentage, reason, btc_balance, krw_balance, "
+                     "btc_price) VALUES (?, ?, ?, ?, ?, ?, ?)", synthetic(rows))
+    conn.commit()
+    day_ago = (start + timedelta(minutes=3 * (rows - 1)) - timedelta(days=1)).isoformat()
+    print(f"{rows:,} synthetic trades in {path}")
+
+    def bench(label, sql, params=(), repeat=20):
+        conn.execute(sql, params).fetchall()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            result = conn.execute(sql, params).fetchall()
+        print(f"  {label}: {(time.perf_counter() - started) / repeat * 1000:.2f}ms ({len(result)} rows)")
+
+    print("before (schema version 0, no indexes):")
+    bench("recent 5 trades", "SELECT * FROM trades ORDER BY timestamp DESC LIMIT ?", (5,))
+    bench("last 10 buys", "SELECT * FROM trades WHERE decision = ? ORDER BY timestamp DESC LIMIT 10", ("buy",))
+    bench("last 24h", "SELECT * FROM trades WHERE timestamp >= ?", (day_ago,))
+
+    migrate(conn)
+    day_ago_ms = conn.execute(f"SELECT {_ISO_TO_MS.format(column='?')}", (day_ago,)).fetchone()[0]
+    print(f"after (schema version {schema_version(conn)}):")
+    bench("recent 5 trades", "SELECT * FROM trades ORDER BY timestamp_ms DESC LIMIT ?", (5,))
+    bench("last 10 buys", "SELECT * FROM trades WHERE decision = ? ORDER BY timestamp_ms DESC LIMIT 10", ("buy",))
+    bench("last 24h", "SELECT * FROM trades WHERE timestamp_ms >= ?", (day_ago_ms,))
+
+    # 이전 버전 스크립트처럼 timestamp 만 넣어도 트리거가 timestamp_ms 를 채움
+    conn.execute("INSERT INTO trades (timestamp, decision, percentage) VALUES (?, 'hold', 0)",
+                 (datetime.now().isoformat(),))
+    legacy_ms = conn.execute("SELECT timestamp_ms FROM trades ORDER BY id DESC LIMIT 1").fetchone()[0]
+    print(f"legacy insert timestamp_ms within {abs(legacy_ms - int(time.time() * 1000))}ms of now")
+    conn.close()
+    os.remove(path)
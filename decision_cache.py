@@ -0,0 +1,96 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# 기본 설정: 캐시 파일, 유효 시간(초), 최대 항목 수
+DEFAULT_CACHE_PATH = "decision_cache.json"
+DEFAULT_TTL = 600
+DEFAULT_MAX_ENTRIES = 256
+
+
+# 딕셔너리 키 순서나 공백과 무관한 정규화 해시
+def canonical_hash(obj):
+    canonical = json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+# LLM 판단 결과 캐시 (TTL + LRU 제거, 디스크에 저장되어 재시작 후에도 유지)
+class DecisionCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (저장 시각, 결과), 오래 안 쓴 것부터
+        self._lock = threading.Lock()
+        self._load()
+
+    # 디스크에서 캐시 읽기 (파일이 없거나 깨졌으면 빈 캐시로 시작)
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Decision cache load failed, starting empty: {e}")
+            return
+        for key, (stored_at, value) in entries:
+            self._entries[key] = (stored_at, value)
+        self._expire(time.time())
+
+    # 임시 파일에 쓴 뒤 교체 (쓰는 도중 종료되어도 캐시 파일이 깨지지 않음)
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump([[key, list(entry)] for key, entry in self._entries.items()], f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _expire(self, now):
+        expired = [key for key, (stored_at, _) in self._entries.items() if now - stored_at > self.ttl]
+        for key in expired:
+            del self._entries[key]
+        return bool(expired)
+
+    # 캐시된 결과 조회 (없거나 만료되었으면 None)
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    # 결과 저장 (최대 항목 수를 넘으면 가장 오래 안 쓴 항목부터 제거)
+    def put(self, key, value):
+        with self._lock:
+            now = time.time()
+            self._entries[key] = (now, value)
+            self._entries.move_to_end(key)
+            self._expire(now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._save()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+            }
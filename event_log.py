@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+from db_connections import TRADE_DB_PATH, get_connection
+
+# 배치 기록 설정: 한 번에 쓰는 최대 행 수, 첫 행이 들어온 뒤 최대 대기 시간(초), 대기열 크기
+BATCH_SIZE = int(os.getenv("EVENT_LOG_BATCH_SIZE", "200"))
+FLUSH_INTERVAL = float(os.getenv("EVENT_LOG_FLUSH_INTERVAL", "1.0"))
+MAX_QUEUE = int(os.getenv("EVENT_LOG_MAX_QUEUE", "10000"))
+
+# 대기열 제어 메시지
+_FLUSH = object()
+_STOP = object()
+
+
+# 거래/이벤트 행을 대기열로 받아 별도 스레드에서 묶어서 기록하는 writer
+# 호출하는 쪽(트레이딩 경로)은 대기열에 넣기만 하고 디스크 쓰기를 기다리지 않음
+# 대기열이 가득 차면 기다리지 않고 행을 버린 뒤 dropped 로 집계
+class BackgroundWriter:
+    def __init__(self, path=TRADE_DB_PATH, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 max_queue=MAX_QUEUE):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+        self.on_batch = None              # on_batch({테이블: 행 수}, 시작 epoch 초, 소요 초): 배치 기록 후 호출
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    # 테이블 행(dict, 컬럼명 -> 값) 하나를 기록 대기열에 추가
+    def submit(self, table, row):
+        if self._closed:
+            self.dropped += 1
+            return False
+        try:
+            self.queue.put_nowait((table, row))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    # trades 테이블 행 (기존 스키마 컬럼 그대로)
+    def log_trade(self, row):
+        return self.submit("trades", row)
+
+    # 이벤트 한 건 (kind: fetch / llm / order / order_state / balance ...)
+    def log_event(self, kind, **data):
+        return self.submit("events", {"timestamp_ms": int(time.time() * 1000), "kind": kind,
+                                      "data": json.dumps(data, ensure_ascii=False, default=str)})
+
+    # 지금까지 넣은 행이 모두 기록될 때까지 대기 (읽기 전에 확인이 필요할 때)
+    def flush(self, timeout=5.0):
+        done = threading.Event()
+        self.queue.put((_FLUSH, done), timeout=timeout)
+        return done.wait(timeout)
+
+    # 남은 행을 모두 기록하고 writer 스레드 종료
+    def close(self, timeout=10.0):
+        if self._closed:
+            return
+        self._closed = True
+        self.queue.put((_STOP, None))
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {"written": self.written, "batches": self.batches, "queued": self.queue.qsize(),
+                "dropped": self.dropped, "failed": self.failed}
+
+    def _run(self):
+        conn = get_connection(self.path)
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if not batch else max(0.0, deadline - time.monotonic())
+            try:
+                table, row = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                batch = self._write(conn, batch)
+                continue
+            if table is _FLUSH:
+                batch = self._write(conn, batch)
+                row.set()
+                continue
+            if table is _STOP:
+                self._write(conn, batch)
+                return
+            if not batch:
+                deadline = time.monotonic() + self.flush_interval
+            batch.append((table, row))
+            if len(batch) >= self.batch_size:
+                batch = self._write(conn, batch)
+
+    # 같은 테이블/컬럼 구성끼리 묶어서 한 트랜잭션으로 기록
+    def _write(self, conn, batch):
+        if not batch:
+            return []
+        groups = {}
+        for table, row in batch:
+            groups.setdefault((table, tuple(row)), []).append(tuple(row.values()))
+        start = time.time()
+        started = time.perf_counter()
+        try:
+            with conn:
+                for (table, columns), rows in groups.items():
+                    placeholders = ", ".join("?" * len(columns))
+                    conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+            self.written += len(batch)
+            self.batches += 1
+        except sqlite3.Error as e:
+            self.failed += len(batch)
+            print(f"DB 배치 기록 실패 ({len(batch)}건): {e}")
+            return []
+        if self.on_batch is not None:
+            tables = {}
+            for table, _ in batch:
+                tables[table] = tables.get(table, 0) + 1
+            self.on_batch(tables, start, time.perf_counter() - started)
+        return []
+
+
+_lock = threading.Lock()
+_writer = None
+
+
+# 프로세스 전체에서 공유하는 writer (처음 호출할 때 시작, 종료 시 자동으로 남은 행 기록)
+def get_writer():
+    global _writer
+    with _lock:
+        if _writer is None:
+            _writer = BackgroundWriter()
+            atexit.register(close)
+        return _writer
+
+
+def log_event(kind, **data):
+    return get_writer().log_event(kind, **data)
+
+
+def close():
+    global _writer
+    with _lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.close()
+
+
+# 행마다 커밋할 때와 writer 대기열에 넣을 때의 호출 쪽 지연 비교
+if __name__ == "__main__":
+    import tempfile
+    import statistics
+    from datetime import datetime
+    import db_connections
+
+    rows = 5000
+
+    def trade_row(i):
+        now = datetime.now()
+        return {"timestamp": now.isoformat(), "timestamp_ms": int(now.timestamp() * 1000), "decision": "hold",
+                "percentage": 0, "reason": f"benchmark {i}", "btc_balance": 0.01, "krw_balance": 1e6,
+                "btc_price": 1.5e8}
+
+    for synchronous in ("FULL", "NORMAL"):
+        db_connections.PRAGMAS["synchronous"] = synchronous
+        path = os.path.join(tempfile.mkdtemp(), "bench_trading.db")
+        conn = get_connection(path)
+        timings = []
+        for i in range(rows // 5):
+            row = trade_row(i)
+            started = time.perf_counter()
+            conn.execute(f"INSERT INTO trades ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                         tuple(row.values()))
+            conn.commit()
+            timings.append(time.perf_counter() - started)
+        print(f"commit per row (synchronous={synchronous}): p50 {statistics.median(timings) * 1e6:.0f}us, "
+              f"max {max(timings) * 1e3:.1f}ms per call")
+
+        writer = BackgroundWriter(path)
+        timings = []
+        started_all = time.perf_counter()
+        for i in range(rows):
+            started = time.perf_counter()
+            if i % 2:
+                writer.log_trade(trade_row(i))
+            else:
+                writer.log_event("benchmark", i=i, latency_ms=1.5)
+            timings.append(time.perf_counter() - started)
+        writer.close()
+        total = time.perf_counter() - started_all
+        count = conn.execute("SELECT (SELECT COUNT(*) FROM trades) + (SELECT COUNT(*) FROM events)").fetchone()[0]
+        print(f"background writer (synchronous={synchronous}): p50 {statistics.median(timings) * 1e6:.0f}us, "
+              f"max {max(timings) * 1e3:.1f}ms per call | {writer.stats()} in {total:.2f}s, {count} rows on disk")
+        db_connections.close_all()
@@ -0,0 +1,332 @@
+import os
+import json
+import math
+import time
+import uuid
+import asyncio
+from collections import deque
+from datetime import datetime
+import websockets
+
+# 빗썸 실시간 시세 WebSocket (ticker / orderbook)
+BITHUMB_WS_URL = os.getenv("BITHUMB_WS_URL", "wss://ws-api.bithumb.com/websocket/v1")
+
+# 트리거 기본 설정
+#   move_pct: 마지막 사이클 이후 가격 변동률(%)이 이 값을 넘으면 실행
+#   volatility_ratio: 최근 5분 변동성이 최근 1시간 변동성의 몇 배를 넘으면 실행
+#   candle_minutes: 이 길이의 캔들이 마감될 때마다 실행 (0이면 사용 안 함)
+#   cron_slots: 기존 스케줄 시각 (HH:MM, 로컬 시간)
+#   cooldown: 두 사이클 사이 최소 간격(초) - 정해진 시각 실행은 예외
+DEFAULT_TRIGGERS = {
+    "move_pct": float(os.getenv("TRIGGER_MOVE_PCT", "2.0")),
+    "volatility_ratio": float(os.getenv("TRIGGER_VOLATILITY_RATIO", "3.0")),
+    "candle_minutes": int(os.getenv("TRIGGER_CANDLE_MINUTES", "0")),
+    "cron_slots": ("09:00", "15:00", "21:00"),
+    "cooldown": float(os.getenv("TRIGGER_COOLDOWN", "900")),
+}
+
+# 변동성 계산 창 (초)
+SHORT_WINDOW = 5 * 60
+LONG_WINDOW = 60 * 60
+
+
+# 시세 스트림으로 갱신되는 시장 상태 (메모리에만 유지)
+class MarketState:
+    def __init__(self, market):
+        self.market = market
+        self.last_price = None
+        self.last_ts = None               # 마지막 체결 시각 (epoch 초)
+        self.anchor_price = None          # 마지막 사이클 시점 가격
+        self.best_bid = None
+        self.best_ask = None
+        self.minute_closes = deque(maxlen=LONG_WINDOW // 60 + 1)  # (분 시작 epoch 초, 종가)
+        self.second_prices = deque()      # (epoch 초, 가격), 최근 SHORT_WINDOW 초
+
+    def update_ticker(self, price, ts):
+        if self.last_ts is not None and ts < self.last_ts:
+            return  # 순서가 뒤바뀐 메시지는 무시
+        self.last_price = price
+        self.last_ts = ts
+        if self.anchor_price is None:
+            self.anchor_price = price
+        minute = int(ts // 60) * 60
+        if self.minute_closes and self.minute_closes[-1][0] == minute:
+            self.minute_closes[-1] = (minute, price)
+        else:
+            self.minute_closes.append((minute, price))
+        self.second_prices.append((ts, price))
+        while self.second_prices and ts - self.second_prices[0][0] > SHORT_WINDOW:
+            self.second_prices.popleft()
+
+    def update_orderbook(self, units):
+        if units:
+            self.best_ask = float(units[0]["ask_price"])
+            self.best_bid = float(units[0]["bid_price"])
+
+    # 마지막 사이클 이후 가격 변동률 (%)
+    def move_pct(self):
+        if not self.anchor_price or self.last_price is None:
+            return 0.0
+        return (self.last_price / self.anchor_price - 1) * 100
+
+    # 최근 5분 변동성 / 최근 1시간 분봉 변동성 (분 단위로 환산한 로그수익률 표준편차 비율)
+    def volatility_ratio(self):
+        closes = [price for _, price in self.minute_closes]
+        if len(closes) < 15 or len(self.second_prices) < 10:
+            return 0.0
+        long_vol = _stdev(_log_returns(closes))
+        short_prices = [price for _, price in self.second_prices]
+        span_minutes = max((self.second_prices[-1][0] - self.second_prices[0][0]) / 60, 1e-9)
+        short_vol = _stdev(_log_returns(short_prices)) * math.sqrt(len(short_prices) / span_minutes)
+        return short_vol / long_vol if long_vol > 0 else 0.0
+
+    def reset_anchor(self):
+        self.anchor_price = self.last_price
+
+
+def _log_returns(prices):
+    return [math.log(b / a) for a, b in zip(prices, prices[1:]) if a > 0 and b > 0]
+
+
+def _stdev(values):
+    if len(values) < 2:
+        return 0.0
+    mean = sum(values) / len(values)
+    return math.sqrt(sum((v - mean) ** 2 for v in values) / (len(values) - 1))
+
+
+# WebSocket 시세를 받아 조건이 맞으면 트레이딩 사이클(cycle 함수)을 실행하는 이벤트 루프
+#   cycle: 인자 없는 동기 함수 (예: execute_trade). 스레드 풀에서 실행되어 이벤트 루프를 막지 않음
+#   markets: 여러 마켓을 한 연결로 구독 (어느 마켓에서든 트리거가 걸리면 사이클 한 번 실행)
+class EventDrivenTrader:
+    def __init__(self, cycle, market="KRW-BTC", triggers=None, url=BITHUMB_WS_URL, markets=None):
+        self.cycle = cycle
+        self.states = {m: MarketState(m) for m in (markets or [market])}
+        self.state = next(iter(self.states.values()))  # 첫 번째 마켓 (단일 마켓일 때와 같은 사용법)
+        self.triggers = dict(DEFAULT_TRIGGERS, **(triggers or {}))
+        self.url = url
+        self.running_cycle = None
+        self.last_cycle_at = 0.0
+        self.last_slot = None
+        self.pending_slot = None          # 실행 중인 사이클 때문에 아직 못 돌린 정해진 시각 트리거
+        self.cycles = []                  # (시작 시각, 트리거 이유)
+
+    # 구독 요청 메시지 (ticker + orderbook)
+    def subscribe_message(self):
+        codes = list(self.states)
+        return json.dumps([{"ticket": str(uuid.uuid4())},
+                           {"type": "ticker", "codes": codes},
+                           {"type": "orderbook", "codes": codes},
+                           {"format": "DEFAULT"}])
+
+    # 수신 메시지 하나를 상태에 반영
+    def handle_message(self, raw):
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8")
+        message = json.loads(raw)
+        kind = message.get("type") or message.get("ty")
+        state = self.states.get(message.get("code") or message.get("cd"), self.state)
+        if kind == "ticker":
+            ts = message.get("trade_timestamp") or message.get("timestamp") or time.time() * 1000
+            previous_ts = state.last_ts
+            state.update_ticker(float(message["trade_price"]), ts / 1000)
+            reason = self._check_price_triggers(state, previous_ts)
+            if reason and len(self.states) > 1:
+                reason = f"{state.market} {reason}"
+            return reason
+        if kind == "orderbook":
+            state.update_orderbook(message.get("orderbook_units", []))
+        return None
+
+    # 가격 변동 / 변동성 급등 / 캔들 마감 트리거 확인
+    def _check_price_triggers(self, state, previous_ts):
+        move = state.move_pct()
+        if self.triggers["move_pct"] and abs(move) >= self.triggers["move_pct"]:
+            return f"price move {move:+.2f}%"
+        ratio = state.volatility_ratio()
+        if self.triggers["volatility_ratio"] and ratio >= self.triggers["volatility_ratio"]:
+            return f"volatility spike x{ratio:.1f}"
+        candle = self.triggers["candle_minutes"] * 60
+        if candle and previous_ts is not None and int(previous_ts // candle) != int(state.last_ts // candle):
+            return f"{self.triggers['candle_minutes']}m candle close"
+        return None
+
+    # 정해진 시각(cron_slots) 트리거 확인 - 슬롯 시각이 되면 1초 안에 실행
+    # 다른 사이클이 실행 중이면 pending_slot 에 남겨 두고 그 사이클이 끝나면 실행
+    def _check_slot(self, now=None):
+        now = now or datetime.now()
+        slot = now.strftime("%H:%M")
+        key = now.strftime("%Y-%m-%d ") + slot
+        if slot in self.triggers["cron_slots"] and key != self.last_slot:
+            self.last_slot = key
+            self.pending_slot = f"scheduled slot {slot}"
+        return self.pending_slot
+
+    # 트리거 발생 시 사이클 실행 (이미 실행 중이거나 쿨다운 중이면 건너뜀)
+    def fire(self, reason, scheduled=False):
+        if self.running_cycle is not None and not self.running_cycle.done():
+            return False
+        if not scheduled and time.time() - self.last_cycle_at < self.triggers["cooldown"]:
+            return False
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 트리거: {reason}")
+        self.last_cycle_at = time.time()
+        self.cycles.append((self.last_cycle_at, reason))
+        for state in self.states.values():
+            state.reset_anchor()
+        loop = asyncio.get_running_loop()
+        self.running_cycle = loop.run_in_executor(None, self._run_cycle)
+        return True
+
+    def _run_cycle(self):
+        try:
+            self.cycle()
+        except Exception as e:
+            print(f"트레이딩 사이클 실패: {e}")
+
+    # 시세 스트림 수신 (끊기면 지수 백오프로 재연결)
+    async def stream(self):
+        backoff = 1
+        while True:
+            try:
+                async with websockets.connect(self.url, ping_interval=20) as ws:
+                    await ws.send(self.subscribe_message())
+                    backoff = 1
+                    async for raw in ws:
+                        try:
+                            reason = self.handle_message(raw)
+                        except Exception as e:
+                            print(f"WebSocket 메시지 처리 실패 (건너뜀): {e!r}")
+                            continue
+                        if reason:
+                            self.fire(reason)
+            except Exception as e:
+                # 연결 끊김뿐 아니라 핸드셰이크 거부 (InvalidStatus 등) 도 재연결
+                print(f"WebSocket 연결 끊김: {e!r} - {backoff}초 후 재연결")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+
+    # 정해진 시각 확인 (1초 간격)
+    async def slots(self):
+        deferred = None
+        while True:
+            reason = self._check_slot()
+            if reason:
+                if self.fire(reason, scheduled=True):
+                    self.pending_slot = deferred = None
+                elif deferred != reason:
+                    deferred = reason
+                    print(f"{reason}: 실행 중인 사이클이 끝나면 실행")
+            await asyncio.sleep(1)
+
+    async def run(self):
+        await asyncio.gather(self.stream(), self.slots())
+
+
+# 로컬 WebSocket 대역 서버로 트리거 / 쿨다운 / 재연결 / 정해진 시각 확인 (틀리면 AssertionError)
+if __name__ == "__main__":
+    import random
+    import http
+
+    # 1초 간격 체결 90분치 (60분 이후 30초 동안 변동성을 동반한 급락), 같은 시드로 매번 같은 시세
+    def ticks(seed=8):
+        rng = random.Random(seed)
+        price, ts = 150_000_000.0, time.time() * 1000
+        for i in range(90 * 60):
+            crash = 3600 <= i < 3630
+            price *= math.exp(rng.gauss(-0.001 if crash else 0.0, 0.002 if crash else 0.0001))
+            ts += 1000
+            yield i, price, ts
+
+    def ticker(price, ts):
+        return json.dumps({"type": "ticker", "code": "KRW-BTC", "trade_price": price, "trade_timestamp": ts})
+
+    # 시세 전체를 재생하고 트레이더가 모두 처리할 때까지 기다림
+    async def replay(triggers):
+        finished = asyncio.Event()
+
+        async def handler(ws):
+            await ws.recv()  # 구독 요청
+            for i, price, ts in ticks():
+                await ws.send(ticker(price, ts).encode())
+                if i % 10 == 0:
+                    await ws.send(json.dumps({"type": "orderbook", "code": "KRW-BTC", "orderbook_units": [
+                        {"ask_price": price * 1.0005, "bid_price": price * 0.9995}]}))
+                    await asyncio.sleep(0)
+            finished.set()
+            await ws.wait_closed()
+
+        server = await websockets.serve(handler, "127.0.0.1", 0)
+        trader = EventDrivenTrader(lambda: None, url=f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}",
+                                   triggers=dict({"cron_slots": ()}, **triggers))
+        task = asyncio.create_task(trader.stream())
+        await finished.wait()
+        await asyncio.sleep(0.5)
+        task.cancel()
+        server.close()
+        return trader
+
+    # 첫 연결은 핸드셰이크 거부 (503), 두 번째는 깨진 메시지 뒤 정상 체결 하나를 보내고 끊음, 세 번째에서 끝
+    async def reconnect():
+        connections, finished = [], asyncio.Event()
+
+        def reject_first(connection, request):
+            connections.append(request.path)
+            if len(connections) == 1:
+                return connection.respond(http.HTTPStatus.SERVICE_UNAVAILABLE, "busy\n")
+
+        async def handler(ws):
+            await ws.recv()
+            if len(connections) == 2:
+                await ws.send(json.dumps({"type": "ticker", "code": "KRW-BTC"}))  # trade_price 없음
+                await ws.send("not json")
+                await ws.send(ticker(100.0, time.time() * 1000))
+                return  # 연결 끊김
+            await ws.send(ticker(101.0, time.time() * 1000 + 1000))
+            finished.set()
+            await ws.wait_closed()
+
+        server = await websockets.serve(handler, "127.0.0.1", 0, process_request=reject_first)
+        trader = EventDrivenTrader(lambda: None, url=f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}",
+                                   triggers={"cron_slots": ()})
+        task = asyncio.create_task(trader.stream())
+        await asyncio.wait_for(finished.wait(), 10)
+        await asyncio.sleep(0.1)
+        task.cancel()
+        server.close()
+        return trader, len(connections)
+
+    # 사이클이 실행 중일 때 온 정해진 시각은 미뤘다가 사이클이 끝나면 실행
+    async def deferred_slot():
+        trader = EventDrivenTrader(lambda: time.sleep(0.3), triggers={"cron_slots": ("09:00",)})
+        assert trader.fire("price move", scheduled=True)
+        reason = trader._check_slot(datetime(2026, 1, 1, 9, 0, 5))
+        assert reason == "scheduled slot 09:00" and not trader.fire(reason, scheduled=True)
+        assert trader._check_slot(datetime(2026, 1, 1, 9, 1)) == reason, "slot dropped after its minute"
+        await trader.running_cycle
+        assert trader.fire(trader._check_slot(datetime(2026, 1, 1, 9, 1)), scheduled=True)
+        return trader
+
+    async def main():
+        trader = await replay({"cooldown": 0, "candle_minutes": 60})
+        reasons = [reason for _, reason in trader.cycles]
+        assert any("candle close" in r for r in reasons), reasons
+        assert any(r.startswith("price move -") for r in reasons), reasons
+        state = trader.state
+        assert state.best_bid < state.last_price < state.best_ask
+        print(f"triggers: {reasons}")
+
+        trader = await replay({"cooldown": 3600, "candle_minutes": 60})
+        assert len(trader.cycles) == 1, trader.cycles
+        print(f"cooldown 3600s: {len(trader.cycles)} cycle ({trader.cycles[0][1]})")
+
+        trader, connections = await reconnect()
+        assert connections == 3 and trader.state.last_price == 101.0, (connections, trader.state.last_price)
+        print(f"reconnect: {connections} connections (rejected handshake, bad frames skipped), "
+              f"last price {trader.state.last_price}")
+
+        trader = await deferred_slot()
+        assert [reason for _, reason in trader.cycles] == ["price move", "scheduled slot 09:00"]
+        print("deferred slot: ran after the busy cycle")
+        print("event loop checks passed")
+
+    asyncio.run(main())
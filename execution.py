@@ -0,0 +1,302 @@
+import os
+import time
+import asyncio
+import requests
+import python_bithumb
+from python_bithumb import BithumbAPIException
+from order_tracker import summarize_fill, wait_for_fill
+from tracing import span
+
+# 주문 실행 방식
+#   market: 계산한 금액 전체를 시장가 한 번으로 (기존 방식)
+#   twap: 일정 시간(EXECUTION_DURATION) 동안 같은 크기로 나눠 주문
+#   vwap: 나눠 주문하되 시간대별 평소 거래량에 비례한 크기로
+#   limit: 최우선 호가(매수는 최우선 매수호가, 매도는 최우선 매도호가)에 지정가로 걸어 두고 호가를 따라 정정
+EXECUTION_STRATEGY = os.getenv("EXECUTION_STRATEGY", "market")
+EXECUTION_SLICES = int(os.getenv("EXECUTION_SLICES", "5"))
+EXECUTION_DURATION = float(os.getenv("EXECUTION_DURATION", "300"))
+# 나눠 보내는 각 주문의 방식 (market 또는 limit)
+EXECUTION_CHILD = os.getenv("EXECUTION_CHILD", "market")
+# 지정가 주문: 상태/호가 확인 간격, 최대 대기 시간, 시간 안에 못 채우면 나머지를 시장가로
+LIMIT_POLL_INTERVAL = float(os.getenv("LIMIT_POLL_INTERVAL", "2"))
+LIMIT_TIMEOUT = float(os.getenv("LIMIT_TIMEOUT", "60"))
+LIMIT_FALLBACK_MARKET = os.getenv("LIMIT_FALLBACK_MARKET", "1") == "1"
+
+# 빗썸 최소 주문 금액 (KRW)
+MIN_ORDER_KRW = 5000
+# 시장가 주문 체결 확인 최대 대기 시간 (초)
+FILL_TIMEOUT = float(os.getenv("ORDER_FILL_TIMEOUT", "30"))
+
+STRATEGIES = ("market", "twap", "vwap", "limit")
+
+
+# 최우선 매수/매도 호가 (python_bithumb.get_orderbook 형식)
+def touch(orderbook):
+    unit = orderbook["orderbook_units"][0]
+    return float(unit["bid_price"]), float(unit["ask_price"])
+
+
+# 슬리피지 (bps, 양수면 판단 시점 가격보다 불리하게 체결)
+def slippage_bps(side, avg_price, decision_price):
+    if not avg_price or not decision_price:
+        return None
+    sign = 1 if side == "buy" else -1
+    return sign * (avg_price - decision_price) / decision_price * 10_000
+
+
+# 시간대별 거래량 비중 (VWAP 분할용)
+#   candles: 1시간봉 DataFrame (volume 컬럼, 인덱스는 시각), start: 시작 시각 (epoch 초)
+#   각 분할 시점과 같은 시간대(시)의 평균 거래량에 비례, 데이터가 없으면 균등
+def volume_weights(candles, slices, duration, start=None):
+    start = start or time.time()
+    if candles is None or len(candles) == 0 or "volume" not in candles:
+        return [1 / slices] * slices
+    by_hour = candles["volume"].groupby(candles.index.hour).mean()
+    hours = [time.localtime(start + duration * i / slices).tm_hour for i in range(slices)]
+    weights = [float(by_hour.get(hour, by_hour.mean())) for hour in hours]
+    total = sum(weights)
+    return [w / total for w in weights] if total > 0 else [1 / slices] * slices
+
+
+# 주문 실행 엔진 (한 마켓, 한 방향의 주문 하나를 전략에 따라 여러 주문으로 나눠 실행)
+#   exchange: Bithumb 클라이언트 (또는 sim_exchange.SimulatedExchange)
+#   get_orderbook: 호가 조회 함수 (없으면 python_bithumb.get_orderbook)
+#   거래소 호출은 asyncio.to_thread 로 실행하므로 여러 지정가 주문의 대기/정정을 이벤트 루프 하나에서 관리
+class ExecutionEngine:
+    def __init__(self, exchange, market, get_orderbook=None, poll_interval=LIMIT_POLL_INTERVAL,
+                 fill_timeout=FILL_TIMEOUT, log=print):
+        self.exchange = exchange
+        self.market = market
+        self.get_orderbook = get_orderbook or python_bithumb.get_orderbook
+        self.poll_interval = poll_interval
+        self.fill_timeout = fill_timeout
+        self.log = log
+        self._last_price = None  # 매도 잔량의 최소 주문 금액 확인용
+
+    async def _call(self, func, *args):
+        return await asyncio.to_thread(func, *args)
+
+    async def touch(self):
+        return touch(await self._call(self.get_orderbook, self.market))
+
+    # 시장가 주문 하나 (매수는 KRW 금액, 매도는 수량) 후 체결 확인
+    async def market_order(self, side, amount):
+        with span("order.place", market=self.market, side=side, type="market"):
+            if side == "buy":
+                response = await self._call(self.exchange.buy_market_order, self.market, amount)
+            else:
+                response = await self._call(self.exchange.sell_market_order, self.market, amount)
+        with span("order.fill_wait", market=self.market):
+            return await self._call(wait_for_fill, self.exchange, response["uuid"], self.fill_timeout)
+
+    # 지정가 주문 취소 후 최종 체결분 조회 (그 사이 체결돼 취소가 거절되어도 체결분은 반영)
+    async def _cancel(self, order_uuid, started):
+        try:
+            await self._call(self.exchange.cancel_order, order_uuid)
+        except (BithumbAPIException, requests.RequestException) as e:
+            self.log(f"[{self.market}] 주문 취소 실패 ({order_uuid}): {e}")
+        return await self._call(wait_for_fill, self.exchange, order_uuid, min(self.fill_timeout, 5.0))
+
+    # 최우선 호가에 지정가로 걸어 두고, 다른 주문이 앞 호가로 들어오면 취소 후 새 최우선 호가로 정정
+    # 매수는 최우선 매수호가, 매도는 최우선 매도호가에만 두므로 걸 때 상대 호가와 체결되지 않음 (메이커)
+    # timeout 안에 다 못 채우면 취소하고 fallback 이면 나머지를 시장가로
+    # 반환값: 체결 목록 (summarize_fill 형식)
+    async def limit_order(self, side, amount, timeout=LIMIT_TIMEOUT, fallback=LIMIT_FALLBACK_MARKET):
+        fills = []
+        deadline = time.perf_counter() + timeout
+        remaining = amount
+        while self._enough(side, remaining) and time.perf_counter() < deadline:
+            bid, ask = await self.touch()
+            price = bid if side == "buy" else ask
+            volume = round(remaining / price if side == "buy" else remaining, 8)
+            started = time.perf_counter()
+            with span("order.place", market=self.market, side=side, type="limit", price=price):
+                if side == "buy":
+                    response = await self._call(self.exchange.buy_limit_order, self.market, price, volume)
+                else:
+                    response = await self._call(self.exchange.sell_limit_order, self.market, price, volume)
+            order_uuid = response["uuid"]
+            fill = None
+            with span("order.limit_wait", market=self.market, price=price) as attrs:
+                try:
+                    while time.perf_counter() < deadline:
+                        await asyncio.sleep(self.poll_interval)
+                        order = await self._call(self.exchange.get_order, order_uuid)
+                        if order.get("state") in ("done", "cancel"):
+                            fill = summarize_fill(order, time.perf_counter() - started)
+                            break
+                        bid, ask = await self.touch()
+                        if (bid if side == "buy" else ask) != price:
+                            attrs["repriced"] = True
+                            break
+                finally:
+                    # 대기 중 조회가 실패해도 (예외 / 작업 취소) 걸어 둔 주문이 거래소에 남지 않도록 취소
+                    if fill is None:
+                        fill = await self._cancel(order_uuid, started)
+            fills.append(fill)
+            remaining -= self._executed_amount(side, fill)
+        if fallback and self._enough(side, remaining):
+            self.log(f"[{self.market}] 지정가 미체결분 시장가 전환: {remaining:,.8g}")
+            fills.append(await self.market_order(side, remaining))
+        return fills
+
+    # 체결분이 원래 주문 단위(매수는 KRW, 매도는 수량)로 얼마인지
+    def _executed_amount(self, side, fill):
+        if side == "buy":
+            return fill["executed_qty"] * (fill["avg_price"] or 0)
+        return fill["executed_qty"]
+
+    # 남은 금액/수량이 최소 주문 금액 이상인지 (매도는 마지막 호가로 환산)
+    def _enough(self, side, remaining):
+        if side == "buy":
+            return remaining >= MIN_ORDER_KRW
+        return remaining > 0 and (self._last_price is None or remaining * self._last_price >= MIN_ORDER_KRW)
+
+    # 주문 하나 실행
+    #   side: "buy" (amount 는 KRW) 또는 "sell" (amount 는 코인 수량)
+    #   decision_price: 판단 시점 현재가 (슬리피지 기준)
+    #   weights: vwap 분할 비중 (없으면 균등)
+    # 반환값: 체결 요약 dict (wait_for_fill 결과와 같은 키 + strategy / slippage_bps / children)
+    async def execute(self, side, amount, decision_price, strategy=EXECUTION_STRATEGY, slices=EXECUTION_SLICES,
+                      duration=EXECUTION_DURATION, child=EXECUTION_CHILD, weights=None, limit_timeout=LIMIT_TIMEOUT):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown execution strategy: {strategy}")
+        self._last_price = decision_price
+        started = time.perf_counter()
+        fills = []
+        if strategy == "market":
+            fills.append(await self.market_order(side, amount))
+        elif strategy == "limit":
+            fills.extend(await self.limit_order(side, amount, timeout=limit_timeout))
+        else:
+            if strategy == "twap" or not weights:
+                weights = [1 / slices] * slices
+            interval = duration / len(weights)
+            target = executed = 0.0
+            for i, weight in enumerate(weights):
+                # 앞 분할에서 덜 채운 만큼은 다음 분할에서 따라잡음
+                target += amount * weight
+                size = target - executed if i < len(weights) - 1 else amount - executed
+                slice_started = time.perf_counter()
+                if self._enough(side, size):
+                    if child == "limit":
+                        # 다음 분할 전까지만 지정가로 기다리고, 마지막 분할만 시장가로 마무리
+                        child_fills = await self.limit_order(side, size, timeout=interval * 0.8,
+                                                             fallback=i == len(weights) - 1)
+                    else:
+                        child_fills = [await self.market_order(side, size)]
+                    fills.extend(child_fills)
+                    executed += sum(self._executed_amount(side, fill) for fill in child_fills)
+                    self._last_price = fills[-1]["avg_price"] or self._last_price
+                if i < len(weights) - 1:
+                    await asyncio.sleep(max(0.0, interval - (time.perf_counter() - slice_started)))
+        return self.summarize(side, amount, fills, decision_price, strategy, time.perf_counter() - started)
+
+    # 여러 주문의 체결을 하나로 합침 (남은 금액/수량이 최소 주문 금액 미만이면 done)
+    # uuid 는 쉼표로 이은 하위 주문 UUID 목록
+    def summarize(self, side, amount, fills, decision_price, strategy, elapsed):
+        qty = sum(fill["executed_qty"] for fill in fills)
+        funds = sum(fill["executed_qty"] * (fill["avg_price"] or 0) for fill in fills)
+        avg_price = funds / qty if qty else None
+        remaining = amount - sum(self._executed_amount(side, fill) for fill in fills)
+        return {
+            "uuid": ",".join(fill["uuid"] for fill in fills if fill.get("uuid")) or None,
+            "state": "done" if not self._enough(side, remaining) else ("partial" if qty else "unfilled"),
+            "executed_qty": qty,
+            "avg_price": avg_price,
+            "fee": sum(fill["fee"] for fill in fills),
+            "elapsed": elapsed,
+            "timed_out": any(fill["timed_out"] for fill in fills),
+            "strategy": strategy,
+            "children": len(fills),
+            "slippage_bps": slippage_bps(side, avg_price, decision_price),
+        }
+
+
+# 동기 코드(주문 스레드)에서 호출하는 진입점
+def execute_order(exchange, market, side, amount, decision_price, strategy=EXECUTION_STRATEGY, **kwargs):
+    engine = ExecutionEngine(exchange, market, get_orderbook=kwargs.pop("get_orderbook", None))
+    return asyncio.run(engine.execute(side, amount, decision_price, strategy=strategy, **kwargs))
+
+
+# 모의 호가에서 큰 매수 주문을 전략별로 실행해 판단 시점 가격 대비 슬리피지 비교
+# 전략마다 전체 금액 체결, 분할 수, 거래소에 남은 주문이 없는지 확인 (틀리면 AssertionError)
+if __name__ == "__main__":
+    import statistics
+    from sim_exchange import SimulatedExchange
+
+    def resting(sim):
+        return [order["uuid"] for order in sim.orders.values() if order["state"] == "wait"]
+
+    amount = float(os.getenv("BENCH_AMOUNT", "30000000"))  # 0.3 BTC 정도 (최우선 호가 잔량의 30배)
+    runs = int(os.getenv("BENCH_RUNS", "6"))
+    cases = [("market", {}),
+             ("twap", {"slices": 10, "duration": 2.0}),
+             ("twap", {"slices": 10, "duration": 2.0, "child": "limit"}),
+             ("limit", {"limit_timeout": 2.0})]
+    print(f"buy {amount:,.0f} KRW, {runs} runs each (simulated book, depth 0.01 BTC/level, tick 1000)")
+    for strategy, options in cases:
+        results = []
+        for seed in range(runs):
+            sim = SimulatedExchange(depth=0.01, volatility=0.00003, impact=2.0, resilience=0.1, seed=seed)
+            engine = ExecutionEngine(sim, sim.market, get_orderbook=sim.get_orderbook, poll_interval=0.05,
+                                     log=lambda message: None)
+            decision_price = sum(touch(sim.get_orderbook())) / 2
+            result = asyncio.run(engine.execute("buy", amount, decision_price, strategy=strategy, **options))
+            executed = sum(float(t["funds"]) for order in sim.orders.values() for t in order["trades"])
+            assert result["state"] == "done" and amount - executed < MIN_ORDER_KRW, (strategy, result, executed)
+            assert abs(result["executed_qty"] * result["avg_price"] - executed) < 1e-3 * amount, (strategy, result)
+            if strategy == "twap":
+                # 시장가 분할은 분할마다 주문 하나, 지정가 분할은 정정/시장가 전환으로 더 많을 수 있음
+                slices = options["slices"]
+                assert (result["children"] == slices if options.get("child") != "limit"
+                        else result["children"] >= slices), (strategy, options, result["children"])
+            assert not resting(sim), (strategy, resting(sim))
+            results.append(result)
+        bps = [r["slippage_bps"] for r in results]
+        name = strategy + ("/limit" if options.get("child") == "limit" else "")
+        print(f"{name:12s} slippage {statistics.mean(bps):7.2f} bps (median {statistics.median(bps):6.2f}), "
+              f"orders {statistics.mean(r['children'] for r in results):4.1f}, "
+              f"fee {statistics.mean(r['fee'] for r in results):,.0f} KRW")
+
+    # 지정가 정정: 최우선 매수호가가 올라갈 때마다 취소 후 새 가격으로 다시 걸고, 끝나면 남은 주문 없음
+    sim = SimulatedExchange(volatility=0, taker_rate=0, seed=1)
+    engine = ExecutionEngine(sim, sim.market, get_orderbook=sim.get_orderbook, poll_interval=0.05,
+                             log=lambda message: None)
+    real_touch = engine.touch
+    touches = []
+
+    # 호가 조회 두 번 (주문 걸 때 + 대기 중 확인) 마다 매수호가가 한 틱씩 올라감 (실제 매수호가까지)
+    async def rising_touch():
+        bid, ask = await real_touch()
+        touches.append(bid)
+        return bid - sim.tick * max(0, 3 - len(touches) // 2), ask
+    engine.touch = rising_touch
+    fills = asyncio.run(engine.limit_order("buy", 1_000_000, timeout=1.0, fallback=True))
+    limit_prices = [order["price"] for order in sim.orders.values() if order["ord_type"] == "limit"]
+    assert len(limit_prices) >= 3 and limit_prices == sorted(limit_prices), limit_prices
+    assert not resting(sim), resting(sim)
+    print(f"limit re-pricing: {len(limit_prices)} limit orders at rising prices, "
+          f"{len(fills)} fills, none left resting")
+
+    # 대기 중 호가 조회가 실패하면 걸어 둔 지정가 주문을 취소한 뒤 예외를 그대로 올림
+    sim = SimulatedExchange(taker_rate=0, seed=2)
+    engine = ExecutionEngine(sim, sim.market, get_orderbook=sim.get_orderbook, poll_interval=0.05,
+                             log=lambda message: None)
+    real_touch = engine.touch
+    calls = []
+
+    async def flaky_touch():
+        calls.append(1)
+        if len(calls) > 2:
+            raise OSError("orderbook fetch failed")
+        return await real_touch()
+    engine.touch = flaky_touch
+    try:
+        asyncio.run(engine.limit_order("buy", 1_000_000, timeout=2.0))
+        raise AssertionError("limit_order swallowed the orderbook error")
+    except OSError:
+        pass
+    assert sim.orders and not resting(sim), [order["state"] for order in sim.orders.values()]
+    print("failed wait: resting limit order cancelled before the error propagated")
+    print("execution checks passed")
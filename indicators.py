@@ -0,0 +1,344 @@
+import math
+from collections import deque
+import numpy as np
+import pandas as pd
+
+# 지표 기간 설정
+RSI_PERIOD = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+BOLLINGER_PERIOD, BOLLINGER_WIDTH = 20, 2.0
+ATR_PERIOD = 14
+SMA_PERIODS = (20, 50)
+EMA_PERIOD = 20
+SWING_SPAN = 3       # 좌우 몇 개 봉보다 높으면/낮으면 스윙 고점/저점으로 볼지
+SWING_COUNT = 3      # 요약에 넣을 최근 스윙 고점/저점 개수
+
+# 지표별로 값을 내기 위해 필요한 최소 봉 개수 (벡터 계산과 증분 계산이 같은 기준 사용)
+MIN_BARS = {
+    "rsi": RSI_PERIOD + 1,
+    "macd": MACD_SLOW,
+    "macd_signal": MACD_SLOW + MACD_SIGNAL - 1,
+    "bollinger": BOLLINGER_PERIOD,
+    "atr": ATR_PERIOD,
+    "ema": EMA_PERIOD,
+}
+
+
+# --- 벡터 계산 (DataFrame 전체) ---
+
+def _ewm(values, alpha):
+    return pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+
+
+def _rolling_mean(values, window):
+    out = np.full(len(values), np.nan)
+    if window <= len(values):
+        cumsum = np.cumsum(np.insert(values - values[0], 0, 0.0))
+        out[window - 1:] = (cumsum[window:] - cumsum[:-window]) / window + values[0]
+    return out
+
+
+def _mask(values, count):
+    values = np.asarray(values, dtype=float).copy()
+    values[:count - 1] = np.nan
+    return values
+
+
+# 캔들 DataFrame (비어 있지 않음) 의 봉마다 지표를 계산 (EMA 계열은 첫 값에서 시작하는 재귀식, 볼린저 표준편차는 모표준편차)
+def compute(df):
+    close = df["close"].to_numpy(dtype=float)
+    high = df["high"].to_numpy(dtype=float)
+    low = df["low"].to_numpy(dtype=float)
+    out = {}
+
+    for period in SMA_PERIODS:
+        out[f"sma_{period}"] = _rolling_mean(close, period)
+    out[f"ema_{EMA_PERIOD}"] = _mask(_ewm(close, 2 / (EMA_PERIOD + 1)), MIN_BARS["ema"])
+
+    # RSI (Wilder 평활)
+    change = np.diff(close, prepend=np.nan)[1:]
+    avg_gain = _ewm(np.clip(change, 0, None), 1 / RSI_PERIOD)
+    avg_loss = _ewm(np.clip(-change, 0, None), 1 / RSI_PERIOD)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(avg_loss > 0, 100 - 100 / (1 + avg_gain / avg_loss), 100.0)
+    out["rsi"] = _mask(np.insert(rsi, 0, np.nan), MIN_BARS["rsi"])
+
+    # MACD
+    macd = _ewm(close, 2 / (MACD_FAST + 1)) - _ewm(close, 2 / (MACD_SLOW + 1))
+    signal = _ewm(macd, 2 / (MACD_SIGNAL + 1))
+    out["macd"] = _mask(macd, MIN_BARS["macd"])
+    out["macd_signal"] = _mask(signal, MIN_BARS["macd_signal"])
+    out["macd_hist"] = _mask(macd - signal, MIN_BARS["macd_signal"])
+
+    # 볼린저 밴드
+    mid = _rolling_mean(close, BOLLINGER_PERIOD)
+    mean_sq = _rolling_mean((close - close[0]) ** 2, BOLLINGER_PERIOD)
+    std = np.sqrt(np.clip(mean_sq - (mid - close[0]) ** 2, 0, None))
+    out["bb_upper"] = mid + BOLLINGER_WIDTH * std
+    out["bb_lower"] = mid - BOLLINGER_WIDTH * std
+
+    # ATR (Wilder 평활, 첫 봉은 고가-저가)
+    prev_close = np.insert(close[:-1], 0, np.nan)
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    out["atr"] = _mask(_ewm(true_range, 1 / ATR_PERIOD), MIN_BARS["atr"])
+    return out
+
+
+# 좌우 SWING_SPAN 개 봉보다 높은 고가 / 낮은 저가의 위치 (마지막 SWING_SPAN 개 봉은 아직 확정 안 됨)
+def swing_points(high, low, span=SWING_SPAN):
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    if len(high) < 2 * span + 1:
+        return np.array([], dtype=int), np.array([], dtype=int)
+    highs = np.lib.stride_tricks.sliding_window_view(high, 2 * span + 1)
+    lows = np.lib.stride_tricks.sliding_window_view(low, 2 * span + 1)
+    center_high, center_low = highs[:, span], lows[:, span]
+    is_high = (center_high > highs[:, :span].max(axis=1)) & (center_high >= highs[:, span + 1:].max(axis=1))
+    is_low = (center_low < lows[:, :span].min(axis=1)) & (center_low <= lows[:, span + 1:].min(axis=1))
+    return np.flatnonzero(is_high) + span, np.flatnonzero(is_low) + span
+
+
+# 캔들 DataFrame 의 마지막 봉 기준 지표 요약 (프롬프트용)
+def indicator_summary(df, decimals=None):
+    if df is None or df.empty:
+        return None
+    values = {name: series[-1] for name, series in compute(df).items()}
+    swing_high, swing_low = swing_points(df["high"], df["low"])
+    return _summarize(values, float(df["close"].iloc[-1]),
+                      df["high"].to_numpy(dtype=float)[swing_high[-SWING_COUNT:]].tolist(),
+                      df["low"].to_numpy(dtype=float)[swing_low[-SWING_COUNT:]].tolist(),
+                      decimals)
+
+
+# 지표 값 dict 를 반올림한 요약 dict 로 변환 (값이 없는 지표는 생략)
+def _summarize(values, close, swing_highs, swing_lows, decimals=None):
+    if decimals is None:
+        decimals = int(min(8, max(0, 4 - math.floor(math.log10(abs(close)))))) if close else 0
+
+    def price(value):
+        if value is None or not np.isfinite(value):
+            return None
+        return int(round(value)) if decimals == 0 else round(float(value), decimals)
+
+    def ratio(value, digits=2):
+        return round(float(value), digits) if value is not None and np.isfinite(value) else None
+
+    summary = {f"sma_{period}": price(values[f"sma_{period}"]) for period in SMA_PERIODS}
+    summary[f"ema_{EMA_PERIOD}"] = price(values[f"ema_{EMA_PERIOD}"])
+    summary[f"rsi_{RSI_PERIOD}"] = ratio(values["rsi"], 1)
+    summary["macd"] = price(values["macd"])
+    summary["macd_signal"] = price(values["macd_signal"])
+    summary["macd_hist"] = price(values["macd_hist"])
+    upper, lower = values["bb_upper"], values["bb_lower"]
+    summary["bb_upper"] = price(upper)
+    summary["bb_lower"] = price(lower)
+    if np.isfinite(upper) and np.isfinite(lower) and upper > lower:
+        summary["bb_pct_b"] = ratio((close - lower) / (upper - lower))
+    summary[f"atr_{ATR_PERIOD}"] = price(values["atr"])
+    if np.isfinite(values["atr"]) and close:
+        summary["atr_pct"] = ratio(values["atr"] / close * 100)
+    summary["swing_highs"] = [price(v) for v in swing_highs]
+    summary["swing_lows"] = [price(v) for v in swing_lows]
+    return {key: value for key, value in summary.items() if value is not None and value != []}
+
+
+# --- 증분 계산 (새 봉마다 O(1)) ---
+
+# 지수 이동평균 상태 (첫 값에서 시작)
+class _Ema:
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.value = None
+
+    def peek(self, x):
+        return x if self.value is None else self.value + self.alpha * (x - self.value)
+
+    def push(self, x):
+        self.value = self.peek(x)
+        return self.value
+
+
+# 최근 window 개 값의 합/제곱합 (값이 클 때 정밀도를 위해 첫 값을 빼고 누적)
+class _Window:
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.ref = None
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def peek(self, x):
+        ref = x if self.ref is None else self.ref
+        total, total_sq, count = self.total + (x - ref), self.total_sq + (x - ref) ** 2, len(self.values) + 1
+        if count > self.window:
+            old = self.values[0] - ref
+            total, total_sq, count = total - old, total_sq - old ** 2, self.window
+        if count < self.window:
+            return np.nan, np.nan
+        mean = total / count
+        return mean + ref, math.sqrt(max(total_sq / count - mean ** 2, 0.0))
+
+    def push(self, x):
+        result = self.peek(x)
+        if self.ref is None:
+            self.ref = x
+        self.values.append(x)
+        self.total += x - self.ref
+        self.total_sq += (x - self.ref) ** 2
+        if len(self.values) > self.window:
+            old = self.values.popleft() - self.ref
+            self.total -= old
+            self.total_sq -= old ** 2
+        return result
+
+
+# 마감된 봉을 하나씩 받아 지표를 갱신하는 상태
+# update() 는 마감된 봉을 반영하고, summary(live_bar) 는 진행 중인 봉을 상태 변경 없이 더해서 요약
+class IndicatorState:
+    def __init__(self):
+        self.count = 0
+        self.last_time = None
+        self.prev_close = None
+        self.sma = {period: _Window(period) for period in SMA_PERIODS}
+        self.bollinger = _Window(BOLLINGER_PERIOD)
+        self.ema = _Ema(2 / (EMA_PERIOD + 1))
+        self.ema_fast = _Ema(2 / (MACD_FAST + 1))
+        self.ema_slow = _Ema(2 / (MACD_SLOW + 1))
+        self.ema_signal = _Ema(2 / (MACD_SIGNAL + 1))
+        self.avg_gain = _Ema(1 / RSI_PERIOD)
+        self.avg_loss = _Ema(1 / RSI_PERIOD)
+        self.atr = _Ema(1 / ATR_PERIOD)
+        self.recent = deque(maxlen=2 * SWING_SPAN + 1)  # 스윙 판정용 최근 (고가, 저가)
+        self.swing_highs = deque(maxlen=SWING_COUNT)
+        self.swing_lows = deque(maxlen=SWING_COUNT)
+
+    def _step(self, high, low, close, commit):
+        op = "push" if commit else "peek"
+        count = self.count + 1
+        values = {}
+        for period, window in self.sma.items():
+            values[f"sma_{period}"] = getattr(window, op)(close)[0]
+        mid, std = getattr(self.bollinger, op)(close)
+        values["bb_upper"], values["bb_lower"] = mid + BOLLINGER_WIDTH * std, mid - BOLLINGER_WIDTH * std
+        values[f"ema_{EMA_PERIOD}"] = getattr(self.ema, op)(close)
+
+        if self.prev_close is None:
+            gain = loss = None
+            true_range = high - low
+        else:
+            change = close - self.prev_close
+            gain, loss = max(change, 0.0), max(-change, 0.0)
+            true_range = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        rsi = np.nan
+        if gain is not None:
+            avg_gain, avg_loss = getattr(self.avg_gain, op)(gain), getattr(self.avg_loss, op)(loss)
+            rsi = 100 - 100 / (1 + avg_gain / avg_loss) if avg_loss > 0 else 100.0
+        values["rsi"] = rsi
+        values["atr"] = getattr(self.atr, op)(true_range)
+
+        macd = getattr(self.ema_fast, op)(close) - getattr(self.ema_slow, op)(close)
+        signal = getattr(self.ema_signal, op)(macd)
+        values["macd"], values["macd_signal"], values["macd_hist"] = macd, signal, macd - signal
+
+        for name, minimum in (("rsi", MIN_BARS["rsi"]), ("atr", MIN_BARS["atr"]), ("macd", MIN_BARS["macd"]),
+                              ("macd_signal", MIN_BARS["macd_signal"]), ("macd_hist", MIN_BARS["macd_signal"]),
+                              (f"ema_{EMA_PERIOD}", MIN_BARS["ema"])):
+            if count < minimum:
+                values[name] = np.nan
+        if commit:
+            self.count = count
+            self.prev_close = close
+            self._update_swings(high, low)
+        return values
+
+    def _update_swings(self, high, low):
+        self.recent.append((high, low))
+        if len(self.recent) < self.recent.maxlen:
+            return
+        center_high, center_low = self.recent[SWING_SPAN]
+        left, right = list(self.recent)[:SWING_SPAN], list(self.recent)[SWING_SPAN + 1:]
+        if center_high > max(h for h, _ in left) and center_high >= max(h for h, _ in right):
+            self.swing_highs.append(center_high)
+        if center_low < min(l for _, l in left) and center_low <= min(l for _, l in right):
+            self.swing_lows.append(center_low)
+
+    # 마감된 봉 반영 (O(1))
+    def update(self, high, low, close, time=None):
+        self.values = self._step(float(high), float(low), float(close), commit=True)
+        self.last_close = float(close)
+        self.last_time = time
+        return self.values
+
+    # 현재 지표 요약 (live_bar=(high, low, close) 이면 진행 중인 봉을 포함한 값)
+    def summary(self, live_bar=None, decimals=None):
+        if live_bar is not None:
+            high, low, close = (float(v) for v in live_bar)
+            values = self._step(high, low, close, commit=False)
+        elif self.count:
+            values, close = self.values, self.last_close
+        else:
+            return None
+        return _summarize(values, close, list(self.swing_highs), list(self.swing_lows), decimals)
+
+
+# 타임프레임별 IndicatorState 를 유지하면서 새로 마감된 봉만 반영하는 엔진
+# 프레임의 마지막 봉은 진행 중인 봉으로 보고 상태에 넣지 않음
+class IndicatorEngine:
+    def __init__(self):
+        self.states = {}
+
+    def summary(self, name, df, decimals=None):
+        if df is None or df.empty:
+            return None
+        closed, live = df.iloc[:-1], df.iloc[-1]
+        state = self.states.get(name)
+        # 처음이거나, 마지막으로 반영한 봉과 새 프레임 사이에 빠진 구간이 있으면 처음부터 다시 계산
+        if state is None or state.last_time is None or (len(closed) and closed.index[0] > state.last_time):
+            state = self.states[name] = IndicatorState()
+        if state.last_time is not None:
+            closed = closed[closed.index > state.last_time]
+        for ts, high, low, close in zip(closed.index, closed["high"].to_numpy(dtype=float),
+                                        closed["low"].to_numpy(dtype=float), closed["close"].to_numpy(dtype=float)):
+            state.update(high, low, close, ts)
+        return state.summary((live["high"], live["low"], live["close"]), decimals)
+
+
+# 벡터 계산과 증분 계산의 결과 비교, 새 봉마다 전체 재계산 vs 증분 갱신 속도 비교
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(13)
+    n = 2000
+    close = 150_000_000 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    high = close * (1 + rng.uniform(0, 0.004, n))
+    low = close * (1 - rng.uniform(0, 0.004, n))
+    df = pd.DataFrame({"open": close, "high": high, "low": low, "close": close, "volume": 1.0},
+                      index=pd.date_range("2025-01-01", periods=n, freq="h"))
+
+    vectorized = indicator_summary(df)
+    engine = IndicatorEngine()
+    incremental = engine.summary("1h", df)
+    mismatched = {key: (vectorized.get(key), incremental.get(key)) for key in vectorized
+                  if vectorized.get(key) != incremental.get(key)}
+    print(vectorized)
+    print(f"vectorized vs incremental mismatches: {mismatched or 'none'}")
+
+    # 720개 봉 윈도우에서 새 봉 500개가 하나씩 들어올 때
+    window = 720
+    started = time.perf_counter()
+    for end in range(window, window + 500):
+        indicator_summary(df.iloc[end - window:end])
+    full = (time.perf_counter() - started) / 500
+    engine = IndicatorEngine()
+    engine.summary("1h", df.iloc[:window])
+    started = time.perf_counter()
+    for end in range(window + 1, window + 501):
+        engine.summary("1h", df.iloc[end - window:end])
+    incremental_time = (time.perf_counter() - started) / 500
+    state = IndicatorState()
+    started = time.perf_counter()
+    for h, l, c in zip(high, low, close):
+        state.update(h, l, c)
+    update_time = (time.perf_counter() - started) / n
+    print(f"per new candle: full recompute {full * 1e6:.0f}us, engine.summary {incremental_time * 1e6:.0f}us, "
+          f"raw IndicatorState.update {update_time * 1e6:.1f}us")
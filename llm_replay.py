@@ -0,0 +1,391 @@
+import os
+import json
+import zlib
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import candle_store
+from db_connections import TRADE_DB_PATH, snapshot
+from decision_cache import canonical_hash
+from markets import currency
+from payload_encoder import encode_payload
+from resample import derive_timeframes, base_candles_needed
+
+# 녹화 저장소 (요청/응답은 zlib 압축 JSON 으로 저장)
+DEFAULT_RECORDINGS_PATH = "llm_recordings.db"
+
+# 녹화 모드: off (사용 안 함), record (실제 호출 후 저장), replay (녹화가 있으면 재생, 없으면 실제 호출 후 저장)
+RECORD_MODES = ("off", "record", "replay")
+
+# 재생 시 응답을 나누는 글자 수 (스트리밍 응답 흉내)
+REPLAY_CHUNK_CHARS = 16
+
+DECISIONS = ("buy", "hold", "sell")
+
+
+# 녹화 키: 판단 캐시와 같은 정규화 해시 (모델 + 메시지)
+def request_key(model, messages):
+    return canonical_hash({"model": model, "messages": messages})
+
+
+def _pack(obj):
+    return zlib.compress(json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 6)
+
+
+def _unpack(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+# LLM 요청/응답 녹화 저장소 (SQLite, 키는 요청 해시)
+class RecordingStore:
+    def __init__(self, path=DEFAULT_RECORDINGS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS recordings
+                             (key TEXT PRIMARY KEY,
+                              model TEXT,
+                              recorded_at TEXT,
+                              latency REAL,
+                              request BLOB,
+                              response BLOB) WITHOUT ROWID""")
+        self.conn.commit()
+
+    # 녹화 조회: {"model", "recorded_at", "latency", "messages", "response"} 또는 None
+    def get(self, key):
+        with self._lock:
+            row = self.conn.execute("SELECT model, recorded_at, latency, request, response FROM recordings "
+                                    "WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        model, recorded_at, latency, request, response = row
+        return {"model": model, "recorded_at": recorded_at, "latency": latency,
+                "messages": _unpack(request), "response": _unpack(response)}
+
+    # 녹화 저장 (같은 요청은 최신 응답으로 교체)
+    def put(self, key, model, messages, response_text, latency):
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO recordings VALUES (?, ?, ?, ?, ?, ?)",
+                              (key, model, datetime.now().isoformat(), latency,
+                               _pack(messages), _pack(response_text)))
+            self.conn.commit()
+
+    # 녹화된 전체 항목 (녹화 시각 순)
+    def items(self):
+        with self._lock:
+            keys = [row[0] for row in self.conn.execute("SELECT key FROM recordings ORDER BY recorded_at")]
+        for key in keys:
+            yield key, self.get(key)
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM recordings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+# --- OpenAI 클라이언트 대역 ---
+
+def _completion(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+# 저장된 응답을 스트리밍 청크로 나눠서 돌려주는 스트림
+class _ReplayStream:
+    def __init__(self, text):
+        self.chunks = [text[i:i + REPLAY_CHUNK_CHARS] for i in range(0, len(text), REPLAY_CHUNK_CHARS)]
+
+    def __iter__(self):
+        for piece in self.chunks:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+
+    def close(self):
+        pass
+
+
+# 실제 스트림을 그대로 넘겨주면서 내용을 모아 두었다가 끝까지 받으면 저장 (중간에 끊기면 저장 안 함)
+class _RecordingStream:
+    def __init__(self, stream, on_complete):
+        self.stream = stream
+        self.on_complete = on_complete
+
+    def __iter__(self):
+        parts = []
+        for chunk in self.stream:
+            if chunk.choices:
+                parts.append(chunk.choices[0].delta.content or "")
+            yield chunk
+        self.on_complete("".join(parts))
+
+    def close(self):
+        self.stream.close()
+
+
+# OpenAI 클라이언트를 감싸서 chat.completions.create 호출을 녹화/재생하는 클라이언트
+#   client 가 None 이면 녹화된 요청만 재생 (없으면 KeyError)
+class RecordingClient:
+    def __init__(self, client, store, mode="record"):
+        self.client = client
+        self.store = store
+        self.mode = mode
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def with_options(self, **options):
+        inner = self.client.with_options(**options) if self.client is not None else None
+        return RecordingClient(inner, self.store, self.mode)
+
+    def _create(self, model, messages, stream=False, **kwargs):
+        key = request_key(model, messages)
+        if self.mode == "replay" or self.client is None:
+            recording = self.store.get(key)
+            if recording is not None:
+                text = recording["response"]
+                return _ReplayStream(text) if stream else _completion(text)
+            if self.client is None:
+                raise KeyError(f"no recording for request {key[:12]}")
+
+        started = time.perf_counter()
+        response = self.client.chat.completions.create(model=model, messages=messages, stream=stream, **kwargs)
+        if stream:
+            return _RecordingStream(response, lambda text: self.store.put(
+                key, model, messages, text, time.perf_counter() - started))
+        self.store.put(key, model, messages, response.choices[0].message.content, time.perf_counter() - started)
+        return response
+
+
+# 설정된 모드에 맞게 클라이언트를 감싸는 함수 (off 이면 그대로 반환)
+def recording_client(client, store, mode):
+    if mode not in RECORD_MODES:
+        raise ValueError(f"unknown record mode: {mode} (expected one of {', '.join(RECORD_MODES)})")
+    if mode == "off" or store is None:
+        return client
+    return RecordingClient(client, store, mode)
+
+
+# 프롬프트 실험용 로컬 대역 모델: 1시간봉 단기/장기 평균 비교로 판단 (네트워크 없음)
+class StandInModel:
+    def __init__(self, fast=6, threshold_pct=0.5, percentage=20):
+        self.fast = fast
+        self.threshold_pct = threshold_pct
+        self.percentage = percentage
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def with_options(self, **options):
+        return self
+
+    def _create(self, model, messages, stream=False, **kwargs):
+        text = json.dumps(self.decide(messages[-1]["content"]))
+        return _ReplayStream(text) if stream else _completion(text)
+
+    def decide(self, user_content):
+        try:
+            content = json.loads(user_content)
+        except ValueError:
+            content = {}
+        closes = _closes(content.get("short_term"))
+        if closes is None or len(closes) <= self.fast:
+            summary = content.get("short_term_summary") or content.get("short_term") or {}
+            change = summary.get("change_pct") if isinstance(summary, dict) else None
+        else:
+            change = (np.mean(closes[-self.fast:]) / np.mean(closes) - 1) * 100
+        if change is None:
+            return {"decision": "hold", "percentage": 0, "reason": "stand-in: no chart data"}
+        if change > self.threshold_pct:
+            decision = "buy"
+        elif change < -self.threshold_pct:
+            decision = "sell"
+        else:
+            decision = "hold"
+        return {"decision": decision, "percentage": self.percentage if decision != "hold" else 0,
+                "reason": f"stand-in: short-term trend {change:+.2f}%"}
+
+
+# 인코딩된 타임프레임(columnar/csv)에서 종가 배열 추출
+def _closes(frame):
+    if isinstance(frame, dict) and "cols" in frame and "c" in frame["cols"]:
+        column = frame["cols"].index("c")
+        return np.array([row[column] for row in frame["rows"]], dtype=float)
+    if isinstance(frame, str):
+        lines = frame.splitlines()
+        header = lines[0].split(",") if lines else []
+        if "c" in header:
+            column = header.index("c")
+            return np.array([float(line.split(",")[column]) for line in lines[1:]])
+    return None
+
+
+# --- trades 기록 재생 ---
+
+# 녹화된 요청으로 재생 케이스 구성 (기대값 = 녹화된 응답)
+def cases_from_recordings(store):
+    cases = []
+    for key, recording in store.items():
+        try:
+            expected = json.loads(recording["response"])
+        except ValueError:
+            continue
+        cases.append({"id": key[:12], "messages": recording["messages"], "expected": expected})
+    return cases
+
+
+# trades 테이블의 각 판단 시점 입력을 다시 구성 (기대값 = 기록된 판단)
+# 캔들은 캔들 저장소에서 판단 시각 이전 구간을 자르고, 잔고/최근 거래는 trades 기록을 사용
+# 뉴스는 저장되어 있지 않아 빈 목록으로 보냄 (market: 이 마켓의 기록만 사용)
+def cases_from_trades(db_path=TRADE_DB_PATH, candle_path=candle_store.CANDLE_DB_PATH,
+                      counts=(24, 30, 30), system_prompt="", layout="columnar", token_budget=None,
+                      market="KRW-BTC"):
+    with snapshot(db_path) as conn:
+        # 마이그레이션 전 DB 에는 market 컬럼이 없음 (모두 KRW-BTC 기록)
+        has_market = any(row[1] == "market" for row in conn.execute("PRAGMA table_info(trades)"))
+        trades = pd.read_sql_query(f"""SELECT id, timestamp, decision, percentage, reason,
+                                              btc_balance, krw_balance, btc_price
+                                       FROM trades {'WHERE market = ?' if has_market else ''}
+                                       ORDER BY timestamp""", conn, params=(market,) if has_market else ())
+
+    candle_conn = candle_store.init_candle_db(candle_path)
+    try:
+        hourly = candle_store.load_window(candle_conn, market, "minute60", 1_000_000)
+    finally:
+        candle_conn.close()
+    base_count = base_candles_needed(*counts)
+    coin = currency(market).lower()
+
+    cases = []
+    columns = ["timestamp", "decision", "percentage", "reason", "btc_balance", "krw_balance", "btc_price"]
+    records = trades[columns].to_dict("records")
+    for i, row in enumerate(trades.itertuples(index=False)):
+        frames = {"short_term": None, "mid_term": None, "long_term": None}
+        if hourly is not None:
+            window = hourly[hourly.index <= pd.Timestamp(row.timestamp)].tail(base_count)
+            frames = dict(zip(frames, derive_timeframes(window if len(window) else None, *counts)))
+        payload = {
+            "market": market,
+            "news": [],
+            "current_balance": {
+                "krw": row.krw_balance,
+                coin: row.btc_balance,
+                f"{coin}_price": row.btc_price,
+                "total_value": row.krw_balance + row.btc_balance * row.btc_price
+            },
+            "recent_trades": records[max(0, i - 5):i][::-1]
+        }
+        user_content, _ = encode_payload(payload, frames, layout=layout, token_budget=token_budget)
+        cases.append({
+            "id": f"trade-{row.id}",
+            "messages": [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_content}],
+            "expected": {"decision": row.decision, "percentage": row.percentage},
+        })
+    return cases
+
+
+# 케이스마다 모델을 호출해 판단을 비교
+#   system_prompt: 지정하면 모든 케이스의 시스템 메시지를 교체 (프롬프트 변경 실험)
+#   workers: 동시 호출 수 (실제 API 상대로 재생할 때)
+def replay(cases, client, model="gpt-4o", system_prompt=None, workers=1):
+    def run(case):
+        messages = [dict(m) for m in case["messages"]]
+        if system_prompt is not None and messages and messages[0]["role"] == "system":
+            messages[0]["content"] = system_prompt
+        started = time.perf_counter()
+        try:
+            response = client.chat.completions.create(model=model, messages=messages,
+                                                      response_format={"type": "json_object"})
+            got = json.loads(response.choices[0].message.content)
+            error = None
+        except Exception as e:
+            got, error = None, str(e)
+        return {"id": case["id"], "expected": case["expected"], "got": got, "error": error,
+                "latency": time.perf_counter() - started}
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(run, cases))
+    return [run(case) for case in cases]
+
+
+def _decision(result):
+    decision = str((result or {}).get("decision", "")).lower()
+    return decision if decision in DECISIONS else "hold"
+
+
+# 판단 일치율, 혼동 행렬, 비율 오차, 호출 지연 분포
+def agreement_report(results):
+    answered = [r for r in results if r["got"] is not None]
+    confusion = {expected: {got: 0 for got in DECISIONS} for expected in DECISIONS}
+    percentage_errors = []
+    for r in answered:
+        expected, got = _decision(r["expected"]), _decision(r["got"])
+        confusion[expected][got] += 1
+        if expected == got and expected != "hold":
+            percentage_errors.append(abs(float(r["expected"].get("percentage") or 0) -
+                                         float(r["got"].get("percentage") or 0)))
+    agreed = sum(confusion[d][d] for d in DECISIONS)
+    latencies = np.array([r["latency"] for r in results]) * 1000
+    return {
+        "cases": len(results),
+        "errors": len(results) - len(answered),
+        "agreement": agreed / len(answered) if answered else 0.0,
+        "confusion": confusion,
+        "percentage_mae": float(np.mean(percentage_errors)) if percentage_errors else None,
+        "latency_ms": {
+            "p50": float(np.percentile(latencies, 50)) if len(latencies) else None,
+            "p90": float(np.percentile(latencies, 90)) if len(latencies) else None,
+            "p99": float(np.percentile(latencies, 99)) if len(latencies) else None,
+            "max": float(latencies.max()) if len(latencies) else None,
+        },
+    }
+
+
+def format_report(report):
+    lines = [f"cases {report['cases']}, errors {report['errors']}, agreement {report['agreement']:.1%}"]
+    if report["percentage_mae"] is not None:
+        lines.append(f"percentage MAE on agreeing buy/sell: {report['percentage_mae']:.1f}")
+    lines.append("expected \\ got   " + "  ".join(f"{d:>5}" for d in DECISIONS))
+    for expected in DECISIONS:
+        lines.append(f"{expected:>14}   " + "  ".join(f"{report['confusion'][expected][d]:>5}" for d in DECISIONS))
+    latency = report["latency_ms"]
+    if latency["p50"] is not None:
+        lines.append(f"latency p50 {latency['p50']:.2f}ms, p90 {latency['p90']:.2f}ms, "
+                     f"p99 {latency['p99']:.2f}ms, max {latency['max']:.2f}ms")
+    return "\n".join(lines)
+
+
+# trades 기록 전체를 재생
+#   python llm_replay.py                      로컬 대역 모델로 재생 후 녹화, 녹화본 재생
+#   python llm_replay.py openai prompt.txt    새 시스템 프롬프트로 gpt-4o 재생 (응답은 녹화됨)
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    from autotrade_06_streamit import SYSTEM_PROMPT, LLM_MODEL
+
+    target = sys.argv[1] if len(sys.argv) > 1 else "standin"
+    prompt = SYSTEM_PROMPT
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], encoding="utf-8") as f:
+            prompt = f.read()
+
+    cases = cases_from_trades(system_prompt=SYSTEM_PROMPT)
+    print(f"{len(cases)} trades rebuilt from bitcoin_trading.db")
+
+    if target == "openai":
+        from clients import get_openai_client
+        store = RecordingStore(os.getenv("LLM_RECORDINGS_PATH", DEFAULT_RECORDINGS_PATH))
+        client = RecordingClient(get_openai_client(), store, "replay")
+        print(format_report(agreement_report(replay(cases, client, LLM_MODEL, system_prompt=prompt, workers=4))))
+    else:
+        # 대역 모델 응답을 임시 저장소에 녹화한 뒤, 녹화본만으로 다시 재생
+        store = RecordingStore(os.path.join(tempfile.mkdtemp(), "recordings.db"))
+        recorder = RecordingClient(StandInModel(), store, "record")
+        print("stand-in model vs recorded trades:")
+        print(format_report(agreement_report(replay(cases, recorder, LLM_MODEL, system_prompt=prompt))))
+        print(f"\nrecorded {len(store)} responses ({os.path.getsize(store.path)} bytes); replaying recordings:")
+        player = RecordingClient(None, store, "replay")
+        print(format_report(agreement_report(replay(cases_from_recordings(store), player, LLM_MODEL))))
+    store.close()
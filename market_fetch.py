@@ -0,0 +1,111 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from tracing import span, in_context
+
+# 소스별 기본 타임아웃과 전체 마감 시간 (초)
+DEFAULT_SOURCE_TIMEOUT = 10
+DEFAULT_DEADLINE = 15
+
+
+# 작업 스레드 안에서 실행 시간을 재는 래퍼 ("candles:KRW-BTC" 는 fetch.candles 구간으로 기록)
+def _timed_call(name, func):
+    with span(f"fetch.{name.split(':')[0]}", source=name):
+        started = time.perf_counter()
+        value = func()
+        return value, time.perf_counter() - started
+
+
+# 서로 독립적인 데이터 요청들을 스레드 풀에서 동시에 실행하는 함수
+#   sources: {"이름": 함수} 또는 {"이름": (함수, 소스별 타임아웃)}
+#   반환값: {"results": {...}, "errors": {...}, "timings": {...}, "wall_time": 초}
+# 소스별 타임아웃이나 전체 마감 시간을 넘긴 소스는 errors 에 TimeoutError 로 기록됩니다.
+def fetch_concurrently(sources, timeout=DEFAULT_SOURCE_TIMEOUT, deadline=DEFAULT_DEADLINE, max_workers=None):
+    results, errors, timings = {}, {}, {}
+    if not sources:
+        return {"results": results, "errors": errors, "timings": timings, "wall_time": 0.0}
+
+    executor = ThreadPoolExecutor(max_workers=max_workers or len(sources), thread_name_prefix="fetch")
+    started = time.perf_counter()
+    overall_end = started + deadline
+
+    pending = {}
+    for name, spec in sources.items():
+        func, source_timeout = spec if isinstance(spec, tuple) else (spec, timeout)
+        future = executor.submit(in_context(_timed_call), name, func)
+        pending[future] = (name, started + min(source_timeout, deadline))
+
+    while pending:
+        now = time.perf_counter()
+        # 소스별 타임아웃이 지난 요청은 포기 (스레드는 백그라운드에서 끝나도록 둠)
+        for future, (name, source_end) in list(pending.items()):
+            if now >= source_end:
+                del pending[future]
+                future.cancel()
+                errors[name] = TimeoutError(f"{name}: no response within {source_end - started:.1f}s")
+                timings[name] = now - started
+        if not pending or now >= overall_end:
+            break
+
+        next_end = min(source_end for _, source_end in pending.values())
+        done, _ = wait(pending, timeout=max(0.0, min(next_end, overall_end) - now), return_when=FIRST_COMPLETED)
+        for future in done:
+            name, _ = pending.pop(future)
+            try:
+                results[name], timings[name] = future.result()
+            except Exception as e:
+                errors[name] = e
+                timings[name] = time.perf_counter() - started
+
+    # 전체 마감 시간을 넘긴 나머지 요청
+    for future, (name, _) in pending.items():
+        future.cancel()
+        errors[name] = TimeoutError(f"{name}: overall fetch deadline ({deadline:.1f}s) exceeded")
+        timings[name] = time.perf_counter() - started
+
+    executor.shutdown(wait=False, cancel_futures=True)
+    return {"results": results, "errors": errors, "timings": timings,
+            "wall_time": time.perf_counter() - started}
+
+
+# 소스별 소요 시간을 한 줄 문자열로 정리하는 함수
+def format_timings(report):
+    parts = []
+    for name, seconds in sorted(report["timings"].items(), key=lambda item: -item[1]):
+        status = "" if name in report["results"] else " (failed)"
+        parts.append(f"{name}={seconds * 1000:.0f}ms{status}")
+    return f"fetch wall={report['wall_time'] * 1000:.0f}ms | " + ", ".join(parts)
+
+
+# 가짜 거래소로 순차 호출과 동시 호출의 소요 시간을 비교하는 벤치마크
+if __name__ == "__main__":
+    def fake_call(delay, value):
+        def call():
+            time.sleep(delay)
+            return value
+        return call
+
+    # ai_trading() 한 사이클의 7개 네트워크 호출을 흉내낸 지연 시간
+    fake_sources = {
+        "ohlcv_minute60": fake_call(0.25, "df"),
+        "ohlcv_minute240": fake_call(0.30, "df"),
+        "ohlcv_day": fake_call(0.35, "df"),
+        "news": fake_call(0.80, []),
+        "balance_krw": fake_call(0.15, 1000000.0),
+        "balance_btc": fake_call(0.15, 0.01),
+        "current_price": fake_call(0.10, 150000000.0),
+    }
+
+    sequential_start = time.perf_counter()
+    for func in fake_sources.values():
+        func()
+    sequential = time.perf_counter() - sequential_start
+
+    report = fetch_concurrently(fake_sources)
+    slowest = max(report["timings"].values())
+    print(f"sequential: {sequential * 1000:.0f}ms")
+    print(f"concurrent: {report['wall_time'] * 1000:.0f}ms (slowest single call {slowest * 1000:.0f}ms)")
+    print(format_timings(report))
+
+    # 소스별 타임아웃 확인
+    report = fetch_concurrently({"slow": (fake_call(1.0, None), 0.2), "fast": fake_call(0.05, 1)})
+    print(format_timings(report), "| errors:", {k: str(v) for k, v in report["errors"].items()})
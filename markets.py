@@ -0,0 +1,74 @@
+import os
+import python_bithumb
+import candle_store
+from market_fetch import fetch_concurrently
+
+# 거래할 마켓 목록 (쉼표로 구분, 예: "KRW-BTC,KRW-ETH,KRW-XRP")
+MARKETS = [m.strip().upper() for m in os.getenv("MARKETS", "KRW-BTC").split(",") if m.strip()]
+
+# 동시에 실행할 수집 요청 수 (마켓이 많으면 이 크기로 나눠서 순서대로 처리됨)
+FETCH_MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", "8"))
+
+
+# "KRW-ETH" -> "ETH"
+def currency(market):
+    return market.split("-", 1)[1]
+
+
+# 전체 잔고를 한 번에 조회 ({"KRW": 잔고, "BTC": 잔고, ...})
+# Bithumb.get_balance 는 호출할 때마다 전체 잔고를 다시 받아오므로 사이클마다 이 결과를 공유
+def fetch_balances(bithumb):
+    return {b["currency"]: float(b["balance"]) for b in bithumb.get_balances()}
+
+
+# 여러 마켓 현재가를 한 번의 요청으로 조회 ({마켓: 가격})
+# 응답에 빠진 마켓(조회 실패/상장 폐지)은 결과에서 빠짐, 하나도 없으면 RuntimeError
+# (get_current_price 는 시세가 하나만 오면 마켓 없이 가격만 돌려주므로, 여러 마켓인데 그렇게 오면
+#  어느 마켓 가격인지 알 수 없어 마켓별로 다시 조회)
+def fetch_prices(markets):
+    markets = list(markets)
+    if len(markets) == 1:
+        price = python_bithumb.get_current_price(markets[0])
+        prices = {} if price is None else {markets[0]: float(price)}
+    else:
+        prices = python_bithumb.get_current_price(markets)
+        if not isinstance(prices, dict):
+            prices = {}
+            for market in markets:
+                price = python_bithumb.get_current_price(market)
+                if price is not None:
+                    prices[market] = float(price)
+    if not prices:
+        raise RuntimeError(f"현재가 조회 실패: {', '.join(markets)}")
+    return prices
+
+
+# 한 사이클에 필요한 데이터를 한 번에 수집
+#   잔고/현재가/뉴스는 마켓 수와 관계없이 한 번씩, 캔들은 마켓마다 (로컬 저장소 + 빠진 꼬리만 조회)
+#   news: 인자 없는 뉴스 수집 함수 (없으면 생략)
+# 반환값: fetch_concurrently 결과에 마켓별로 정리한 balances / prices / candles / news 를 더한 dict
+def fetch_cycle(bithumb, markets, candle_count, news=None, timeout=10, deadline=15,
+                max_workers=FETCH_MAX_WORKERS):
+    sources = {
+        "balances": lambda: fetch_balances(bithumb),
+        "prices": lambda: fetch_prices(markets),
+    }
+    for market in markets:
+        sources[f"candles:{market}"] = (lambda m=market: candle_store.get_ohlcv(m, interval="minute60",
+                                                                               count=candle_count))
+    if news:
+        sources["news"] = news
+    fetched = fetch_concurrently(sources, timeout=timeout, deadline=deadline,
+                                 max_workers=min(max_workers, len(sources)))
+    data = fetched["results"]
+    fetched["balances"] = data.get("balances")
+    fetched["prices"] = data.get("prices") or {}
+    fetched["candles"] = {market: data.get(f"candles:{market}") for market in markets}
+    fetched["news"] = data.get("news", [])
+    return fetched
+
+
+# 전체 포트폴리오 가치 (KRW + 마켓별 보유 코인 평가액)
+def portfolio_value(balances, prices):
+    return balances.get("KRW", 0.0) + sum(balances.get(currency(market), 0.0) * price
+                                          for market, price in prices.items())
@@ -0,0 +1,227 @@
+import os
+import math
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 스케줄러 프로세스 안에서 여는 메트릭 HTTP 포트 (0 이면 열지 않음)
+# 잔고/손실/주문 수가 인증 없이 노출되므로 기본은 로컬에서만 조회 가능
+# (다른 호스트의 Prometheus 가 수집해야 하면 METRICS_HOST=0.0.0.0 등으로 직접 열기)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# 마지막 성공 사이클이 이 시간(초)보다 오래되면 /healthz 가 503 (스케줄 간격 6시간 + 여유)
+METRICS_STALE_AFTER = float(os.getenv("METRICS_STALE_AFTER", str(7 * 3600)))
+
+# 단계 지연 시간 히스토그램 구간 (초, LLM 응답과 체결 대기까지 포함하도록 60초까지)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# 체결 슬리피지 히스토그램 구간 (bps, 음수는 판단 시점 가격보다 유리한 체결)
+SLIPPAGE_BUCKETS = (-50, -20, -10, -5, -2, 0, 2, 5, 10, 20, 50, 100)
+
+# 노출하는 메트릭 정의: 이름 -> (종류, 설명)
+METRICS = {
+    "trade_cycles_total": ("counter", "Trading cycles run, by status."),
+    "trade_last_success_timestamp_seconds": ("gauge", "Unix time of the last successful trading cycle."),
+    "trade_last_cycle_duration_seconds": ("gauge", "Wall time of the last trading cycle."),
+    "trade_stage_latency_seconds": ("histogram", "Latency of each trading-cycle stage (from tracing spans)."),
+    "trade_api_errors_total": ("counter", "Failed external calls, by source."),
+    "trade_orders_total": ("counter", "Orders by market, side and state."),
+    "trade_liquidity_checks_total": ("counter", "Pre-trade orderbook checks, by market and action (ok/reduce/delay)."),
+    "trade_slippage_bps": ("histogram", "Fill price vs decision-time price in bps (positive is worse), by strategy."),
+    "trade_llm_tokens_total": ("counter", "LLM tokens used, by kind (prompt/completion)."),
+    "trade_llm_decisions_total": ("counter", "LLM decisions, by source (stream/request/batch/cache)."),
+    "trade_cache_hits_total": ("counter", "Cache hits, by cache."),
+    "trade_cache_misses_total": ("counter", "Cache misses, by cache."),
+    "trade_cache_hit_ratio": ("gauge", "Cache hit ratio since start, by cache."),
+    "trade_risk_blocks_total": ("counter", "Orders rejected or reduced by the risk engine, by market, rule and action."),
+    "trade_drawdown_ratio": ("gauge", "Portfolio drawdown from the equity peak (0-1)."),
+    "trade_daily_loss_ratio": ("gauge", "Portfolio loss since the first value of the day (0-1, negative is a gain)."),
+    "trade_kill_switch": ("gauge", "1 while the volatility kill switch blocks buys in a market."),
+    "trade_balance": ("gauge", "Exchange balance after the last cycle, by currency."),
+    "trade_price_krw": ("gauge", "Price used for the last cycle, by market."),
+    "trade_portfolio_value_krw": ("gauge", "Portfolio value (KRW + coins at last price)."),
+    "trade_event_queue_dropped_total": ("counter", "Rows dropped because the DB writer queue was full."),
+}
+
+_lock = threading.Lock()
+_values = {}      # (이름, 라벨 튜플) -> 값 (counter / gauge)
+_histograms = {}  # (이름, 라벨 튜플) -> [구간별 개수, 합계, 개수]
+_collectors = []  # 조회 시점에 값을 채우는 함수 (다른 모듈이 가진 통계: 캐시 적중률 등)
+_sources = {}     # (이름, 라벨 튜플) -> inc_to 로 마지막에 받은 누적값
+_server = None
+_started = time.time()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _values[_key(name, labels)] = value
+
+
+# 다른 모듈이 세는 누적값(total)을 카운터로 옮김: 지난번 누적값과의 차이만큼 증가
+# 원래 누적값이 줄었으면 (재시작 등으로 0부터 다시 셈) 새 누적값 전체를 더해 카운터는 줄지 않음
+def inc_to(name, total, **labels):
+    key = _key(name, labels)
+    with _lock:
+        last = _sources.get(key, 0)
+        delta = total - last if total >= last else total
+        _sources[key] = total
+        _values[key] = _values.get(key, 0) + delta
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * len(buckets), 0.0, 0, buckets]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                histogram[0][i] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+# 조회할 때마다 실행할 함수 등록 (다른 모듈의 통계를 set_gauge 등으로 옮겨 적음)
+def register_collector(func):
+    _collectors.append(func)
+
+
+def _labels_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "NaN"
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+# Prometheus 텍스트 형식 (text/plain; version=0.0.4)
+def render():
+    for collector in list(_collectors):
+        try:
+            collector()
+        except Exception as e:
+            print(f"메트릭 수집 실패 ({getattr(collector, '__name__', collector)}): {e}")
+    with _lock:
+        values = dict(_values)
+        histograms = {key: (list(h[0]), h[1], h[2], h[3]) for key, h in _histograms.items()}
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        samples = sorted((labels, value) for (n, labels), value in values.items() if n == name)
+        series = sorted((labels, h) for (n, labels), h in histograms.items() if n == name)
+        if not samples and not series:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_labels_text(labels)} {_number(value)}")
+        for labels, (counts, total, count, buckets) in series:
+            for bound, bucket_count in zip(buckets, counts):
+                lines.append(f"{name}_bucket{_labels_text(labels, [('le', _number(float(bound)))])} {bucket_count}")
+            lines.append(f"{name}_bucket{_labels_text(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{_labels_text(labels)} {_number(total)}")
+            lines.append(f"{name}_count{_labels_text(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+# 마지막 성공 사이클이 METRICS_STALE_AFTER 안이면 정상 (아직 한 번도 안 돌았으면 시작 시각 기준)
+def healthy(now=None):
+    now = now or time.time()
+    with _lock:
+        last = _values.get(_key("trade_last_success_timestamp_seconds", {}), _started)
+    return now - last <= METRICS_STALE_AFTER
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            status, content_type, body = 200, "text/plain; version=0.0.4; charset=utf-8", render()
+        elif path == "/healthz":
+            ok = healthy()
+            status, content_type, body = (200 if ok else 503), "text/plain", ("ok\n" if ok else "stale\n")
+        else:
+            status, content_type, body = 404, "text/plain", "not found\n"
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    # 스크레이프마다 접근 로그를 찍지 않음
+    def log_message(self, format, *args):
+        pass
+
+
+# 백그라운드 스레드에서 /metrics, /healthz 제공 (이미 열려 있으면 그대로 사용)
+def start_server(port=METRICS_PORT, host=METRICS_HOST):
+    global _server
+    if not port or _server is not None:
+        return _server
+    try:
+        _server = ThreadingHTTPServer((host, port), _Handler)
+    except OSError as e:
+        print(f"메트릭 서버 시작 실패 (포트 {port}): {e}")
+        return None
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"메트릭: http://{host}:{_server.server_address[1]}/metrics")
+    return _server
+
+
+def stop_server():
+    global _server
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
+
+
+# 임의 포트로 서버를 띄워 모의 사이클 후 /metrics 출력과 조회 비용 확인
+if __name__ == "__main__":
+    import random
+    import urllib.request
+
+    for _ in range(200):
+        observe("trade_stage_latency_seconds", random.gammavariate(2, 0.5), stage="llm")
+        observe("trade_stage_latency_seconds", random.gammavariate(2, 0.05), stage="fetch.candles")
+    inc("trade_cycles_total", 199, status="ok")
+    inc("trade_cycles_total", status="error")
+    inc("trade_api_errors_total", 3, source="candles")
+    inc("trade_llm_tokens_total", 1_250_000, kind="prompt")
+    inc("trade_llm_tokens_total", 24_000, kind="completion")
+    set_gauge("trade_last_success_timestamp_seconds", time.time())
+    set_gauge("trade_balance", 1_000_000.0, currency="KRW")
+    set_gauge("trade_balance", 0.0123, currency="BTC")
+    register_collector(lambda: set_gauge("trade_cache_hit_ratio", 0.42, cache="decision"))
+    for total in (2, 5, 1):  # 외부 누적값 2 -> 5 -> (재시작) 1: 카운터는 2 -> 5 -> 6
+        inc_to("trade_api_errors_total", total, source="news")
+    assert _values[_key("trade_api_errors_total", {"source": "news"})] == 6
+
+    server = start_server(port=19108, host="127.0.0.1")
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    started = time.perf_counter()
+    for _ in range(100):
+        body = urllib.request.urlopen(f"{url}/metrics").read().decode()
+    print(f"scrape: {(time.perf_counter() - started) * 10:.2f}ms avg, {len(body.splitlines())} lines")
+    print("\n".join(line for line in body.splitlines() if "fetch.candles" not in line))
+    print("healthz:", urllib.request.urlopen(f"{url}/healthz").read().decode().strip())
+    stop_server()
@@ -0,0 +1,253 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+# 뉴스 저장소 DB 경로
+NEWS_DB_PATH = os.getenv("NEWS_DB_PATH", "news.db")
+# 백그라운드 갱신 시각: 기본은 거래 시각(09:00/15:00/21:00) 5분 전 (시작 시 1회 + 하루 3회)
+# 갱신 1회 = SerpAPI 검색 1회이므로 호출 수가 곧 쿼터 사용량
+#   NEWS_REFRESH_INTERVAL(초) 를 주면 시각 대신 고정 간격으로 갱신 (하루 86400 / 간격 회,
+#   예: 3600 이면 하루 24회 / 월 약 720회, 900 이면 하루 96회 / 월 약 2,900회)
+NEWS_REFRESH_SLOTS = tuple(s.strip() for s in os.getenv("NEWS_REFRESH_SLOTS", "08:55,14:55,20:55").split(",")
+                           if s.strip())
+NEWS_REFRESH_INTERVAL = float(os.getenv("NEWS_REFRESH_INTERVAL", "0"))
+# 판단에 보내는 최대 기사 수와 기사 유효 기간(시간)
+NEWS_PROMPT_LIMIT = int(os.getenv("NEWS_PROMPT_LIMIT", "5"))
+NEWS_MAX_AGE_HOURS = float(os.getenv("NEWS_MAX_AGE_HOURS", "24"))
+# 1이면 지난 판단 이후 새로 들어온 기사만 보냄 (0이면 최근 기사 전체에 new 표시)
+NEWS_DELTA_ONLY = os.getenv("NEWS_DELTA_ONLY", "1") == "1"
+
+# URL 비교 시 무시하는 추적용 쿼리 파라미터
+TRACKING_PARAMS = re.compile(r"^(utm_.*|fbclid|gclid|ocid|cmpid|ref|src)$", re.IGNORECASE)
+
+
+# 제목 정규화: 매체명 꼬리(" - Reuters") 제거, 소문자, 문장부호/공백 통일
+def normalize_title(title):
+    title = re.sub(r"\s+[-|–—]\s+[^-|–—]{1,40}$", "", (title or "").strip())
+    return re.sub(r"[\W_]+", " ", title.lower()).strip()
+
+
+# URL 정규화: 스킴/www/추적 파라미터/끝의 / 제거
+def normalize_url(url):
+    if not url:
+        return None
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower().removeprefix("www.")
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if not TRACKING_PARAMS.match(k)))
+    return f"{host}{parts.path.rstrip('/')}" + (f"?{query}" if query else "")
+
+
+# 다음 갱신 시각(HH:MM, 로컬 시간)까지 남은 초
+def seconds_until_next(slots, now=None):
+    now = now or datetime.now()
+    candidates = []
+    for slot in slots:
+        hour, minute = (int(part) for part in slot.split(":"))
+        at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        candidates.append(at if at > now else at + timedelta(days=1))
+    return (min(candidates) - now).total_seconds()
+
+
+def _key(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest() if text else None
+
+
+# 로컬 뉴스 저장소
+#   fetch: 인자 없는 뉴스 수집 함수 ([{"title", "date", "link", "source"}, ...])
+#   백그라운드 스레드가 refresh_slots 시각마다 (refresh_interval 이 있으면 그 간격으로)
+#   fetch 결과를 저장하고 (제목/URL 로 중복 제거),
+#   판단 시에는 저장소에서 바로 읽음 (외부 API 를 기다리지 않음)
+class NewsStore:
+    def __init__(self, fetch, path=NEWS_DB_PATH, refresh_interval=NEWS_REFRESH_INTERVAL,
+                 refresh_slots=NEWS_REFRESH_SLOTS):
+        self.fetch = fetch
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.refresh_slots = refresh_slots
+        self.last_refresh = None          # 마지막 갱신 성공 시각 (epoch 초)
+        self.last_error = None
+        self.stats = {"refreshes": 0, "errors": 0, "fetched": 0, "added": 0, "duplicates": 0}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._ready = threading.Event()   # 시작 후 첫 갱신을 마쳤는지 (성공/실패 무관)
+        self._thread = None
+        self._pending = {}                # consumer -> for_decision 으로 읽은 시점 (commit_cursor 전)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS news
+                             (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                              title TEXT NOT NULL,
+                              url TEXT,
+                              source TEXT,
+                              date TEXT,
+                              title_key TEXT NOT NULL UNIQUE,
+                              url_key TEXT UNIQUE,
+                              first_seen_ms INTEGER NOT NULL,
+                              last_seen_ms INTEGER NOT NULL)""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_news_first_seen ON news (first_seen_ms)")
+        # 판단(소비자)별로 마지막으로 본 시점
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS news_cursors
+                             (consumer TEXT PRIMARY KEY, seen_ms INTEGER NOT NULL)""")
+        self.conn.commit()
+
+    # 기사 목록 저장 (이미 있는 제목/URL 이면 last_seen 만 갱신)
+    # 반환값: (새 기사 수, 중복 수)
+    def add(self, items, now_ms=None):
+        now_ms = now_ms or int(time.time() * 1000)
+        added = duplicates = 0
+        with self._lock, self.conn:
+            for item in items:
+                title = (item.get("title") or "").strip()
+                title_key = _key(normalize_title(title))
+                if not title_key:
+                    continue
+                url = item.get("link") or item.get("url")
+                url_key = _key(normalize_url(url))
+                row = self.conn.execute("SELECT id FROM news WHERE title_key = ? OR url_key = ?",
+                                        (title_key, url_key)).fetchone()
+                if row:
+                    self.conn.execute("UPDATE news SET last_seen_ms = ? WHERE id = ?", (now_ms, row[0]))
+                    duplicates += 1
+                    continue
+                source = item.get("source")
+                if isinstance(source, dict):
+                    source = source.get("name")
+                self.conn.execute("""INSERT INTO news (title, url, source, date, title_key, url_key,
+                                                       first_seen_ms, last_seen_ms)
+                                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                                  (title, url, source, item.get("date"), title_key, url_key, now_ms, now_ms))
+                added += 1
+        return added, duplicates
+
+    # 뉴스 한 번 수집해서 저장 (실패해도 기존 저장분은 그대로 사용)
+    def refresh(self):
+        started = time.perf_counter()
+        try:
+            items = self.fetch()
+        except Exception as e:
+            self.stats["errors"] += 1
+            self.last_error = str(e)
+            print(f"뉴스 갱신 실패: {e}")
+            return None
+        added, duplicates = self.add(items)
+        self.last_refresh = time.time()
+        self.last_error = None
+        self.stats["refreshes"] += 1
+        self.stats["fetched"] += len(items)
+        self.stats["added"] += added
+        self.stats["duplicates"] += duplicates
+        print(f"뉴스 갱신: {len(items)}건 중 새 기사 {added}건, 중복 {duplicates}건 "
+              f"({time.perf_counter() - started:.2f}s)")
+        return added, duplicates
+
+    # 백그라운드 갱신 시작 (이미 실행 중이면 무시, 시작하자마자 한 번 갱신)
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="news-refresh", daemon=True)
+            self._thread.start()
+
+    # 시작 후 첫 갱신이 끝날 때까지 최대 timeout 초 대기 (재시작 직후 첫 판단에도 새 기사가 들어가도록)
+    def wait_ready(self, timeout):
+        return self._ready.wait(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._ready.set()
+            if self.refresh_interval:
+                self._stop.wait(self.refresh_interval)
+            elif self.refresh_slots:
+                self._stop.wait(seconds_until_next(self.refresh_slots))
+            else:
+                self._stop.wait()  # 시작 시 1회만
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # 최근 기사 (max_age_hours 안에 처음 본 기사, 최신순)
+    def latest(self, limit=NEWS_PROMPT_LIMIT, max_age_hours=NEWS_MAX_AGE_HOURS, since_ms=0):
+        cutoff = max(since_ms, int((time.time() - max_age_hours * 3600) * 1000))
+        with self._lock:
+            rows = self.conn.execute("""SELECT title, date, first_seen_ms FROM news
+                                        WHERE first_seen_ms > ?
+                                        ORDER BY first_seen_ms DESC, id DESC
+                                        LIMIT ?""", (cutoff, limit)).fetchall()
+        return [{"title": title, "date": date, "first_seen_ms": seen} for title, date, seen in rows]
+
+    # 판단에 보낼 기사: 지난 판단(consumer) 이후 처음 본 기사는 new=True
+    # 기준 시점은 읽기만 하고, 판단이 성공한 뒤 commit_cursor() 를 불러야 옮겨짐
+    # (판단이 실패하면 같은 기사가 다음 판단에도 new 로 들어감)
+    def for_decision(self, consumer="decision", limit=NEWS_PROMPT_LIMIT, delta_only=NEWS_DELTA_ONLY):
+        now_ms = int(time.time() * 1000)
+        with self._lock:
+            row = self.conn.execute("SELECT seen_ms FROM news_cursors WHERE consumer = ?", (consumer,)).fetchone()
+            self._pending[consumer] = now_ms
+        seen_ms = row[0] if row else 0
+        items = self.latest(limit, since_ms=seen_ms if delta_only else 0)
+        return [{"title": item["title"], "date": item["date"], "new": item["first_seen_ms"] > seen_ms}
+                for item in items]
+
+    # consumer 의 기준 시점을 옮김 (seen_ms 가 없으면 마지막 for_decision 호출 시점)
+    def commit_cursor(self, consumer="decision", seen_ms=None):
+        with self._lock, self.conn:
+            seen_ms = seen_ms or self._pending.pop(consumer, None)
+            if seen_ms is None:
+                return None
+            self.conn.execute("INSERT INTO news_cursors (consumer, seen_ms) VALUES (?, ?) "
+                              "ON CONFLICT(consumer) DO UPDATE SET seen_ms = MAX(seen_ms, excluded.seen_ms)",
+                              (consumer, seen_ms))
+        return seen_ms
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            self.conn.close()
+
+
+# 느린 뉴스 API 대역으로 중복 제거 / 새 기사 표시 / 판단 시 대기 시간 확인
+if __name__ == "__main__":
+    import tempfile
+
+    headlines = [
+        [("Bitcoin climbs above $70,000 as ETF inflows surge - Reuters", "https://www.reuters.com/markets/btc-70k?utm_source=google"),
+         ("Ether slips as traders rotate into Bitcoin - CoinDesk", "https://coindesk.com/markets/ether-slips/"),
+         ("Regulators weigh new rules for crypto exchanges", "https://example.com/regulation")],
+        [("BITCOIN CLIMBS ABOVE $70,000 AS ETF INFLOWS SURGE", "https://reuters.com/markets/btc-70k"),
+         ("Ether slips as traders rotate into Bitcoin | CoinDesk", "https://www.coindesk.com/markets/ether-slips?fbclid=abc"),
+         ("Miners sell reserves ahead of halving - Bloomberg", "https://bloomberg.com/miners-sell")],
+        [("Regulators weigh new rules for crypto exchanges - FT", "https://ft.com/regulators-crypto"),
+         ("Miners sell reserves ahead of halving", "https://www.bloomberg.com/miners-sell/?utm_medium=rss")],
+    ]
+    calls = iter(headlines)
+
+    def slow_fetch():
+        time.sleep(2.0)  # SerpAPI 응답 지연 흉내
+        return [{"title": title, "link": link, "date": "1 hour ago"} for title, link in next(calls)]
+
+    store = NewsStore(slow_fetch, path=os.path.join(tempfile.mkdtemp(), "news.db"), refresh_interval=3600)
+    for i in range(len(headlines)):
+        if i == 0:
+            started = time.perf_counter()
+            items = store.for_decision()
+            print(f"cycle {i}: served {len(items)} items in {(time.perf_counter() - started) * 1000:.2f}ms "
+                  f"(store empty, background refresh not started yet)")
+        store.refresh()
+        started = time.perf_counter()
+        items = store.for_decision()
+        store.commit_cursor()  # 판단 성공
+        print(f"cycle {i + 1}: served in {(time.perf_counter() - started) * 1000:.2f}ms "
+              f"instead of waiting ~2s for the API")
+        for item in items:
+            print(f"    {'NEW ' if item['new'] else '    '}{item['title']}")
+    print(f"stats: {store.stats}, stored {store.conn.execute('SELECT COUNT(*) FROM news').fetchone()[0]} unique")
+    store.close()
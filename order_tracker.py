@@ -0,0 +1,74 @@
+import time
+import requests
+from python_bithumb import BithumbAPIException
+
+# 더 이상 바뀌지 않는 주문 상태 (시장가 매수는 잔여 금액이 남으면 체결분과 함께 cancel 로 끝남)
+TERMINAL_STATES = ("done", "cancel")
+
+# 폴링 설정: 첫 대기(초), 최대 대기(초), 증가 배수, 전체 타임아웃(초)
+INITIAL_DELAY = 0.2
+MAX_DELAY = 3.0
+BACKOFF_FACTOR = 2.0
+DEFAULT_TIMEOUT = 30.0
+
+# 체결 정보를 기록하기 위해 trades 테이블에 추가하는 컬럼
+FILL_COLUMNS = {
+    "order_uuid": "TEXT",
+    "executed_qty": "REAL",
+    "avg_price": "REAL",
+    "fee": "REAL",
+    "latency": "REAL",        # 주문 접수부터 체결/취소 확인까지 걸린 시간 (초)
+}
+
+
+# 기존 trades 테이블에 체결 컬럼이 없으면 추가 (기존 행은 NULL 로 유지)
+def add_fill_columns(conn):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(trades)")}
+    for name, sql_type in FILL_COLUMNS.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE trades ADD COLUMN {name} {sql_type}")
+    conn.commit()
+
+
+# 주문 조회 결과에서 실제 체결 수량, 평균 체결가, 수수료를 계산
+def summarize_fill(order, elapsed, timed_out=False):
+    trades = order.get("trades") or []
+    qty = sum(float(t["volume"]) for t in trades)
+    funds = sum(float(t.get("funds") or float(t["price"]) * float(t["volume"])) for t in trades)
+    if not trades:
+        qty = float(order.get("executed_volume") or 0)
+    return {
+        "uuid": order.get("uuid"),
+        "state": order.get("state"),
+        "executed_qty": qty,
+        "avg_price": funds / qty if qty and funds else None,
+        "fee": float(order.get("paid_fee") or 0),
+        "elapsed": elapsed,
+        "timed_out": timed_out,
+    }
+
+
+# 주문 UUID 로 체결/취소될 때까지 지수 백오프로 상태를 조회하는 함수
+# 타임아웃이 지나면 마지막으로 조회한 상태를 timed_out=True 로 반환
+# on_state(state, elapsed): 조회한 주문 상태가 바뀔 때마다 호출 (이벤트 기록용)
+def wait_for_fill(bithumb, order_uuid, timeout=DEFAULT_TIMEOUT, on_state=None):
+    started = time.perf_counter()
+    delay = INITIAL_DELAY
+    order = {"uuid": order_uuid, "state": "unknown"}
+    last_state = None
+    while True:
+        try:
+            order = bithumb.get_order(order_uuid)
+            if on_state and order.get("state") != last_state:
+                last_state = order.get("state")
+                on_state(last_state, time.perf_counter() - started)
+            if order.get("state") in TERMINAL_STATES:
+                return summarize_fill(order, time.perf_counter() - started)
+        except (BithumbAPIException, requests.RequestException) as e:
+            print(f"Order status check failed ({order_uuid}): {e}")
+
+        elapsed = time.perf_counter() - started
+        if elapsed + delay > timeout:
+            return summarize_fill(order, elapsed, timed_out=True)
+        time.sleep(delay)
+        delay = min(delay * BACKOFF_FACTOR, MAX_DELAY)
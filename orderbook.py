@@ -0,0 +1,264 @@
+import os
+import time
+import threading
+import numpy as np
+import python_bithumb
+
+# 호가 스냅샷 버퍼 크기 (마켓별 스냅샷 수), 저장하는 호가 단계 수
+ORDERBOOK_CAPACITY = int(os.getenv("ORDERBOOK_CAPACITY", "4096"))
+ORDERBOOK_LEVELS = int(os.getenv("ORDERBOOK_LEVELS", "15"))
+# 백그라운드 수집 간격 (초, 기본 0: 수집하지 않고 주문 직전에만 조회)
+#   하루 몇 번 거래하지 않으면 주문 직전 조회 한 번이면 충분함 (10초 간격 수집은 하루 8,640회 요청)
+#   호가 이력이 필요해 켤 때는 ORDERBOOK_MAX_AGE 이하로 두어야 주문 직전에 다시 조회하지 않음
+ORDERBOOK_CAPTURE_INTERVAL = float(os.getenv("ORDERBOOK_CAPTURE_INTERVAL", "0"))
+# 이보다 오래된 스냅샷이면 주문 전에 새로 조회 (초)
+ORDERBOOK_MAX_AGE = float(os.getenv("ORDERBOOK_MAX_AGE", "5"))
+# 주문 전 확인: 예상 슬리피지 한도 (bps, 판단 시점 현재가 기준), 한도를 넘어 줄일 수도 없을 때 다시 확인할 횟수/간격
+MAX_SLIPPAGE_BPS = float(os.getenv("MAX_SLIPPAGE_BPS", "30"))
+SLIPPAGE_RETRIES = int(os.getenv("SLIPPAGE_RETRIES", "2"))
+SLIPPAGE_RETRY_DELAY = float(os.getenv("SLIPPAGE_RETRY_DELAY", "20"))
+
+MIN_ORDER_KRW = 5000
+
+# 스냅샷 배열의 필드 순서 (data[i, field, level])
+ASK_PRICE, ASK_SIZE, BID_PRICE, BID_SIZE = range(4)
+
+
+# 마켓 하나의 호가 스냅샷 링 버퍼 (numpy 배열 하나에 덮어쓰며 저장, 스냅샷마다 객체를 만들지 않음)
+#   data: (capacity, 4, levels) float64, timestamps: (capacity,) int64 epoch 밀리초
+class OrderbookBuffer:
+    def __init__(self, capacity=ORDERBOOK_CAPACITY, levels=ORDERBOOK_LEVELS):
+        self.capacity = capacity
+        self.levels = levels
+        self.data = np.zeros((capacity, 4, levels))
+        self.timestamps = np.zeros(capacity, dtype=np.int64)
+        self.head = 0    # 다음에 쓸 위치
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    # python_bithumb.get_orderbook 결과 하나 추가 (호가가 levels 보다 적으면 마지막 가격, 잔량 0 으로 채움)
+    def append(self, snapshot):
+        units = snapshot["orderbook_units"][:self.levels]
+        n = len(units)
+        if n == 0:
+            return
+        row = np.empty((4, n))
+        row[ASK_PRICE] = [u["ask_price"] for u in units]
+        row[ASK_SIZE] = [u["ask_size"] for u in units]
+        row[BID_PRICE] = [u["bid_price"] for u in units]
+        row[BID_SIZE] = [u["bid_size"] for u in units]
+        with self._lock:
+            slot = self.data[self.head]
+            slot[:, :n] = row
+            if n < self.levels:
+                slot[:, n:] = row[:, n - 1:n]
+                slot[[ASK_SIZE, BID_SIZE], n:] = 0.0
+            self.timestamps[self.head] = int(snapshot.get("timestamp") or time.time() * 1000)
+            self.head = (self.head + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+
+    # 가장 최근 스냅샷 (timestamp_ms, (4, levels) 배열 복사본), 없으면 None
+    def latest(self):
+        with self._lock:
+            if not self.count:
+                return None
+            i = (self.head - 1) % self.capacity
+            return int(self.timestamps[i]), self.data[i].copy()
+
+    # 최근 스냅샷들 (오래된 것부터, since_ms 이후만): (timestamps, (n, 4, levels) 배열)
+    def history(self, since_ms=0):
+        with self._lock:
+            order = (np.arange(self.count) + self.head - self.count) % self.capacity
+            timestamps, data = self.timestamps[order], self.data[order]
+        keep = timestamps >= since_ms
+        return timestamps[keep], data[keep]
+
+
+# 호가를 따라 체결한다고 할 때의 평균 체결가 (여러 주문 크기를 한 번에 계산)
+#   prices / sizes: 한쪽 호가 (최우선부터), amounts: 주문 크기 (스칼라 또는 배열)
+#   by="krw": amounts 는 KRW 금액 (시장가 매수), by="coin": 코인 수량 (시장가 매도 등)
+# 반환값: (평균 체결가 배열, 체결 가능 여부 배열 - 호가 잔량보다 크면 False 이고 평균가는 전체 호가 기준)
+def fill_prices(prices, sizes, amounts, by="krw"):
+    amounts = np.atleast_1d(np.asarray(amounts, dtype=float))
+    notional = prices * sizes
+    cum_qty = np.cumsum(sizes)
+    cum_notional = np.cumsum(notional)
+    cum = cum_notional if by == "krw" else cum_qty
+    level = np.minimum(np.searchsorted(cum, amounts), len(prices) - 1)
+    prev_qty = np.where(level > 0, cum_qty[level - 1], 0.0)
+    prev_notional = np.where(level > 0, cum_notional[level - 1], 0.0)
+    filled = amounts <= cum[-1]
+    amounts = np.minimum(amounts, cum[-1])
+    if by == "krw":
+        qty = prev_qty + (amounts - prev_notional) / prices[level]
+        avg = amounts / qty
+    else:
+        funds = prev_notional + (amounts - prev_qty) * prices[level]
+        avg = funds / amounts
+    return avg, filled
+
+
+# 슬리피지 (bps, 양수면 reference 보다 불리)
+def expected_slippage_bps(side, avg_price, reference):
+    sign = 1 if side == "buy" else -1
+    return sign * (avg_price - reference) / reference * 10_000
+
+
+# 예상 슬리피지가 max_bps 이하인 최대 주문 크기 (by 단위: 매수는 KRW, 매도는 코인 수량)
+#   호가 단계 경계마다 평균가를 구하고, 한도를 처음 넘는 단계 안에서는 선형 식으로 남은 수량을 풂
+def max_size_within(side, prices, sizes, reference, max_bps):
+    sign = 1 if side == "buy" else -1
+    limit = reference * (1 + sign * max_bps / 10_000)
+    cum_qty = np.cumsum(sizes)
+    cum_notional = np.cumsum(prices * sizes)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        boundary_avg = cum_notional / cum_qty
+    over = sign * (boundary_avg - limit) > 0
+    if not over.any():
+        return cum_notional[-1] if side == "buy" else cum_qty[-1]
+    k = int(np.argmax(over))
+    prev_qty = cum_qty[k - 1] if k else 0.0
+    prev_notional = cum_notional[k - 1] if k else 0.0
+    # (prev_notional + p*q) / (prev_qty + q) = limit 를 q 에 대해 풂
+    q = max(0.0, (limit * prev_qty - prev_notional) / (prices[k] - limit)) if prices[k] != limit else sizes[k]
+    q = min(q, sizes[k])
+    qty, notional = prev_qty + q, prev_notional + prices[k] * q
+    return notional if side == "buy" else qty
+
+
+# 주문 전 유동성 확인
+#   book: (4, levels) 스냅샷 배열, amount: 매수는 KRW, 매도는 코인 수량, reference: 판단 시점 현재가
+# 반환값: {"action": "ok" | "reduce" | "delay", "amount": 실행할 크기, "expected_bps", "allowed_bps", ...}
+#   ok: 예상 슬리피지가 한도 안, reduce: 한도 안에 드는 크기로 줄임, delay: 최소 주문 금액도 한도를 넘음
+def liquidity_check(side, amount, book, reference, max_bps=MAX_SLIPPAGE_BPS):
+    prices, sizes = (book[ASK_PRICE], book[ASK_SIZE]) if side == "buy" else (book[BID_PRICE], book[BID_SIZE])
+    by = "krw" if side == "buy" else "coin"
+    avg, filled = fill_prices(prices, sizes, amount, by=by)
+    expected = float(expected_slippage_bps(side, avg[0], reference))
+    result = {"action": "ok", "amount": amount, "expected_bps": expected, "allowed_bps": max_bps,
+              "expected_price": float(avg[0]), "depth_exhausted": not bool(filled[0])}
+    if expected <= max_bps and filled[0]:
+        return result
+    allowed = float(max_size_within(side, prices, sizes, reference, max_bps))
+    allowed_krw = allowed if side == "buy" else allowed * reference
+    if allowed_krw < MIN_ORDER_KRW:
+        result.update(action="delay", amount=0.0)
+        return result
+    avg, _ = fill_prices(prices, sizes, allowed, by=by)
+    result.update(action="reduce", amount=allowed,
+                  reduced_bps=float(expected_slippage_bps(side, avg[0], reference)))
+    return result
+
+
+# 여러 마켓 호가를 주기적으로 한 번의 요청으로 수집해 마켓별 버퍼에 저장
+#   fetch: 마켓 목록을 받아 python_bithumb.get_orderbook 형식 (하나면 dict, 여러 개면 list) 을 반환하는 함수
+class OrderbookRecorder:
+    def __init__(self, markets, interval=ORDERBOOK_CAPTURE_INTERVAL, capacity=ORDERBOOK_CAPACITY,
+                 levels=ORDERBOOK_LEVELS, fetch=python_bithumb.get_orderbook):
+        self.markets = list(markets)
+        self.interval = interval
+        self.capacity = capacity
+        self.levels = levels
+        self.fetch = fetch
+        self.buffers = {market: OrderbookBuffer(capacity, levels) for market in self.markets}
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # 지금 한 번 수집 (markets 를 주면 그 마켓만)
+    def capture(self, markets=None):
+        markets = list(markets or self.markets)
+        snapshots = self.fetch(markets)
+        if isinstance(snapshots, dict):
+            snapshots = [snapshots]
+        for snapshot in snapshots or []:
+            buffer = self.buffers.get(snapshot["market"])
+            if buffer is not None:
+                buffer.append(snapshot)
+        return snapshots
+
+    # max_age 초 안의 최근 스냅샷, 없으면 새로 수집 (반환값: (4, levels) 배열 또는 None)
+    def book(self, market, max_age=ORDERBOOK_MAX_AGE):
+        if market not in self.buffers:
+            self.buffers[market] = OrderbookBuffer(self.capacity, self.levels)
+        latest = self.buffers[market].latest()
+        if latest is None or time.time() * 1000 - latest[0] > max_age * 1000:
+            self.capture([market])
+            latest = self.buffers[market].latest()
+        return latest[1] if latest else None
+
+    def start(self):
+        with self._lock:
+            if not self.interval or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="orderbook-capture", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.capture()
+            except Exception as e:
+                self.errors += 1
+                print(f"호가 수집 실패: {e}")
+            self._stop.wait(self.interval)
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+# 모의 호가로 버퍼 수집 비용, 벡터화 추정 vs 호가 한 단계씩 계산, 주문 전 확인 결과 확인
+if __name__ == "__main__":
+    from sim_exchange import SimulatedExchange
+
+    sim = SimulatedExchange(depth=0.01, levels=ORDERBOOK_LEVELS, seed=24)
+    buffer = OrderbookBuffer(capacity=1024)
+    snapshots = [sim.get_orderbook() for _ in range(5000)]
+    started = time.perf_counter()
+    for snapshot in snapshots:
+        buffer.append(snapshot)
+    append_us = (time.perf_counter() - started) / len(snapshots) * 1e6
+    print(f"append: {append_us:.1f}us/snapshot, buffer {buffer.data.nbytes / 1024:.0f}KiB "
+          f"for {buffer.capacity} snapshots x {buffer.levels} levels")
+
+    _, book = buffer.latest()
+    prices, sizes = book[ASK_PRICE], book[ASK_SIZE]
+    amounts = np.linspace(10_000, 60_000_000, 10_000)
+
+    # 비교용: 호가를 한 단계씩 따라가는 순수 파이썬 계산
+    def walk(amount):
+        spent = qty = 0.0
+        for price, size in zip(prices, sizes):
+            take = min(size, (amount - spent) / price)
+            spent += take * price
+            qty += take
+            if spent >= amount - 1e-9:
+                break
+        return spent / qty
+
+    started = time.perf_counter()
+    looped = [walk(a) for a in amounts]
+    loop_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    vectorized, filled = fill_prices(prices, sizes, amounts)
+    vector_ms = (time.perf_counter() - started) * 1000
+    ok = filled.sum()
+    print(f"{len(amounts):,} sizes: loop {loop_ms:.1f}ms, vectorized {vector_ms:.2f}ms "
+          f"(max diff {np.max(np.abs(np.array(looped)[filled] - vectorized[filled])):.2e} KRW, {ok} within depth)")
+
+    reference = (book[ASK_PRICE][0] + book[BID_PRICE][0]) / 2
+    # BTC 호가 단위(1000원)는 약 0.1bps 이므로 한도도 작게
+    for amount, max_bps in ((1_000_000, 0.5), (20_000_000, 0.5), (80_000_000, 2.0), (1_000_000, 0.01)):
+        check = liquidity_check("buy", amount, book, reference, max_bps=max_bps)
+        print(f"buy {amount:>11,.0f} KRW -> {check['action']:6s} amount {check['amount']:>13,.0f} "
+              f"expected {check['expected_bps']:.2f}bps (limit {max_bps}bps"
+              f"{', book exhausted' if check['depth_exhausted'] else ''})")
+    check = liquidity_check("sell", 0.5, book, reference, max_bps=0.5)
+    print(f"sell 0.5 BTC -> {check['action']} {check['amount']:.4f} BTC, expected {check['expected_bps']:.2f}bps")
@@ -0,0 +1,72 @@
+import sys
+import os
+import time
+import pandas as pd
+import streamlit as st
+import plotly.graph_objects as go
+
+# 최상위 모듈(tracing, db_connections) 을 불러오기 위해 저장소 루트를 경로에 추가
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_connections import snapshot
+from tracing import load_spans, stage_summary, stage_timeseries, QUANTILES
+
+st.set_page_config(page_title="Cycle Latency", page_icon="⏱️", layout="wide")
+
+# 조회 기간: (표시 이름, 시간, 차트 집계 간격)
+WINDOWS = {"최근 1시간": (1, "5min"), "최근 6시간": (6, "15min"), "최근 24시간": (24, "1h"),
+           "최근 7일": (24 * 7, "6h")}
+
+st.title("사이클 단계별 지연 시간")
+
+window = st.selectbox("조회 기간:", list(WINDOWS), index=2)
+hours, freq = WINDOWS[window]
+
+# spans 테이블에서 기간 안의 구간 조회 (마이그레이션 전 DB 면 빈 결과)
+try:
+    with snapshot() as conn:
+        spans = load_spans(conn, since_us=int((time.time() - hours * 3600) * 1_000_000))
+except pd.errors.DatabaseError:
+    spans = None
+
+if spans is None:
+    st.info("spans 테이블이 없습니다. 트레이더를 한 번 실행하면 마이그레이션 후 기록이 시작됩니다.")
+elif spans.empty:
+    st.info(f"{window} 동안 기록된 구간이 없습니다.")
+else:
+    cycles = spans[spans['name'] == 'cycle']
+    st.caption(f"구간 {len(spans):,}개 · 사이클 {len(cycles):,}회 · 오류 {int((spans['status'] == 'error').sum())}건")
+
+    # 단계별 분위수 표 (밀리초)
+    st.subheader("단계별 요약")
+    summary = stage_summary(spans)
+    table = (summary.drop(columns=['count']) * 1000).round(1)
+    table.columns = [f"{column} (ms)" for column in table.columns]
+    table.insert(0, 'count', summary['count'].astype(int))
+    st.dataframe(table, use_container_width=True)
+
+    # 선택한 단계의 시간대별 p50 / p95 / p99
+    st.subheader("시간대별 분위수")
+    default = [name for name in ['cycle', 'llm', 'llm.batch'] if name in summary.index] or list(summary.index[:1])
+    stages = st.multiselect("단계 선택:", list(summary.index), default=default)
+    series = stage_timeseries(spans[spans['name'].isin(stages)], freq=freq)
+    for stage in stages:
+        stage_series = series[series['name'] == stage]
+        fig = go.Figure()
+        for q in QUANTILES:
+            column = f"p{int(q * 100)}"
+            fig.add_trace(go.Scatter(x=stage_series['time'], y=stage_series[column], mode='lines+markers',
+                                     name=column, customdata=stage_series['count'],
+                                     hovertemplate='%{x}<br>%{y:,.1f}ms (n=%{customdata})<br>'))
+        fig.update_layout(
+            title=f'{stage} 지연 시간 ({freq} 간격)',
+            xaxis_title='시간',
+            yaxis_title='지연 시간 (ms)',
+            hovermode='x unified',
+            legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+            height=350,
+            margin=dict(l=40, r=40, t=60, b=40)
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    st.caption("최근 사이클 전체 구간은 `python tracing.py chrome trace.json` 으로 내보내 "
+               "chrome://tracing 또는 ui.perfetto.dev 에서 볼 수 있습니다.")
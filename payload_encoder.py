@@ -0,0 +1,165 @@
+import json
+import math
+import numpy as np
+from indicators import indicator_summary
+
+# tiktoken 이 있으면 실제 토큰 수를, 없으면 글자 수 기반 추정치를 사용
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")  # gpt-4o 토크나이저
+except Exception:
+    _ENCODING = None
+
+LAYOUTS = ("columnar", "csv", "summary")
+
+# 캔들 컬럼 약어 (프롬프트에서 설명)
+SHORT_NAMES = {"open": "o", "high": "h", "low": "l", "close": "c", "volume": "v"}
+
+
+# 텍스트의 토큰 수를 세는 함수
+def count_tokens(text):
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+# 가격 크기에 맞는 소수점 자리수 (예: 1억대 원화 가격은 정수, 1원 미만 코인은 소수 4자리)
+def price_decimals(values):
+    values = np.abs(np.asarray(values, dtype=float))
+    values = values[np.isfinite(values) & (values > 0)]
+    if values.size == 0:
+        return 0
+    magnitude = math.floor(math.log10(np.median(values)))
+    return int(min(8, max(0, 4 - magnitude)))
+
+
+# 거래량은 유효숫자 4자리 정도면 충분
+def volume_decimals(values):
+    return max(0, price_decimals(values) - 1)
+
+
+# 소수점 자리수에 맞춰 반올림한 리스트 (0자리면 정수로 바꿔 '.0' 제거)
+def _rounded(values, decimals):
+    rounded = np.round(np.asarray(values, dtype=float), decimals)
+    if decimals == 0:
+        return [int(v) for v in rounded]
+    return rounded.tolist()
+
+
+# 봉 시작 시각 포맷: 일봉은 날짜만, 그 외에는 월-일 시
+def _time_labels(index):
+    if len(index) and (index.hour == 0).all() and (index.minute == 0).all():
+        return list(index.strftime("%Y-%m-%d"))
+    return list(index.strftime("%m-%d %H:%M"))
+
+
+# 캔들 DataFrame 을 열 단위 배열로 변환 (오래된 캔들부터)
+def _frame_columns(df):
+    cols = [col for col in SHORT_NAMES if col in df.columns]
+    p_dec = price_decimals(df["close"]) if "close" in df.columns else 0
+    columns = {"t": _time_labels(df.index)}
+    for col in cols:
+        decimals = volume_decimals(df[col]) if col == "volume" else p_dec
+        columns[SHORT_NAMES[col]] = _rounded(df[col], decimals)
+    return columns
+
+
+# 한 타임프레임을 지정한 레이아웃으로 인코딩하는 함수
+#   columnar: {"cols": [...], "rows": [[...], ...]}
+#   csv:      "t,o,h,l,c,v\n..." 형태의 문자열
+def encode_frame(df, layout="columnar"):
+    if df is None or df.empty:
+        return None
+    columns = _frame_columns(df)
+    names = list(columns)
+    rows = list(zip(*columns.values()))
+    if layout == "csv":
+        return "\n".join([",".join(names)] + [",".join(str(v) for v in row) for row in rows])
+    return {"cols": names, "rows": [list(row) for row in rows]}
+
+
+# 캔들 원본 대신 보낼 수 있는 간단한 요약 (기술 지표 포함)
+#   indicators: 미리 계산한 지표 요약 (없으면 이 프레임으로 계산)
+def summarize_frame(df, indicators=None):
+    if df is None or df.empty:
+        return None
+    close = df["close"].to_numpy(dtype=float)
+    decimals = price_decimals(close)
+    summary = {
+        "candles": int(len(df)),
+        "from": _time_labels(df.index[:1])[0],
+        "to": _time_labels(df.index[-1:])[0],
+        "last_close": _rounded([close[-1]], decimals)[0],
+        "change_pct": round(float((close[-1] / close[0] - 1) * 100), 2),
+        "high": _rounded([df["high"].max()], decimals)[0],
+        "low": _rounded([df["low"].min()], decimals)[0],
+        "sma": _rounded([close.mean()], decimals)[0],
+    }
+    if "volume" in df.columns and len(df) > 1:
+        volume = df["volume"].to_numpy(dtype=float)
+        summary["last_volume_vs_avg"] = round(float(volume[-1] / max(volume[:-1].mean(), 1e-12)), 2)
+    summary["indicators"] = indicators if indicators is not None else indicator_summary(df, decimals)
+    return summary
+
+
+# 기존 방식 (캔들마다 컬럼명이 반복되는 records JSON) 의 토큰 수
+def legacy_tokens(payload, frames):
+    legacy = dict(payload)
+    for name, df in frames.items():
+        legacy[name] = json.loads(df.to_json(orient="records")) if df is not None else None
+    return count_tokens(json.dumps(legacy))
+
+
+def _build(payload, frames, layout, include_summary, indicators):
+    content = dict(payload)
+    for name, df in frames.items():
+        if layout == "summary":
+            content[name] = summarize_frame(df, indicators.get(name))
+            continue
+        content[name] = encode_frame(df, layout)
+        if include_summary:
+            content[f"{name}_summary"] = summarize_frame(df, indicators.get(name))
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"))
+
+
+# data_payload 를 압축 인코딩하는 함수
+#   payload: 차트 외 필드 (뉴스, 잔고, 최근 거래 등)
+#   frames: {"short_term": df, ...} 타임프레임별 캔들
+#   token_budget: 넘으면 가장 긴 타임프레임의 가장 오래된 캔들부터 잘라냄
+#   indicators: {"short_term": 지표 요약, ...} 요약에 넣을 미리 계산한 지표 (indicators.IndicatorEngine)
+# 반환값: (프롬프트 문자열, {"tokens_before", "tokens_after", "trimmed", "within_budget"})
+def encode_payload(payload, frames, layout="columnar", token_budget=None, include_summary=False, indicators=None):
+    if layout not in LAYOUTS:
+        raise ValueError(f"unknown payload layout: {layout} (expected one of {', '.join(LAYOUTS)})")
+    tokens_before = legacy_tokens(payload, frames)
+    frames = dict(frames)
+    trimmed = {name: 0 for name in frames}
+    indicators = indicators or {}
+
+    content = _build(payload, frames, layout, include_summary, indicators)
+    tokens = count_tokens(content)
+    while token_budget and tokens > token_budget and layout != "summary":
+        lengths = {name: len(df) for name, df in frames.items() if df is not None and len(df) > 1}
+        if not lengths:
+            break
+        # 남은 캔들 한 개당 평균 토큰으로 한 번에 잘라낼 개수를 추정
+        total_rows = sum(lengths.values())
+        drop = max(1, math.ceil((tokens - token_budget) / max(tokens / total_rows, 1)))
+        for _ in range(drop):
+            name = max(lengths, key=lengths.get)
+            if lengths[name] <= 1:
+                break
+            lengths[name] -= 1
+            trimmed[name] += 1
+        for name, length in lengths.items():
+            frames[name] = frames[name].tail(length)
+        content = _build(payload, frames, layout, include_summary, indicators)
+        tokens = count_tokens(content)
+
+    report = {
+        "tokens_before": tokens_before,
+        "tokens_after": tokens,
+        "trimmed": {name: n for name, n in trimmed.items() if n},
+        "within_budget": not token_budget or tokens <= token_budget,
+    }
+    return content, report
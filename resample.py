@@ -0,0 +1,149 @@
+import os
+import json
+import pandas as pd
+
+# 상위 봉의 시작 시각 (KST 기준 시). 빗썸 일봉/4시간봉은 KST 자정 기준으로 끊김
+DAY_START_HOUR = int(os.getenv("DAY_START_HOUR", "0"))
+
+# 거래소 1시간봉/4시간봉/일봉 응답을 저장해 둔 파일 (python resample.py 로 확인, capture 로 새로 저장)
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "fixtures", "resample_KRW-BTC.json")
+
+# 컬럼별 집계 방식
+AGGREGATIONS = {
+    "open": "first",
+    "high": "max",
+    "low": "min",
+    "close": "last",
+    "volume": "sum",
+    "value": "sum",
+}
+
+
+# 1시간봉 DataFrame 을 hours 시간 단위 봉으로 묶는 함수
+#   - 인덱스는 KST 시각 (python_bithumb.get_ohlcv 와 동일)
+#   - 구간 경계는 KST 자정 + DAY_START_HOUR 에 맞춤
+#   - 1시간봉이 모자란 맨 앞 구간은 버리고, 진행 중인 마지막 구간은 거래소처럼 남겨 둠
+def resample_ohlcv(df_1h, hours, start_hour=DAY_START_HOUR):
+    if df_1h is None or df_1h.empty:
+        return None
+    agg = {col: how for col, how in AGGREGATIONS.items() if col in df_1h.columns}
+    bins = df_1h.resample(f"{hours}h", origin="start_day", offset=pd.Timedelta(hours=start_hour),
+                          label="left", closed="left")
+    out = bins.agg(agg)
+    counts = bins["close"].count()
+
+    # 거래가 없던 빈 구간 제거
+    out = out[counts > 0]
+    counts = counts[counts > 0]
+
+    # 1시간봉 시작 전부터 걸쳐 있는 맨 앞 구간 제거
+    if len(out) > 1 and counts.iloc[0] < hours:
+        out = out.iloc[1:]
+    return out
+
+
+# 1시간봉 하나로 단기(1h), 중기(4h), 장기(일봉) 윈도우를 모두 만드는 함수
+def derive_timeframes(df_1h, short_count, mid_count, long_count):
+    if df_1h is None or df_1h.empty:
+        return None, None, None
+    short_term = df_1h.tail(short_count)
+    mid_term = resample_ohlcv(df_1h, 4)
+    long_term = resample_ohlcv(df_1h, 24)
+    return (short_term,
+            mid_term.tail(mid_count) if mid_term is not None else None,
+            long_term.tail(long_count) if long_term is not None else None)
+
+
+# derive_timeframes 에 필요한 1시간봉 개수 (맨 앞 불완전 구간 여유분 포함)
+def base_candles_needed(short_count, mid_count, long_count):
+    return max(short_count, (mid_count + 1) * 4, (long_count + 1) * 24)
+
+
+# 만든 봉과 거래소 봉의 컬럼별 최대 상대 오차를 계산하는 함수
+# 진행 중인 마지막 봉은 조회 시점 차이로 값이 다를 수 있으므로 제외
+def compare_frames(derived, exchange):
+    common = derived.index.intersection(exchange.index)[:-1]
+    cols = [col for col in ("open", "high", "low", "close", "volume")
+            if col in derived.columns and col in exchange.columns]
+    left = derived.loc[common, cols]
+    right = exchange.loc[common, cols]
+    return ((left - right).abs() / right.abs().clip(lower=1e-12)).max(), len(common)
+
+
+# 빗썸 캔들 응답 (dict 목록) 을 python_bithumb.get_ohlcv 와 같은 DataFrame 으로 변환
+def frame_from_response(rows):
+    df = pd.DataFrame(rows)
+    df.index = pd.to_datetime(df.pop("candle_date_time_kst"))
+    df = df.sort_index().rename(columns={"opening_price": "open", "high_price": "high", "low_price": "low",
+                                         "trade_price": "close", "candle_acc_trade_volume": "volume",
+                                         "candle_acc_trade_price": "value"})
+    return df[[col for col in AGGREGATIONS if col in df.columns]]
+
+
+# 저장해 둔 거래소 응답으로 derive_timeframes 결과 확인 (틀리면 AssertionError)
+#   봉 시작 시각이 거래소 봉과 모두 같아야 하고 (KST 자정 + DAY_START_HOUR 경계),
+#   진행 중인 마지막 봉을 뺀 OHLC 는 정확히, 거래량은 소수점 반올림 오차 안에서 같아야 함
+def check_fixture(path=FIXTURE_PATH):
+    with open(path, encoding="utf-8") as f:
+        fixture = json.load(f)
+    base = frame_from_response(fixture["minute60"])
+    exchange_frames = {"4h": frame_from_response(fixture["minute240"]), "day": frame_from_response(fixture["day"])}
+    _, mid, long = derive_timeframes(base, 24, len(exchange_frames["4h"]), len(exchange_frames["day"]))
+    results = {}
+    for name, derived in (("4h", mid), ("day", long)):
+        exchange = exchange_frames[name]
+        assert derived.index.equals(exchange.index), \
+            f"{name} bins differ: {list(derived.index[:3])} vs exchange {list(exchange.index[:3])}"
+        errors, compared = compare_frames(derived, exchange)
+        assert compared == len(exchange) - 1, f"{name}: compared {compared} of {len(exchange) - 1} closed candles"
+        assert (errors[["open", "high", "low", "close"]] == 0).all(), f"{name} OHLC mismatch:\n{errors}"
+        assert errors["volume"] < 1e-6, f"{name} volume mismatch: {errors['volume']}"
+        results[name] = compared
+    return results
+
+
+# 거래소 응답 저장 (한 줄에 캔들 하나)
+def save_fixture(fixture, path=FIXTURE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{\n")
+        for i, (key, value) in enumerate(fixture.items()):
+            f.write(f"{json.dumps(key)}: ")
+            if isinstance(value, list):
+                f.write("[\n" + ",\n".join(json.dumps(row, ensure_ascii=False) for row in value) + "\n]")
+            else:
+                f.write(json.dumps(value, ensure_ascii=False))
+            f.write(",\n" if i < len(fixture) - 1 else "\n")
+        f.write("}\n")
+
+
+# 실행: python resample.py (저장된 응답으로 확인) | capture (실제 거래소 응답을 새로 저장한 뒤 확인)
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "capture":
+        import time
+        import requests
+
+        # python_bithumb.get_ohlcv 와 같은 엔드포인트의 원본 응답 (200개씩 to 로 이어 받기)
+        def fetch(endpoint, count):
+            rows, to = [], None
+            while len(rows) < count:
+                params = {"market": "KRW-BTC", "count": min(200, count - len(rows))}
+                if to:
+                    params["to"] = to
+                data = requests.get(f"https://api.bithumb.com/v1/candles/{endpoint}", params=params, timeout=10).json()
+                if not data:
+                    break
+                rows.extend(data)
+                to = data[-1]["candle_date_time_kst"]
+            return rows
+
+        started = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        save_fixture({"source": f"api.bithumb.com, captured {started}", "market": "KRW-BTC",
+                      "minute60": fetch("minutes/60", base_candles_needed(24, 30, 10)),
+                      "minute240": fetch("minutes/240", 30), "day": fetch("days", 10)})
+        print(f"saved {FIXTURE_PATH}")
+    results = check_fixture()
+    print(f"resample matches the exchange candles in {os.path.relpath(FIXTURE_PATH)}: "
+          + ", ".join(f"{name} {count} closed candles" for name, count in results.items()))
@@ -0,0 +1,218 @@
+import os
+import math
+import time
+import threading
+from collections import deque
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# 주문 전 위험 한도 (0 이면 해당 항목 끔, 기본은 모두 꺼짐 - 기존처럼 AI 판단 비율 그대로 주문)
+#   예: RISK_MAX_POSITION_PCT=50 RISK_DAILY_LOSS_PCT=5 RISK_MAX_ORDERS_PER_HOUR=10 RISK_MAX_DRAWDOWN_PCT=20 RISK_VOL_MULTIPLE=3
+#   마켓별 최대 보유 비중 (포트폴리오 대비 %) / 최대 보유 금액 (KRW)
+RISK_MAX_POSITION_PCT = float(os.getenv("RISK_MAX_POSITION_PCT", "0"))
+RISK_MAX_POSITION_KRW = float(os.getenv("RISK_MAX_POSITION_KRW", "0"))
+#   오늘 첫 평가액 대비 손실 한도 (%), 넘으면 그날은 매수 중단
+RISK_DAILY_LOSS_PCT = float(os.getenv("RISK_DAILY_LOSS_PCT", "0"))
+#   최근 1시간 주문 수 한도
+RISK_MAX_ORDERS_PER_HOUR = int(os.getenv("RISK_MAX_ORDERS_PER_HOUR", "0"))
+#   이번 실행 중 최고 평가액 대비 하락 한도 (%), 넘으면 매수 중단
+#   (지난 거래 기록의 최고 평가액은 입출금이 섞여 있을 수 있어 쓰지 않음)
+RISK_MAX_DRAWDOWN_PCT = float(os.getenv("RISK_MAX_DRAWDOWN_PCT", "0"))
+#   변동성 차단: 최근 RISK_VOL_SHORT 개 1시간봉 수익률 표준편차가 전체 기간의 RISK_VOL_MULTIPLE 배를 넘으면
+#   그 마켓은 매수 중단 (급변 중에도 포지션은 줄일 수 있도록 매도는 RISK_KILL_SELLS=1 일 때만 중단)
+RISK_VOL_MULTIPLE = float(os.getenv("RISK_VOL_MULTIPLE", "0"))
+RISK_VOL_SHORT = int(os.getenv("RISK_VOL_SHORT", "6"))
+RISK_KILL_SELLS = os.getenv("RISK_KILL_SELLS", "0") == "1"
+
+MIN_ORDER_KRW = 5000
+
+
+# 거래 기록에서 행마다 전체 평가액 계산 (다른 마켓 코인은 그 마켓의 직전 기록 평가액을 이어 씀)
+# btc_balance / btc_price 는 각 행 마켓의 코인 잔고 / 현재가 (마이그레이션 전 DB 는 모두 KRW-BTC)
+def equity_history(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(trades)")}
+    market = "market" if "market" in columns else "'KRW-BTC' AS market"
+    df = pd.read_sql_query(f"SELECT id, timestamp, {market}, krw_balance, btc_balance, btc_price FROM trades "
+                           "WHERE krw_balance IS NOT NULL ORDER BY id", conn)
+    if df.empty:
+        return pd.Series(dtype=float)
+    coin_value = (df["btc_balance"].fillna(0) * df["btc_price"].fillna(0))
+    wide = pd.DataFrame({"id": df["id"], "market": df["market"], "value": coin_value})
+    wide = wide.pivot(index="id", columns="market", values="value").ffill().fillna(0.0)
+    equity = df["krw_balance"].to_numpy() + wide.sum(axis=1).to_numpy()
+    return pd.Series(equity, index=pd.to_datetime(df["timestamp"], format="ISO8601"))
+
+
+# 1시간봉 종가 로그수익률의 (최근 short 개 표준편차, 전체 표준편차)
+def volatility(candles, short=RISK_VOL_SHORT):
+    if candles is None or len(candles) < short + 2:
+        return None, None
+    returns = np.diff(np.log(candles["close"].to_numpy(dtype=float)))
+    return float(returns[-short:].std()), float(returns.std())
+
+
+# 주문 전 위험 확인
+#   거래 기록/잔고/캔들은 사이클마다 (주문 경로 밖에서) 미리 반영해 두고,
+#   check() 는 메모리의 숫자만 비교하므로 주문 경로에 지연을 더하지 않음
+class RiskEngine:
+    def __init__(self, max_position_pct=RISK_MAX_POSITION_PCT, max_position_krw=RISK_MAX_POSITION_KRW,
+                 daily_loss_pct=RISK_DAILY_LOSS_PCT, max_orders_per_hour=RISK_MAX_ORDERS_PER_HOUR,
+                 max_drawdown_pct=RISK_MAX_DRAWDOWN_PCT, vol_multiple=RISK_VOL_MULTIPLE, kill_sells=RISK_KILL_SELLS):
+        self.max_position_pct = max_position_pct
+        self.max_position_krw = max_position_krw
+        self.daily_loss_pct = daily_loss_pct
+        self.max_orders_per_hour = max_orders_per_hour
+        self.max_drawdown_pct = max_drawdown_pct
+        self.vol_multiple = vol_multiple
+        self.kill_sells = kill_sells
+        self.loaded = False
+        self.equity = None          # 현재 평가액 (KRW)
+        self.peak = None            # 이번 실행 중 최고 평가액
+        self.day = None             # day_start 의 날짜
+        self.day_start = None       # 오늘 첫 평가액
+        self.orders = deque()       # 최근 1시간 주문 시각 (epoch 초)
+        self.killed = {}            # 마켓 -> 변동성 차단 사유
+        self._lock = threading.Lock()
+
+    # 거래 기록에서 오늘 첫 평가액을 읽음 (시작 시 한 번, 오늘 재시작해도 일일 손실 기준이 유지되도록)
+    # 최고 평가액은 이번 실행의 update_equity 로만 정함
+    def load(self, conn):
+        history = equity_history(conn)
+        with self._lock:
+            today = history[history.index.date == datetime.now().date()] if len(history) else history
+            if len(today) and self.day is None:
+                self.day, self.day_start = datetime.now().date(), float(today.iloc[0])
+            self.loaded = True
+        return history
+
+    # 현재 평가액 반영 (최고 평가액 / 날짜가 바뀌면 오늘 첫 평가액 갱신)
+    def update_equity(self, value, now=None):
+        today = datetime.fromtimestamp(now).date() if now else datetime.now().date()
+        with self._lock:
+            self.equity = value
+            self.peak = value if self.peak is None else max(self.peak, value)
+            if self.day != today:
+                self.day, self.day_start = today, value
+
+    # 마켓 변동성 반영 (사이클마다 1시간봉으로)
+    def update_volatility(self, market, candles):
+        short, long = volatility(candles)
+        with self._lock:
+            if self.vol_multiple and short is not None and long and short > self.vol_multiple * long:
+                self.killed[market] = (f"volatility kill switch: recent {short:.4f} > "
+                                       f"{self.vol_multiple:g} x {long:.4f}")
+            else:
+                self.killed.pop(market, None)
+
+    def drawdown(self):
+        if not self.peak or self.equity is None:
+            return 0.0
+        return (self.peak - self.equity) / self.peak
+
+    def daily_loss(self):
+        if not self.day_start or self.equity is None:
+            return 0.0
+        return (self.day_start - self.equity) / self.day_start
+
+    # 주문 하나 확인 (잠금 없이 메모리 값만 비교, 수 마이크로초)
+    #   amount: 매수는 KRW 금액, 매도는 코인 수량 / position: 지금 보유한 이 마켓 코인 평가액 (KRW)
+    #   orders: 이 주문으로 거래소에 넣을 주문 수 (twap/vwap 은 분할 수)
+    # 반환값: (허용 여부, 주문 크기 - 보유 한도에 맞게 줄어들 수 있음, 거절/축소 사유 또는 None)
+    # 매도는 위험을 줄이므로 주문 수 한도만 적용 (변동성 차단은 kill_sells 일 때만)
+    def check(self, market, side, amount, position=0.0, now=None, orders=1):
+        now = now or time.time()
+        killed = self.killed.get(market)
+        if killed and (side == "buy" or self.kill_sells):
+            return False, 0.0, killed
+        recent = self.orders
+        while recent and recent[0] <= now - 3600:
+            recent.popleft()
+        if self.max_orders_per_hour and len(recent) + orders > self.max_orders_per_hour:
+            return False, 0.0, f"order rate limit: {len(recent)} orders in the last hour (+{orders})"
+        if side != "buy":
+            return True, amount, None
+        if self.max_drawdown_pct and self.drawdown() * 100 >= self.max_drawdown_pct:
+            return False, 0.0, f"max drawdown: {self.drawdown():.1%} below peak {self.peak:,.0f} KRW"
+        if self.daily_loss_pct and self.daily_loss() * 100 >= self.daily_loss_pct:
+            return False, 0.0, f"daily loss limit: {self.daily_loss():.1%} since {self.day_start:,.0f} KRW"
+        limit = math.inf
+        if self.max_position_pct and self.equity:
+            limit = self.equity * self.max_position_pct / 100
+        if self.max_position_krw:
+            limit = min(limit, self.max_position_krw)
+        if position + amount > limit:
+            allowed = max(0.0, limit - position)
+            reason = f"max position: {position:,.0f} + {amount:,.0f} KRW > {limit:,.0f} KRW"
+            if allowed < MIN_ORDER_KRW:
+                return False, 0.0, reason
+            return True, allowed, reason
+        return True, amount, None
+
+    # 실제로 주문을 넣었을 때 호출 (시간당 주문 수, count: 거래소에 넣은 주문 수)
+    def record_order(self, now=None, count=1):
+        with self._lock:
+            self.orders.extend([now or time.time()] * count)
+
+    def state(self):
+        return {"equity": self.equity, "peak": self.peak, "drawdown": self.drawdown(),
+                "daily_loss": self.daily_loss(), "orders_last_hour": len(self.orders),
+                "killed": dict(self.killed)}
+
+
+# 합성 거래 기록으로 최고 평가액 계산과 check() 소요 시간 확인 (원본 DB 는 건드리지 않음)
+if __name__ == "__main__":
+    import sqlite3
+    import tempfile
+    from datetime import timedelta
+    import db_migrations
+
+    path = os.path.join(tempfile.mkdtemp(), "risk_bench.db")
+    conn = sqlite3.connect(path)
+    db_migrations.migrate(conn, log=None)
+    rng = np.random.default_rng(25)
+    start = datetime.now() - timedelta(minutes=20 * 2000)
+    rows, krw = [], 10_000_000.0
+    prices = {"KRW-BTC": 100_000_000.0, "KRW-ETH": 4_000_000.0}
+    for i in range(2000):
+        market = "KRW-BTC" if i % 2 == 0 else "KRW-ETH"
+        prices[market] *= math.exp(rng.normal(0, 0.01))
+        rows.append(((start + timedelta(minutes=20 * i)).isoformat(), market, "hold", 0, "",
+                     0.05 if market == "KRW-BTC" else 1.0, krw, prices[market]))
+    conn.executemany("INSERT INTO trades (timestamp, market, decision, percentage, reason, btc_balance, "
+                     "krw_balance, btc_price) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+
+    engine = RiskEngine(max_position_pct=50, daily_loss_pct=5, max_orders_per_hour=10, max_drawdown_pct=20,
+                        vol_multiple=3)
+    started = time.perf_counter()
+    history = engine.load(conn)
+    print(f"load: {len(history)} trades in {(time.perf_counter() - started) * 1000:.1f}ms, "
+          f"today's first value {engine.day_start:,.0f} KRW")
+    engine.update_equity(float(history.max()))
+    engine.update_equity(float(history.iloc[-1]))
+    print(f"peak {engine.peak:,.0f}, now {engine.equity:,.0f} KRW, drawdown {engine.drawdown():.1%}")
+
+    hours = pd.date_range(end=datetime.now(), periods=200, freq="h")
+    calm = pd.DataFrame({"close": 100_000_000 * np.exp(np.cumsum(rng.normal(0, 0.004, 200)))}, index=hours)
+    stormy = calm.copy()
+    stormy.iloc[-6:, 0] *= np.exp(np.cumsum(rng.normal(0, 0.04, 6)))
+    engine.update_volatility("KRW-BTC", calm)
+    engine.update_volatility("KRW-ETH", stormy)
+
+    n = 100_000
+    started = time.perf_counter()
+    for _ in range(n):
+        engine.check("KRW-BTC", "buy", 1_000_000, position=3_000_000)
+    print(f"check: {(time.perf_counter() - started) / n * 1e6:.2f}us per order")
+
+    cases = (("KRW-BTC", "buy", 1_000_000, 0), ("KRW-BTC", "buy", 9_000_000, 3_000_000),
+             ("KRW-ETH", "buy", 1_000_000, 0), ("KRW-ETH", "sell", 0.5, 4_000_000))
+    for market, side, amount, position in cases:
+        print(f"{market} {side} {amount:,}: {engine.check(market, side, amount, position=position)}")
+    for _ in range(engine.max_orders_per_hour):
+        engine.record_order()
+    print(f"after {engine.max_orders_per_hour} orders: {engine.check('KRW-BTC', 'buy', 1_000_000)}")
+    engine.orders.clear()
+    engine.update_equity(engine.day_start * 0.94)
+    print(f"after -6% today: {engine.check('KRW-BTC', 'buy', 1_000_000)}")
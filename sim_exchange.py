@@ -0,0 +1,228 @@
+import math
+import time
+import random
+import threading
+import itertools
+
+# 모의 호가/체결 거래소 (execution.py 의 주문 분할/지정가 전략을 실제 주문 없이 시험할 때 사용)
+#   Bithumb 클라이언트와 같은 메서드 (buy/sell_market_order, buy/sell_limit_order, get_order, cancel_order)
+#   와 python_bithumb.get_orderbook 형식의 get_orderbook 을 제공
+#   시세는 호출할 때마다 지난 시간만큼 랜덤 워크로 진행하고, 시장가 주문은 호가를 따라 체결되며
+#   체결한 만큼 가격이 밀렸다가 resilience 초 정도에 걸쳐 회복됨 (일시적 충격). 지정가 주문은 상대 호가가 넘어오거나 앞선 대기 물량이
+#   모두 체결된 뒤 들어오는 시장가 흐름으로 체결됨
+
+FEE_RATE = 0.0004  # 빗썸 원화 마켓 수수료 0.04%
+
+
+class SimulatedExchange:
+    #   price: 시작 중간가, tick: 호가 단위, depth: 최우선 호가 잔량 (코인), levels: 한쪽 호가 수
+    #   volatility: 1초당 가격 변동 (비율), step: 시뮬레이션 시간 간격 (초)
+    #   taker_rate: 1초당 최우선 호가에 들어오는 시장가 주문 수, taker_size: 평균 크기 (코인)
+    #   impact: 시장가 체결로 소진한 호가 수 1개당 중간가가 밀리는 틱 수, resilience: 회복 시간 상수 (초)
+    def __init__(self, market="KRW-BTC", price=100_000_000, tick=1000, depth=0.05, levels=15,
+                 volatility=0.0005, step=0.05, taker_rate=4.0, taker_size=0.02, impact=0.5, resilience=0.5,
+                 seed=None):
+        self.market = market
+        self.tick = tick
+        self.depth = depth
+        self.levels = levels
+        self.volatility = volatility
+        self.step = step
+        self.taker_rate = taker_rate
+        self.taker_size = taker_size
+        self.impact = impact
+        self.resilience = resilience
+        self.offset = 0.0  # 시장가 체결로 밀린 가격 (시간이 지나면 0 으로 회복)
+        self.rng = random.Random(seed)
+        self.mid = float(price)
+        self.orders = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._clock = time.monotonic()
+
+    # --- 호가 ---
+
+    def _touch(self):
+        bid = math.floor((self.mid + self.offset) / self.tick) * self.tick
+        return bid, bid + self.tick
+
+    def _level_size(self, i):
+        return self.depth * (1 + 0.4 * i)
+
+    def _book(self):
+        bid, ask = self._touch()
+        return [{"ask_price": ask + i * self.tick, "bid_price": bid - i * self.tick,
+                 "ask_size": self._level_size(i), "bid_size": self._level_size(i)} for i in range(self.levels)]
+
+    def get_orderbook(self, market=None):
+        with self._lock:
+            self._advance()
+            units = self._book()
+        return {"market": self.market, "timestamp": int(time.time() * 1000),
+                "total_ask_size": sum(u["ask_size"] for u in units),
+                "total_bid_size": sum(u["bid_size"] for u in units), "orderbook_units": units}
+
+    # 지난 시간만큼 시세 진행 (랜덤 워크 + 최우선 호가 시장가 흐름), 대기 중인 지정가 주문 체결 확인
+    def _advance(self):
+        now = time.monotonic()
+        steps = int((now - self._clock) / self.step)
+        if steps <= 0:
+            return
+        self._clock += steps * self.step
+        sigma = self.volatility * math.sqrt(self.step)
+        taker_prob = min(1.0, self.taker_rate * self.step)
+        decay = math.exp(-self.step / self.resilience) if self.resilience else 1.0
+        for _ in range(min(steps, 10_000)):
+            self.mid *= math.exp(self.rng.gauss(0, sigma))
+            self.offset *= decay
+            bid, ask = self._touch()
+            flow = None
+            if self.rng.random() < taker_prob:
+                flow = ("buy" if self.rng.random() < 0.5 else "sell", self.rng.expovariate(1 / self.taker_size))
+            for order in self.orders.values():
+                if order["state"] == "wait" and order["ord_type"] == "limit":
+                    self._match_limit(order, bid, ask, flow)
+
+    def _match_limit(self, order, bid, ask, flow):
+        price = order["price"]
+        crossed = ask <= price if order["side"] == "bid" else bid >= price
+        if crossed:
+            self._fill(order, price, order["remaining"])
+            return
+        at_touch = price == bid if order["side"] == "bid" else price == ask
+        if not (at_touch and flow) or flow[0] != ("sell" if order["side"] == "bid" else "buy"):
+            return
+        # 같은 가격에 먼저 들어와 있던 물량이 다 체결된 뒤에 내 주문이 체결됨
+        size = flow[1]
+        ahead = min(order["queue_ahead"], size)
+        order["queue_ahead"] -= ahead
+        if size > ahead:
+            self._fill(order, price, min(order["remaining"], size - ahead))
+
+    def _fill(self, order, price, volume):
+        if volume <= 0:
+            return
+        order["trades"].append({"price": str(price), "volume": str(volume), "funds": str(price * volume)})
+        order["remaining"] -= volume
+        order["paid_fee"] += price * volume * FEE_RATE
+        if order["remaining"] <= 1e-12:
+            order["remaining"] = 0.0
+            order["state"] = "done"
+
+    # 호가를 따라 시장가 체결 (매수는 KRW 금액, 매도는 수량), 소진한 호가 수만큼 가격이 밀림
+    def _walk(self, order, side, amount):
+        units = self._book()
+        remaining, consumed = amount, 0
+        for unit in units:
+            if remaining <= 1e-12:
+                break
+            price = unit["ask_price"] if side == "bid" else unit["bid_price"]
+            size = unit["ask_size"] if side == "bid" else unit["bid_size"]
+            volume = min(size, remaining / price) if side == "bid" else min(size, remaining)
+            self._fill(order, price, volume)
+            remaining -= volume * price if side == "bid" else volume
+            consumed += volume / size
+        shift = self.impact * consumed * self.tick
+        self.offset += shift if side == "bid" else -shift
+        order["state"] = "done" if order["trades"] else "cancel"
+
+    # --- 주문 (Bithumb 클라이언트와 같은 형식) ---
+
+    def _new_order(self, side, ord_type, price=None, volume=None):
+        order = {"uuid": f"sim-{next(self._ids)}", "market": self.market, "side": side, "ord_type": ord_type,
+                 "price": price, "volume": volume, "remaining": volume or 0.0, "state": "wait",
+                 "trades": [], "paid_fee": 0.0, "queue_ahead": 0.0, "created_at": time.time()}
+        self.orders[order["uuid"]] = order
+        return order
+
+    def buy_market_order(self, market, krw_amount):
+        with self._lock:
+            self._advance()
+            order = self._new_order("bid", "price", price=krw_amount)
+            self._walk(order, "bid", krw_amount)
+            return {"uuid": order["uuid"]}
+
+    def sell_market_order(self, market, volume):
+        with self._lock:
+            self._advance()
+            order = self._new_order("ask", "market", volume=volume)
+            self._walk(order, "ask", volume)
+            return {"uuid": order["uuid"]}
+
+    def _limit(self, side, price, volume):
+        with self._lock:
+            self._advance()
+            order = self._new_order(side, "limit", price=float(price), volume=float(volume))
+            bid, ask = self._touch()
+            # 상대 호가를 넘는 가격이면 즉시 체결 (테이커), 같은 가격이면 기존 잔량 뒤에 줄을 섬
+            if (side == "bid" and price >= ask) or (side == "ask" and price <= bid):
+                self._walk(order, side, float(volume) * (ask if side == "bid" else 1))
+            elif price == (bid if side == "bid" else ask):
+                order["queue_ahead"] = self._level_size(0)
+            return {"uuid": order["uuid"]}
+
+    def buy_limit_order(self, market, price, volume):
+        return self._limit("bid", price, volume)
+
+    def sell_limit_order(self, market, price, volume):
+        return self._limit("ask", price, volume)
+
+    def get_order(self, uuid):
+        with self._lock:
+            self._advance()
+            order = self.orders[uuid]
+            executed = sum(float(t["volume"]) for t in order["trades"])
+            return {"uuid": uuid, "market": self.market, "side": order["side"], "ord_type": order["ord_type"],
+                    "state": order["state"], "price": order["price"], "volume": order["volume"],
+                    "remaining_volume": order["remaining"], "executed_volume": executed,
+                    "paid_fee": order["paid_fee"], "trades": list(order["trades"])}
+
+    def cancel_order(self, uuid):
+        with self._lock:
+            self._advance()
+            order = self.orders[uuid]
+            if order["state"] == "wait":
+                order["state"] = "cancel"
+            return {"uuid": uuid, "state": order["state"]}
+
+
+if __name__ == "__main__":
+    # 가격 변동과 시장가 흐름을 끈 호가로 체결 규칙 확인
+    sim = SimulatedExchange(volatility=0, taker_rate=0, seed=1)
+    bid, ask = sim._touch()
+
+    # 시장가 매수는 호가를 따라 올라가며 체결되고 가격을 밀어 올림
+    amount = sim.depth * 3 * ask
+    order = sim.get_order(sim.buy_market_order(sim.market, amount)["uuid"])
+    prices = [float(t["price"]) for t in order["trades"]]
+    funds = sum(float(t["funds"]) for t in order["trades"])
+    assert order["state"] == "done" and prices == sorted(prices) and prices[0] == ask and len(prices) > 1, prices
+    assert abs(funds - amount) < 1e-6 * amount and funds / order["executed_volume"] > ask, funds
+    assert sim.offset > 0, sim.offset
+    print(f"market buy {amount:,.0f} KRW: {len(prices)} levels, avg {funds / order['executed_volume']:,.0f} "
+          f"(ask {ask:,.0f}), pushed {sim.offset / sim.tick:.2f} ticks")
+
+    # 매수호가와 같은 가격의 지정가는 앞선 잔량이 모두 체결된 뒤에 체결됨
+    sim = SimulatedExchange(volatility=0, taker_rate=0, seed=1)
+    bid, ask = sim._touch()
+    uuid = sim.buy_limit_order(sim.market, bid, 0.01)["uuid"]
+    order = sim.orders[uuid]
+    assert order["state"] == "wait" and order["queue_ahead"] == sim.depth, order
+    sim._match_limit(order, bid, ask, ("sell", sim.depth / 2))
+    assert not order["trades"] and abs(order["queue_ahead"] - sim.depth / 2) < 1e-12, order
+    sim._match_limit(order, bid, ask, ("sell", sim.depth / 2 + 0.004))
+    assert abs(order["remaining"] - 0.006) < 1e-12 and order["state"] == "wait", order
+    print(f"limit at bid: filled 0.004 of 0.01 after {sim.depth} BTC queued ahead")
+
+    # 취소한 지정가는 가격이 넘어와도 체결되지 않음, 체결 완료된 주문은 취소되지 않음
+    assert sim.cancel_order(uuid)["state"] == "cancel"
+    with sim._lock:
+        sim.mid = bid - 5 * sim.tick  # 매도호가가 주문 가격 아래로 내려옴
+        sim._clock -= sim.step
+        sim._advance()
+    assert sim.get_order(uuid)["state"] == "cancel" and abs(order["remaining"] - 0.006) < 1e-12
+    assert not [o for o in sim.orders.values() if o["state"] == "wait"]
+    done = sim.buy_limit_order(sim.market, ask, 0.01)["uuid"]
+    assert sim.get_order(done)["state"] == "done" and sim.cancel_order(done)["state"] == "done"
+    print("cancelled limit left nothing resting; crossing limit filled at once")
+    print("sim_exchange checks passed")
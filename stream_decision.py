@@ -0,0 +1,165 @@
+import re
+import json
+import time
+import threading
+
+# 응답 JSON 에서 판단과 비율을 찾는 패턴
+# 비율은 숫자 뒤에 구분자가 와야 끝난 것으로 봄 (스트리밍 중 "2" 와 "25" 를 구분하기 위해)
+DECISION_PATTERN = re.compile(r'"decision"\s*:\s*"(buy|sell|hold)"', re.IGNORECASE)
+PERCENTAGE_PATTERN = re.compile(r'"percentage"\s*:\s*"?(-?\d+(?:\.\d+)?)"?\s*[,}\s]')
+REASON_START_PATTERN = re.compile(r'"reason"\s*:\s*"')
+
+
+# 토큰이 들어오는 대로 JSON 조각을 누적하며 판단/비율/이유를 뽑아내는 파서
+class IncrementalDecisionParser:
+    def __init__(self):
+        self.buffer = ""
+        self.decision = None
+        self.percentage = None
+        self._reason_start = None
+        self._reason_emitted = 0
+        self.complete = None              # result() 에서 JSON 전체를 읽었는지 (중간에 끊긴 응답이면 False)
+
+    # 조각을 추가하고, 판단과 비율이 이번에 처음 모두 확인되었으면 True
+    def feed(self, text):
+        was_ready = self.ready
+        self.buffer += text
+        if self.decision is None:
+            match = DECISION_PATTERN.search(self.buffer)
+            if match:
+                self.decision = match.group(1).lower()
+        if self.percentage is None:
+            match = PERCENTAGE_PATTERN.search(self.buffer)
+            if match:
+                self.percentage = int(float(match.group(1)))
+        if self._reason_start is None:
+            match = REASON_START_PATTERN.search(self.buffer)
+            if match:
+                self._reason_start = match.end()
+        return self.ready and not was_ready
+
+    @property
+    def ready(self):
+        return self.decision is not None and self.percentage is not None
+
+    # 지난 호출 이후 새로 들어온 reason 텍스트 (로그 출력용, 이스케이프는 그대로)
+    def new_reason_text(self):
+        if self._reason_start is None:
+            return ""
+        text = self.buffer[self._reason_start:]
+        end = _closing_quote(text)
+        if end is not None:
+            text = text[:end]
+        new_text = text[self._reason_emitted:]
+        self._reason_emitted = len(text)
+        return new_text
+
+    # 스트림이 끝난 뒤 최종 결과 (JSON 이 깨졌으면 지금까지 파싱한 값으로 구성)
+    def result(self):
+        try:
+            result = json.loads(self.buffer)
+            self.complete = True
+            return result
+        except ValueError:
+            self.complete = False
+            reason = ""
+            if self._reason_start is not None:
+                text = self.buffer[self._reason_start:]
+                reason = text[:_closing_quote(text)]
+            return {"decision": self.decision or "hold", "percentage": self.percentage or 0,
+                    "reason": reason or "Incomplete AI response"}
+
+
+# 이스케이프되지 않은 닫는 따옴표 위치
+def _closing_quote(text):
+    escaped = False
+    for i, ch in enumerate(text):
+        if escaped:
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif ch == '"':
+            return i
+    return None
+
+
+# gpt-4o 응답을 스트리밍으로 받으면서 판단/비율이 나오는 즉시 on_decision(decision, percentage) 호출
+#   deadline: 이 시간(초) 안에 판단이 오지 않으면 스트림을 끊고 hold 로 처리
+#   max_total: 판단 뒤 reason 을 받는 것까지 포함한 전체 한도 (초, 기본 deadline 의 3배), 넘으면 받은 데까지 사용
+#   (httpx timeout 은 읽기 한 번의 한도라 토큰이 조금씩 계속 오면 끝나지 않으므로, 벽시계 기준 감시 타이머가 스트림을 닫음)
+# 반환값: (결과 dict, {"time_to_decision": 초 또는 None, "total": 초, "complete": 응답 전체를 받았는지})
+def stream_decision(client, model, messages, deadline, on_decision=None, log=print, max_total=None):
+    started = time.perf_counter()
+    parser = IncrementalDecisionParser()
+    time_to_decision = None
+    max_total = max_total or deadline * 3
+    cut = threading.Event()
+    timers = []
+
+    def hold(reason):
+        return ({"decision": "hold", "percentage": 0, "reason": reason},
+                {"time_to_decision": None, "total": time.perf_counter() - started, "complete": False})
+
+    try:
+        stream = client.with_options(timeout=deadline).chat.completions.create(
+            model=model,
+            messages=messages,
+            response_format={"type": "json_object"},
+            stream=True
+        )
+    except Exception as e:
+        return hold(f"AI request failed: {e}")
+
+    # deadline 에 판단이 없으면 바로, 있으면 max_total 에 스트림을 닫음 (읽던 쪽은 예외나 스트림 종료로 빠져나옴)
+    def watchdog():
+        elapsed = time.perf_counter() - started
+        if time_to_decision is not None and elapsed < max_total:
+            arm(max_total - elapsed)
+            return
+        cut.set()
+        try:
+            stream.close()
+        except Exception:
+            pass
+
+    def arm(delay):
+        timer = threading.Timer(delay, watchdog)
+        timer.daemon = True
+        timers.append(timer)
+        timer.start()
+
+    arm(max(0.0, deadline - (time.perf_counter() - started)))
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content or ""
+            if parser.feed(text):
+                time_to_decision = time.perf_counter() - started
+                if on_decision is not None:
+                    on_decision(parser.decision, parser.percentage)
+            reason_text = parser.new_reason_text()
+            if reason_text:
+                log(reason_text, end="", flush=True)
+            if time_to_decision is None and time.perf_counter() - started > deadline:
+                return hold(f"No AI decision within {deadline:g}s deadline")
+    except Exception as e:
+        # 판단이 이미 왔으면 (주문도 이미 시작됨) 받은 데까지로 결과를 만들고, 아니면 hold
+        if time_to_decision is None:
+            if cut.is_set():
+                return hold(f"No AI decision within {deadline:g}s deadline")
+            return hold(f"AI stream failed before a decision: {e}")
+        log(f"\nAI stream interrupted after the decision: {e}")
+    finally:
+        for timer in timers:
+            timer.cancel()
+        stream.close()
+    if cut.is_set():
+        if time_to_decision is None:
+            return hold(f"No AI decision within {deadline:g}s deadline")
+        log(f"\nAI stream cut at the {max_total:g}s limit after the decision")
+    log("")
+
+    result = parser.result()
+    return result, {"time_to_decision": time_to_decision, "total": time.perf_counter() - started,
+                    "complete": parser.complete and not cut.is_set()}
@@ -1,9 +1,11 @@
 import streamlit as st
-import sqlite3
+import time
+import threading
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
+from db_connections import snapshot
 
 # 페이지 설정
 st.set_page_config(
@@ -12,32 +14,117 @@ st.set_page_config(
     layout="wide"
 )
 
-# 데이터베이스 연결 및 데이터 로드
-def load_trade_data():
-    conn = sqlite3.connect('bitcoin_trading.db')
-    query = "SELECT * FROM trades ORDER BY timestamp DESC"
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    
-    # 타임스탬프 처리
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
+# 대시보드 재실행 사이에 유지되는 거래 데이터 (세션 간 공유)
+#   df: id 오름차순으로 누적한 거래 + 파생 컬럼, view: 화면용 최신순 정렬본
+#   base_values: 마켓별 첫 거래의 포트폴리오 가치 (수익률 기준), market_views: 마켓별 view/라벨
+class TradeDataCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.df = None
+        self.view = None
+        self.labels = []
+        self.last_id = 0
+        self.base_values = {}
+        self.markets = []
+        self.market_views = {}
+        self.refreshed_at = None
+        self.new_rows = 0
+        self.load_ms = 0.0
+
+@st.cache_resource
+def get_trade_cache():
+    return TradeDataCache()
+
+# 새로 들어온 거래 행에만 파생 컬럼 추가
+# btc_balance / btc_price 는 각 행 마켓의 코인 잔고 / 현재가 (마이그레이션 전 DB 는 모두 KRW-BTC)
+def add_derived_columns(new_df, base_values):
+    new_df['timestamp'] = pd.to_datetime(new_df['timestamp'], format='ISO8601')
+    if 'market' not in new_df:
+        new_df['market'] = 'KRW-BTC'
     
     # 포트폴리오 가치 계산
-    df['portfolio_value'] = df['krw_balance'] + (df['btc_balance'] * df['btc_price'])
+    new_df['portfolio_value'] = new_df['krw_balance'] + (new_df['btc_balance'] * new_df['btc_price'])
     
-    # 수익률 계산 (첫 거래 기준)
-    if len(df) > 0:
-        first_trade = df.iloc[-1]
-        df['profit_loss'] = df['portfolio_value'] - first_trade['portfolio_value']
-        df['profit_loss_pct'] = (df['profit_loss'] / first_trade['portfolio_value']) * 100
+    # 수익률 계산 (마켓별 첫 거래 기준)
+    firsts = new_df.drop_duplicates('market')
+    for market, value in zip(firsts['market'], firsts['portfolio_value']):
+        base_values.setdefault(market, value)
+    base = new_df['market'].map(base_values)
+    new_df['profit_loss'] = new_df['portfolio_value'] - base
+    new_df['profit_loss_pct'] = (new_df['profit_loss'] / base) * 100
     
-    return df
+    # 표/거래 선택 메뉴용 문자열 (재실행마다 행별로 만들지 않도록 미리 계산)
+    new_df['time_text'] = new_df['timestamp'].dt.strftime('%Y-%m-%d %H:%M')
+    new_df['label'] = new_df['time_text'] + ' - ' + new_df['market'] + ' ' + new_df['decision'].str.upper()
+    return new_df
+
+# 데이터베이스 연결 및 데이터 로드
+# 마지막으로 읽은 id 이후의 행만 조회해서 메모리의 DataFrame 에 덧붙임
+# 반환값: (최신순 DataFrame, 거래 선택 메뉴 라벨)
+def load_trade_data():
+    cache = get_trade_cache()
+    with cache.lock:
+        started = time.perf_counter()
+        # 읽기 전용 스냅샷 (WAL 이므로 트레이더가 기록 중이어도 기다리지 않고, 두 조회가 같은 시점을 봄)
+        with snapshot() as conn:
+            # 테이블이 비워지거나 다시 만들어졌으면 처음부터 다시 읽음
+            max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM trades").fetchone()[0]
+            if max_id < cache.last_id:
+                cache.reset()
+            new_df = pd.read_sql_query("SELECT * FROM trades WHERE id > ? ORDER BY id", conn,
+                                       params=(cache.last_id,))
+
+        if len(new_df) > 0:
+            new_df = add_derived_columns(new_df, cache.base_values)
+            cache.df = new_df if cache.df is None else pd.concat([cache.df, new_df], ignore_index=True)
+            cache.last_id = int(new_df['id'].iloc[-1])
+            cache.view = cache.df.sort_values('timestamp', ascending=False, kind='stable').reset_index(drop=True)
+            cache.labels = cache.view['label'].tolist()
+            cache.markets = sorted(cache.base_values)
+            cache.market_views = {}
+        elif cache.view is None:
+            cache.view = new_df
+        cache.new_rows = len(new_df)
+        cache.refreshed_at = datetime.now()
+        cache.load_ms = (time.perf_counter() - started) * 1000
+        return cache.view, cache.labels
+
+# 한 마켓의 거래만 (새 거래가 들어올 때까지 재사용)
+def market_trade_data(market):
+    cache = get_trade_cache()
+    with cache.lock:
+        if market not in cache.market_views:
+            view = cache.view[cache.view['market'] == market].reset_index(drop=True)
+            cache.market_views[market] = (view, view['label'].tolist())
+        return cache.market_views[market]
 
 # 헤더
 st.title("Bitcoin AI Trading Dashboard")
 
-# 데이터 로드
-df = load_trade_data()
+# 데이터 로드 (새 거래만 추가 조회)
+with st.spinner("새 거래 확인 중..."):
+    df, trade_labels = load_trade_data()
+
+# 갱신 상태 표시
+trade_cache = get_trade_cache()
+refresh_col, status_col = st.columns([1, 5])
+with refresh_col:
+    st.button("새로고침")  # 누르면 재실행되면서 새 거래를 조회
+with status_col:
+    st.caption(f"마지막 갱신 {trade_cache.refreshed_at.strftime('%H:%M:%S')} · "
+               f"새 거래 {trade_cache.new_rows}건 · 전체 {len(df):,}건 · 조회 {trade_cache.load_ms:.0f}ms")
+
+# 여러 마켓을 거래 중이면 마켓 선택 (수익률/잔고/차트는 선택한 마켓 기준)
+coin = 'BTC'
+if len(trade_cache.markets) > 1:
+    selected_market = st.selectbox("마켓 선택:", trade_cache.markets)
+    df, trade_labels = market_trade_data(selected_market)
+    coin = selected_market.split('-', 1)[1]
+elif trade_cache.markets:
+    coin = trade_cache.markets[0].split('-', 1)[1]
 
 # 최신 거래 정보
 if not df.empty:
@@ -64,9 +151,9 @@ if not df.empty:
             delta=f"{latest['timestamp'].strftime('%Y-%m-%d %H:%M')}"
         )
     
-    # BTC 및 현금 잔고
+    # 코인 및 현금 잔고
     st.markdown(f"""
-    **BTC 잔고:** {latest['btc_balance']:.6f} BTC (₩{latest['btc_balance'] * latest['btc_price']:,.0f})  
+    **{coin} 잔고:** {latest['btc_balance']:.6f} {coin} (₩{latest['btc_balance'] * latest['btc_price']:,.0f})  
     **KRW 잔고:** ₩{latest['krw_balance']:,.0f}
     """)
 
@@ -126,9 +213,9 @@ if not df.empty and len(df) > 1:
     
     st.plotly_chart(fig, use_container_width=True)
 
-# BTC 가격 차트 (Plotly)
+# 코인 가격 차트 (Plotly)
 if not df.empty:
-    st.subheader("BTC 가격 변화")
+    st.subheader(f"{coin} 가격 변화")
     
     # 시간순으로 정렬
     df_sorted = df.sort_values('timestamp')
@@ -141,7 +228,7 @@ if not df.empty:
         x=df_sorted['timestamp'], 
         y=df_sorted['btc_price'],
         mode='lines+markers',
-        name='BTC 가격',
+        name=f'{coin} 가격',
         line=dict(color='orange', width=2),
         marker=dict(size=6)
     ))
@@ -160,9 +247,9 @@ if not df.empty:
     
     # 차트 레이아웃 설정
     fig.update_layout(
-        title='BTC 가격 변화와 거래 결정',
+        title=f'{coin} 가격 변화와 거래 결정',
         xaxis_title='날짜',
-        yaxis_title='BTC 가격 (KRW)',
+        yaxis_title=f'{coin} 가격 (KRW)',
         hovermode='x unified',
         legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
         height=500,
@@ -185,11 +272,12 @@ st.subheader("매매 내역")
 if not df.empty:
     # 표시할 컬럼 선택 및 새 DataFrame 생성 (복사 대신)
     display_df = pd.DataFrame({
-        '시간': df['timestamp'].dt.strftime('%Y-%m-%d %H:%M'),
+        '시간': df['time_text'],
+        '마켓': df['market'],
         '결정': df['decision'].str.upper(),
         '비율(%)': df['percentage'],
-        'BTC 가격(KRW)': df['btc_price'].apply(lambda x: f"{x:,.0f}"),
-        'BTC 잔고': df['btc_balance'],
+        f'{coin} 가격(KRW)': df['btc_price'].apply(lambda x: f"{x:,.0f}"),
+        f'{coin} 잔고': df['btc_balance'],
         'KRW 잔고': df['krw_balance'].apply(lambda x: f"{x:,.0f}"),
         '수익률(%)': df['profit_loss_pct'].apply(lambda x: f"{x:.2f}")
     })
@@ -225,7 +313,7 @@ if not df.empty:
         # 선택 메뉴
         selected_idx = st.selectbox("거래 선택:", 
                                      range(len(df)), 
-                                     format_func=lambda i: f"{df.iloc[i]['timestamp'].strftime('%Y-%m-%d %H:%M')} - {df.iloc[i]['decision'].upper()}")
+                                     format_func=trade_labels.__getitem__)
         
         selected_trade = df.iloc[selected_idx]
         
@@ -234,8 +322,9 @@ if not df.empty:
         ### {selected_trade['timestamp'].strftime('%Y-%m-%d %H:%M')} 거래 세부사항
         
         **결정:** {selected_trade['decision'].upper()} {selected_trade['percentage']}%  
-        **비트코인 가격:** ₩{selected_trade['btc_price']:,.0f}  
-        **거래 후 BTC 잔고:** {selected_trade['btc_balance']:.8f} BTC  
+        **마켓:** {selected_trade['market']}  
+        **{coin} 가격:** ₩{selected_trade['btc_price']:,.0f}  
+        **거래 후 {coin} 잔고:** {selected_trade['btc_balance']:.8f} {coin}  
         **거래 후 KRW 잔고:** ₩{selected_trade['krw_balance']:,.0f}  
         **포트폴리오 가치:** ₩{selected_trade['portfolio_value']:,.0f}  
         **수익률:** {selected_trade['profit_loss_pct']:.2f}%  
@@ -245,7 +334,7 @@ if not df.empty:
         # 판단 이유 표시
         selected_idx2 = st.selectbox("AI 판단 선택:", 
                                      range(len(df)), 
-                                     format_func=lambda i: f"{df.iloc[i]['timestamp'].strftime('%Y-%m-%d %H:%M')} - {df.iloc[i]['decision'].upper()}",
+                                     format_func=trade_labels.__getitem__,
                                      key="reason_select")
         
         selected_trade2 = df.iloc[selected_idx2]
@@ -0,0 +1,132 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import itertools
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import backtest
+
+# 결과 테이블을 저장할 DB
+RESULTS_DB_PATH = os.getenv("BACKTEST_RESULTS_DB", "backtest_results.db")
+
+# 기본 탐색 범위
+#   max_percentage / min_order: execute_trade() 의 비율 상한과 최소 주문 금액
+#   short/mid/long_window: ai_trading() 의 1시간봉/4시간봉/일봉 개수 (24*3, 24*2, 60) -
+#     규칙 기반 소스에서는 단기 이평(시간), 장기 이평(4시간봉 x4), 추세 필터(일봉 x24) 길이로 사용
+#   slot_hours: 스케줄러 실행 시각 (시)
+DEFAULT_GRID = {
+    "max_percentage": [10, 20, 50, 100],
+    "min_order": [5000, 20000],
+    "short_window": [24, 24 * 3],
+    "mid_window": [24, 24 * 2],
+    "long_window": [0, 30, 60],
+    "slot_hours": [(9, 15, 21), (1, 9, 17), tuple(range(24))],
+}
+
+# 작업 프로세스별 전역 상태 (initializer 에서 한 번만 설정)
+_close = None
+_hours = None
+_bars_per_year = None
+_signals = {}
+
+
+# 작업 프로세스 시작 시 캔들 배열을 메모리 맵으로 연결 (복사/피클링 없이 모든 프로세스가 같은 페이지 공유)
+def _attach(close_path, hours_path, bars_per_year):
+    global _close, _hours, _bars_per_year
+    _close = np.load(close_path, mmap_mode="r")
+    _hours = np.load(hours_path, mmap_mode="r")
+    _bars_per_year = bars_per_year
+
+
+# 파라미터 한 조합 실행 (같은 이평 조합의 신호는 프로세스 안에서 재사용)
+def _run_one(params):
+    key = (params["short_window"], params["mid_window"], params["long_window"])
+    if key not in _signals:
+        _signals[key] = backtest.sma_cross_actions(
+            _close, fast=params["short_window"], slow=params["mid_window"] * 4,
+            percentage=100, trend=params["long_window"] * 24)
+    actions, percentages = _signals[key]
+    result = backtest.simulate(_close, actions, percentages, hours=_hours,
+                               max_percentage=params["max_percentage"], min_order=params["min_order"],
+                               slot_hours=params["slot_hours"])
+    stats = backtest.performance(result["equity"], _bars_per_year)
+    stats["trades"] = int(len(result["trade_index"]))
+    return dict(params, **stats)
+
+
+# 탐색 범위의 모든 조합
+def expand_grid(grid):
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+# 수익률, 낙폭, 샤프 지수 순위의 평균으로 종합 순위 계산
+def rank_results(results):
+    df = pd.DataFrame(results)
+    df["return_rank"] = df["total_return"].rank(ascending=False, method="min")
+    df["drawdown_rank"] = df["max_drawdown"].rank(ascending=False, method="min")  # 낙폭은 음수, 0에 가까울수록 좋음
+    df["sharpe_rank"] = df["sharpe"].rank(ascending=False, method="min")
+    df["score"] = df[["return_rank", "drawdown_rank", "sharpe_rank"]].mean(axis=1)
+    df["rank"] = df["score"].rank(method="min").astype(int)
+    return df.sort_values(["rank", "sharpe_rank"]).reset_index(drop=True)
+
+
+# 결과를 sweep_results 테이블에 추가
+def save_results(df, run_id, path=RESULTS_DB_PATH):
+    out = df.copy()
+    out.insert(0, "run_id", run_id)
+    out["slot_hours"] = out["slot_hours"].apply(lambda hours: ",".join(str(h) for h in hours))
+    conn = sqlite3.connect(path)
+    try:
+        out.to_sql("sweep_results", conn, if_exists="append", index=False)
+    finally:
+        conn.close()
+
+
+# 파라미터 스윕 실행 함수: 모든 코어에 조합을 나눠 백테스트하고 순위를 매겨 저장
+def run_sweep(bars, grid=DEFAULT_GRID, workers=None, results_path=RESULTS_DB_PATH, run_id=None):
+    run_id = run_id or datetime.now().strftime("%Y%m%d-%H%M%S")
+    combos = expand_grid(grid)
+    workdir = tempfile.mkdtemp(prefix="sweep_")
+    try:
+        close_path = os.path.join(workdir, "close.npy")
+        hours_path = os.path.join(workdir, "hours.npy")
+        np.save(close_path, bars["close"].to_numpy(dtype=float))
+        np.save(hours_path, bars.index.hour.to_numpy(dtype=np.int8))
+
+        workers = workers or os.cpu_count()
+        chunksize = max(1, len(combos) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                 initargs=(close_path, hours_path, backtest.bars_per_year(bars.index))) as pool:
+            results = list(pool.map(_run_one, combos, chunksize=chunksize))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    ranked = rank_results(results)
+    if results_path:
+        save_results(ranked, run_id, results_path)
+    return ranked
+
+
+# 캔들 저장소의 1시간봉 (없으면 3년치 합성 데이터) 으로 스윕 실행
+if __name__ == "__main__":
+    import time
+
+    bars = backtest.load_bars("KRW-BTC", "minute60")
+    if bars is None or len(bars) < 24 * 90:
+        rng = np.random.default_rng(11)
+        n = 3 * 365 * 24
+        close = 50_000_000 * np.exp(np.cumsum(rng.normal(0.00002, 0.006, n)))
+        bars = pd.DataFrame({"close": close}, index=pd.date_range("2022-01-01", periods=n, freq="h"))
+        print(f"candle archive too short, using {n} synthetic 1h bars")
+
+    started = time.perf_counter()
+    ranked = run_sweep(bars)
+    elapsed = time.perf_counter() - started
+    print(f"{len(ranked)} combinations on {os.cpu_count()} cores in {elapsed:.1f}s -> {RESULTS_DB_PATH}")
+    columns = ["rank", "max_percentage", "min_order", "short_window", "mid_window", "long_window",
+               "slot_hours", "total_return", "max_drawdown", "sharpe", "trades"]
+    print(ranked[columns].head(10).to_string(index=False))
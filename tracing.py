@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
+import pandas as pd
+import event_log
+
+# 사이클 단계별 구간(span) 기록 여부 (꺼져 있으면 span() 은 아무것도 하지 않음)
+# 기본은 꺼짐: 트레이딩 프로세스만 enable() 로 켬 (autotrade 의 TRACING)
+#   구간은 거래 기록 DB 에 쓰이므로 모듈 단독 실행 (벤치마크 __main__) 이 가짜 구간을 남기지 않도록
+TRACING_ENABLED = False
+# spans 보관 기간 (일, 0 이면 지우지 않음)
+TRACE_RETENTION_DAYS = float(os.getenv("TRACE_RETENTION_DAYS", "14"))
+
+# 대시보드 / OpenMetrics 에서 보여 주는 분위수
+QUANTILES = (0.5, 0.95, 0.99)
+
+# 현재 실행 중인 trace / span (스레드와 asyncio 태스크마다 따로 유지)
+_current = contextvars.ContextVar("trace_span", default=None)
+
+# 구간 ID 는 추적용이므로 암호학적 난수가 필요 없음 (uuid4 의 os.urandom 호출보다 훨씬 빠름)
+_ids = random.Random()
+
+# 구간이 끝날 때마다 호출할 함수 (이름, 초, status) - metrics 의 단계별 히스토그램 등
+span_listeners = []
+
+
+def enable(enabled=True):
+    global TRACING_ENABLED
+    TRACING_ENABLED = enabled
+
+
+def _new_id():
+    return f"{_ids.getrandbits(64):016x}"
+
+
+# spans 테이블 행 하나를 백그라운드 writer 로 보냄 (트레이딩 경로는 기다리지 않음)
+def _emit(trace_id, span_id, parent_id, name, start, duration, status="ok", attrs=None):
+    writer = event_log.get_writer()
+    if writer.on_batch is None:
+        writer.on_batch = _record_db_write
+    writer.submit("spans", {
+        "trace_id": trace_id, "span_id": span_id, "parent_id": parent_id, "name": name,
+        "start_us": int(start * 1_000_000), "duration_us": int(duration * 1_000_000),
+        "thread": threading.current_thread().name, "status": status,
+        "attrs": json.dumps(attrs, ensure_ascii=False, default=str) if attrs else None,
+    })
+    for listener in span_listeners:
+        listener(name, duration, status)
+
+
+# writer 가 거래/이벤트를 디스크에 쓴 배치마다 db.write 구간 기록 (span 만 있는 배치는 제외)
+def _record_db_write(tables, start, duration):
+    if any(table != "spans" for table in tables):
+        _emit(None, _new_id(), None, "db.write", start, duration, attrs=tables)
+
+
+# 구간 하나를 기록하는 context manager (현재 구간의 자식으로 기록, 예외가 나면 status=error)
+#   with span("llm", market="KRW-BTC") as attrs: ... attrs["tokens"] = 123
+@contextmanager
+def span(name, **attrs):
+    if not TRACING_ENABLED:
+        yield attrs
+        return
+    parent = _current.get()
+    trace_id = parent[0] if parent else _new_id()
+    span_id = _new_id()
+    token = _current.set((trace_id, span_id))
+    start = time.time()
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield attrs
+    except BaseException as e:
+        status = "error"
+        attrs["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        _emit(trace_id, span_id, parent[1] if parent else None, name, start, time.perf_counter() - started,
+              status, attrs)
+
+
+# 새 trace 의 최상위 구간 (한 트레이딩 사이클)
+@contextmanager
+def trace(name, **attrs):
+    token = _current.set(None)
+    try:
+        with span(name, **attrs) as span_attrs:
+            yield span_attrs
+    finally:
+        _current.reset(token)
+
+
+# 현재 trace 문맥을 다른 스레드에서 이어 쓰도록 감싼 함수 (Thread / ThreadPoolExecutor 에 넘길 때)
+def in_context(func):
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+
+# 보관 기간이 지난 spans 삭제 (start_us 인덱스 범위 삭제, 반환값: 지운 행 수)
+def prune_spans(conn, days=TRACE_RETENTION_DAYS, now=None):
+    if not days:
+        return 0
+    cutoff = int(((now or time.time()) - days * 86400) * 1_000_000)
+    with conn:
+        return conn.execute("DELETE FROM spans WHERE start_us < ?", (cutoff,)).rowcount
+
+
+# --- 조회 / 내보내기 ---
+
+# spans 를 DataFrame 으로 읽기 (since_us 이후 시작한 구간, trace_id 로 한 사이클만 선택 가능)
+def load_spans(conn, since_us=0, trace_id=None):
+    sql = "SELECT trace_id, span_id, parent_id, name, start_us, duration_us, thread, status, attrs FROM spans " \
+          "WHERE start_us >= ?"
+    params = [since_us]
+    if trace_id:
+        sql += " AND trace_id = ?"
+        params.append(trace_id)
+    return pd.read_sql_query(sql + " ORDER BY start_us", conn, params=params)
+
+
+# 가장 최근 사이클의 trace_id
+def latest_trace_id(conn, name="cycle"):
+    row = conn.execute("SELECT trace_id FROM spans WHERE name = ? AND parent_id IS NULL "
+                       "ORDER BY start_us DESC LIMIT 1", (name,)).fetchone()
+    return row[0] if row else None
+
+
+# Chrome trace 형식 (chrome://tracing, https://ui.perfetto.dev 에서 열기)
+#   스레드 이름은 숫자 tid 와 thread_name 메타데이터 이벤트로 표시
+def to_chrome_trace(spans):
+    events, tids = [], {}
+    for row in spans.itertuples(index=False):
+        if row.thread not in tids:
+            tids[row.thread] = len(tids) + 1
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tids[row.thread],
+                           "args": {"name": row.thread}})
+        args = json.loads(row.attrs) if row.attrs else {}
+        args.update({"trace_id": row.trace_id, "status": row.status})
+        events.append({"name": row.name, "cat": row.name.split(".")[0], "ph": "X", "ts": int(row.start_us),
+                       "dur": int(row.duration_us), "pid": 1, "tid": tids[row.thread], "args": args})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+# 단계별 구간 수 / 분위수 / 합계 (초)
+def stage_summary(spans, quantiles=QUANTILES):
+    if spans.empty:
+        return pd.DataFrame(columns=["count", "sum"] + [f"p{int(q * 100)}" for q in quantiles] + ["max"])
+    seconds = spans.assign(seconds=spans["duration_us"] / 1e6).groupby("name")["seconds"]
+    summary = pd.DataFrame({"count": seconds.count(), "sum": seconds.sum()})
+    for q in quantiles:
+        summary[f"p{int(q * 100)}"] = seconds.quantile(q)
+    summary["max"] = seconds.max()
+    return summary.sort_values("sum", ascending=False)
+
+
+# 시간 구간(freq)별 단계 분위수 (대시보드 차트용, 밀리초)
+def stage_timeseries(spans, freq="1h", quantiles=QUANTILES):
+    if spans.empty:
+        return pd.DataFrame()
+    frame = spans.assign(time=pd.to_datetime(spans["start_us"], unit="us", utc=True).dt.tz_convert("Asia/Seoul"),
+                         ms=spans["duration_us"] / 1000)
+    grouped = frame.groupby(["name", pd.Grouper(key="time", freq=freq)])["ms"]
+    series = grouped.quantile(list(quantiles)).unstack()
+    series.columns = [f"p{int(q * 100)}" for q in series.columns]
+    series["count"] = grouped.count()
+    return series.reset_index()
+
+
+# OpenMetrics 텍스트 (단계별 summary: 분위수, _sum, _count)
+def to_openmetrics(spans, quantiles=QUANTILES):
+    lines = ["# TYPE trade_stage_latency_seconds summary",
+             "# UNIT trade_stage_latency_seconds seconds",
+             "# HELP trade_stage_latency_seconds Latency of each trading-cycle stage."]
+    for name, row in stage_summary(spans, quantiles).iterrows():
+        for q in quantiles:
+            lines.append(f'trade_stage_latency_seconds{{stage="{name}",quantile="{q}"}} {row[f"p{int(q * 100)}"]:.6f}')
+        lines.append(f'trade_stage_latency_seconds_sum{{stage="{name}"}} {row["sum"]:.6f}')
+        lines.append(f'trade_stage_latency_seconds_count{{stage="{name}"}} {int(row["count"])}')
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+# 실행: python tracing.py chrome [출력파일] (최근 사이클) | openmetrics [시간] | overhead
+if __name__ == "__main__":
+    import sys
+    from db_connections import snapshot
+
+    mode = sys.argv[1] if len(sys.argv) > 1 else "overhead"
+    if mode == "chrome":
+        with snapshot() as conn:
+            trace_id = latest_trace_id(conn)
+            spans = load_spans(conn, trace_id=trace_id) if trace_id else load_spans(conn)
+        path = sys.argv[2] if len(sys.argv) > 2 else "trace.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(to_chrome_trace(spans), f)
+        print(f"{len(spans)} spans -> {path} (open in chrome://tracing or ui.perfetto.dev)")
+    elif mode == "openmetrics":
+        hours = float(sys.argv[2]) if len(sys.argv) > 2 else 24
+        with snapshot() as conn:
+            spans = load_spans(conn, since_us=int((time.time() - hours * 3600) * 1_000_000))
+        print(to_openmetrics(spans), end="")
+    else:
+        # 구간 기록 비용 측정 (임시 DB, 모의 사이클 200회)
+        import tempfile
+        import numpy as np
+        import db_connections
+
+        event_log._writer = event_log.BackgroundWriter(os.path.join(tempfile.mkdtemp(), "trace_bench.db"))
+        enable()
+        rng = np.random.default_rng(21)
+        started = time.perf_counter()
+        for _ in range(200):
+            with trace("cycle", markets=["KRW-BTC"]):
+                with span("fetch.balances"):
+                    time.sleep(rng.gamma(2, 0.0005))
+                with span("encode", market="KRW-BTC"):
+                    pass
+                with span("llm", market="KRW-BTC"):
+                    time.sleep(rng.gamma(2, 0.002))
+                with span("order.place", market="KRW-BTC"):
+                    pass
+        elapsed = time.perf_counter() - started
+        n = 1000
+        started = time.perf_counter()
+        for _ in range(n):
+            with span("noop"):
+                pass
+        per_span = (time.perf_counter() - started) / n
+        writer = event_log._writer
+        writer.flush()
+        conn = db_connections.get_connection(writer.path)
+        spans = load_spans(conn)
+        print(f"200 cycles in {elapsed:.2f}s, span overhead {per_span * 1e6:.1f}us, {len(spans)} spans stored")
+        print(stage_summary(spans[spans["name"] != "noop"]).round(4).to_string())
+        print(to_openmetrics(spans[spans["name"].isin(["llm", "db.write"])]), end="")
+        pruned = prune_spans(conn, days=1, now=time.time() + 86400 + 60)
+        print(f"prune: {pruned} spans older than 1 day removed, {len(load_spans(conn))} left")
+        event_log.close()